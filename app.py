@@ -14,7 +14,8 @@ load_dotenv()
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
 from agent.orchestrator import AgentOrchestrator
-from retrieval.retrieval import Retriever
+from retrieval.corpus import CorpusRegistry
+from retrieval.corpus_retriever import CorpusRetriever
 from src.utils.validator import InputValidator
 from src.utils.confirmation import ConfirmationClassifier
 from src.utils.metrics import PerformanceMonitor
@@ -29,9 +30,8 @@ if not API_KEY:
     print("ERROR: MISTRAL_API_KEY not found in .env file")
     sys.exit(1)
 
-# Paths (adjust based on your setup)
-INDEX_PATH = "data/faiss_cache/index.faiss"
-CHUNKS_PATH = "data/chunks/Annual-Report-2024-25.json"
+# Corpus registry listing each document's chunks and index shard
+CORPUS_REGISTRY = os.getenv('CORPUS_REGISTRY', 'data/corpus.json')
 
 
 def main():
@@ -43,20 +43,23 @@ def main():
     print("\nInitializing system...")
     
     # Check if required files exist
-    if not os.path.exists(INDEX_PATH):
-        print(f"ERROR: FAISS index not found at {INDEX_PATH}")
-        print("Please run the ingestion pipeline first to build the index.")
-        return
-    
-    if not os.path.exists(CHUNKS_PATH):
-        print(f"ERROR: Chunks file not found at {CHUNKS_PATH}")
+    registry = CorpusRegistry(CORPUS_REGISTRY)
+    if not registry.names():
+        print(f"ERROR: No documents registered in {CORPUS_REGISTRY}")
         print("Please run the ingestion pipeline first to create chunks.")
         return
     
+    for name in registry.names():
+        entry = registry.get(name)
+        if not os.path.exists(CorpusRegistry.index_path(entry)):
+            print(f"ERROR: FAISS index for {name} not found at {CorpusRegistry.index_path(entry)}")
+            print("Please run src/embeddings/build_faiss_index.py first to build the index.")
+            return
+    
     # Initialize retriever
-    print("Loading FAISS index and document chunks...")
-    retriever = Retriever(INDEX_PATH, CHUNKS_PATH)
-    print("[OK] Retriever initialized")
+    print("Loading FAISS index shards and document chunks...")
+    retriever = CorpusRetriever(registry)
+    print(f"[OK] Retriever initialized ({len(registry.names())} documents)")
     
     # Initialize orchestrator
     print("Initializing agent orchestrator...")
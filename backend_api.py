@@ -2,8 +2,15 @@
 import os
 import sys
 import json
+import time
+import asyncio
+import logging
+import threading
+from contextlib import asynccontextmanager
 from datetime import datetime
 from fastapi import FastAPI, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Dict, Optional
@@ -12,12 +19,111 @@ from dotenv import load_dotenv
 load_dotenv()
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
-from agent.orchestrator import AgentOrchestrator
-from retrieval.retrieval import Retriever
 from src.utils.confirmation import ConfirmationClassifier
 from src.utils.description_enhancer import DescriptionEnhancer
 
-app = FastAPI()
+# Global instances
+API_KEY = os.getenv('MISTRAL_API_KEY')
+# Documents served and where their index shards live (see src/retrieval/corpus.py)
+CORPUS_REGISTRY = os.getenv('CORPUS_REGISTRY', 'data/corpus.json')
+QUERY_CACHE_PATH = "data/faiss_cache/query_embeddings.pkl"
+ANSWER_CACHE_PATH = "data/faiss_cache/answer_cache.pkl"
+# Seconds a /chat request waits for background warm-up before returning 503
+READY_TIMEOUT = float(os.getenv('READY_TIMEOUT', '30'))
+
+logger = logging.getLogger(__name__)
+
+# Heavy components (torch, sentence-transformers, FAISS, LangChain) load in the background
+retriever = None
+intent_classifier = None
+answer_cache = None
+context_packer = None
+orchestrator = None
+sessions = None
+ready_event = threading.Event()
+# Set once warm-up has finished, successfully or not, so waiting requests never outwait a failure
+startup_done = threading.Event()
+startup_state = {"status": "starting", "error": None, "load_seconds": None}
+
+def load_components():
+    """Import and warm the embedding model, FAISS index and LLM clients off the startup path."""
+    global retriever, intent_classifier, answer_cache, context_packer, orchestrator, sessions
+    start = time.time()
+    try:
+        from agent.orchestrator import AgentOrchestrator
+        from agent.intent_classifier import LocalIntentClassifier
+        from retrieval.corpus import CorpusRegistry
+        from retrieval.search_service import RemoteRetriever, retriever_from_env, service_address
+        from rag.answer_cache import SemanticAnswerCache
+        from rag.context_packer import ContextPacker
+        from agent.session_manager import SessionManager
+        
+        if os.getenv('SEARCH_SERVICE', '0') == '1':
+            # Multi-worker mode: the model and shards live once, in the search service process
+            retriever = RemoteRetriever(
+                service_address(), registry=CorpusRegistry(CORPUS_REGISTRY),
+                encode_workers=int(os.getenv('ENCODE_WORKERS', '2'))
+            )
+        else:
+            retriever = retriever_from_env(CORPUS_REGISTRY, QUERY_CACHE_PATH)
+        retriever.warmup()
+        # Trained once and shared, so sessions do not re-encode the training queries
+        intent_classifier = LocalIntentClassifier(
+            retriever, threshold=float(os.getenv('INTENT_CONFIDENCE_THRESHOLD', '0.9'))
+        )
+        if int(os.getenv('ANSWER_CACHE_SIZE', '1024')):
+            answer_cache = SemanticAnswerCache(
+                threshold=float(os.getenv('ANSWER_CACHE_THRESHOLD', '0.95')),
+                max_size=int(os.getenv('ANSWER_CACHE_SIZE', '1024')),
+                ttl_seconds=float(os.getenv('ANSWER_CACHE_TTL')) if os.getenv('ANSWER_CACHE_TTL') else None,
+                persist_path=ANSWER_CACHE_PATH
+            )
+        if int(os.getenv('CONTEXT_TOKEN_BUDGET', '1500')):
+            context_packer = ContextPacker(max_tokens=int(os.getenv('CONTEXT_TOKEN_BUDGET', '1500')))
+        orchestrator = new_orchestrator()
+        # Sessions are views of the shared orchestrator holding only their conversation
+        sessions = SessionManager(
+            orchestrator.for_session,
+            max_sessions=int(os.getenv('MAX_SESSIONS', '1000')),
+            idle_ttl=float(os.getenv('SESSION_IDLE_TTL', '1800')) or None,
+            max_bytes=int(float(os.getenv('SESSION_MEMORY_MB')) * 1024 * 1024) if os.getenv('SESSION_MEMORY_MB') else None,
+            history_limit=int(os.getenv('SESSION_HISTORY_LIMIT', '50'))
+        )
+        
+        startup_state["status"] = "ready"
+        startup_state["load_seconds"] = round(time.time() - start, 2)
+        ready_event.set()
+    except Exception as e:
+        logger.exception("Startup failed while loading components")
+        startup_state["status"] = "failed"
+        startup_state["error"] = str(e)
+    finally:
+        startup_done.set()
+
+def new_orchestrator():
+    """Create the orchestrator sharing the warmed retriever, intent classifier and caches."""
+    from agent.orchestrator import AgentOrchestrator
+    return AgentOrchestrator(
+        API_KEY, retriever, intent_classifier,
+        speculative=os.getenv('SPECULATIVE_ROUTING', '1') == '1',
+        speculative_actions=os.getenv('SPECULATIVE_ACTIONS', '0') == '1',
+        answer_cache=answer_cache,
+        context_packer=context_packer,
+        score_floor=float(os.getenv('RELEVANCE_SCORE_FLOOR')) if os.getenv('RELEVANCE_SCORE_FLOOR') else None
+    )
+
+@asynccontextmanager
+async def lifespan(app):
+    """Start serving immediately; warm models in a background thread."""
+    threading.Thread(target=load_components, name="model-warmup", daemon=True).start()
+    yield
+    # Snapshot the query embedding and answer caches so they survive restarts
+    if retriever is not None:
+        retriever.save_cache()
+    if answer_cache is not None:
+        answer_cache.save()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -27,19 +133,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global instances
-API_KEY = os.getenv('MISTRAL_API_KEY')
-INDEX_PATH = "data/faiss_cache/index.faiss"
-CHUNKS_PATH = "data/chunks/Annual-Report-2024-25.json"
-
-retriever = Retriever(INDEX_PATH, CHUNKS_PATH)
-orchestrator = AgentOrchestrator(API_KEY, retriever)
 confirmation_classifier = ConfirmationClassifier(API_KEY)
 description_enhancer = DescriptionEnhancer(API_KEY)
 
-# Store active sessions
-sessions = {}
-
 class Message(BaseModel):
     role: str
     content: str
@@ -48,182 +144,316 @@ class Message(BaseModel):
 class ChatRequest(BaseModel):
     query: str
     chat_id: str
-    conversation_history: List[Dict]
+    # Messages after history_cursor (or the full history when no cursor is sent)
+    conversation_history: List[Dict] = []
+    history_cursor: Optional[int] = None  # history_seq of the previous response
     pending_action: Optional[Dict] = None
     pending_state: Optional[str] = None  # "awaiting_confirmation", "awaiting_modification"
     original_query: Optional[str] = None
 
+class SearchRequest(BaseModel):
+    query: str
+    top_k: int = 5
+    filters: Optional[Dict] = None  # "page_range": [first, last], "section", "block_type", "document"
+
 class ChatResponse(BaseModel):
     type: str  # "INFO_QUERY", "ACTION_REQUEST", "CONFIRMATION_NEEDED", "TICKET_GENERATED", "TICKET_EXPORTED"
     content: Dict
     pending_action: Optional[Dict] = None
     pending_state: Optional[str] = None
     original_query: Optional[str] = None
+    timings: Optional[Dict] = None  # Per-stage latency (ms) of orchestrator responses
+    sources: Optional[List[Dict]] = None  # Retrieval hits behind an INFO_QUERY answer
+    history_seq: Optional[int] = None  # Seq of the last history message the server holds
 
-@app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
-    """Process chat message."""
-    try:
-        query = request.query.strip()
-        chat_id = request.chat_id
-        pending_action = request.pending_action
-        pending_state = request.pending_state
-        original_query = request.original_query
-        
-        # Restore conversation history
-        if chat_id not in sessions:
-            sessions[chat_id] = {
-                "orchestrator": AgentOrchestrator(API_KEY, retriever),
-                "conversation": []
-            }
-        
-        # Update conversation history
-        for msg in request.conversation_history:
-            if msg not in sessions[chat_id]["conversation"]:
-                sessions[chat_id]["conversation"].append(msg)
-        
-        orch = sessions[chat_id]["orchestrator"]
-        
-        # Handle pending states
-        if pending_state == "awaiting_modification" and pending_action:
-            # Check satisfaction
-            is_satisfied = description_enhancer.check_satisfaction(query)
-            if is_satisfied:
-                # Export ticket
-                ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-                filename = f"user_requests/ticket_{ts}.json"
-                os.makedirs("user_requests", exist_ok=True)
-                with open(filename, 'w') as f:
-                    json.dump(pending_action['content'], f, indent=2)
-                
-                return ChatResponse(
-                    type="TICKET_EXPORTED",
-                    content={
-                        "message": f"Ticket exported to {filename}. Your request has been recorded.",
-                        "filename": filename
-                    },
-                    pending_action=None,
-                    pending_state=None,
-                    original_query=None
-                )
-            else:
-                # Modify ticket using LLM
-                pending_action['content'] = description_enhancer.modify_action_json(
-                    pending_action['content'], query
-                )
-                return ChatResponse(
-                    type="TICKET_UPDATED",
-                    content=pending_action['content'],
-                    pending_action=pending_action,
-                    pending_state="awaiting_modification",
-                    original_query=original_query
-                )
-        
-        if pending_state == "awaiting_confirmation" and pending_action:
-            # Check confirmation
-            action_type = pending_action['content'].get('action', 'perform this action')
-            context = f"{action_type.replace('_', ' ')}"
-            intent = confirmation_classifier.classify_response(query, context)
+async def wait_until_ready():
+    """Wait briefly for warm-up instead of failing requests that arrive during a deploy."""
+    if not ready_event.is_set():
+        if not startup_done.is_set():
+            await asyncio.get_running_loop().run_in_executor(None, startup_done.wait, READY_TIMEOUT)
+        if startup_state["status"] == "failed":
+            # Retrying will not help until the service is restarted
+            raise HTTPException(status_code=503, detail=f"Service failed to start: {startup_state['error']}")
+        if not ready_event.is_set():
+            raise HTTPException(status_code=503, detail=f"Service is {startup_state['status']}, please retry shortly")
+
+def get_session(request):
+    """
+    Return the session's orchestrator and history seq, creating the session and merging history.
+    
+    Clients send only the messages after their cursor, so merging costs O(new messages).
+    """
+    session = sessions.get(request.chat_id)
+    history_seq = session.merge_history(request.conversation_history, request.history_cursor)
+    return session.orchestrator, history_seq
+
+async def handle_pending(request, query):
+    """Continue a pending confirmation or ticket modification; None if nothing is pending."""
+    pending_action = request.pending_action
+    pending_state = request.pending_state
+    original_query = request.original_query
+    
+    # Handle pending states
+    if pending_state == "awaiting_modification" and pending_action:
+        # Check satisfaction
+        is_satisfied = await description_enhancer.acheck_satisfaction(query)
+        if is_satisfied:
+            # Export ticket
+            ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f"user_requests/ticket_{ts}.json"
+            os.makedirs("user_requests", exist_ok=True)
+            with open(filename, 'w') as f:
+                json.dump(pending_action['content'], f, indent=2)
             
-            if intent == "AFFIRMATIVE":
-                # Generate ticket with enhanced description
-                enhanced_desc = description_enhancer.enhance_description(original_query, action_type)
-                pending_action['content']['description'] = enhanced_desc
-                
-                # Normalize date fields
-                date_fields = ['date', 'start_date', 'end_date']
-                for field in date_fields:
-                    if field in pending_action['content'] and pending_action['content'][field]:
-                        pending_action['content'][field] = description_enhancer.normalize_date(
-                            pending_action['content'][field]
-                        )
-                
-                # Normalize priority field
-                if 'priority' in pending_action['content']:
-                    pending_action['content']['priority'] = description_enhancer.normalize_priority(
-                        pending_action['content']['priority']
-                    )
-                
-                return ChatResponse(
-                    type="TICKET_GENERATED",
-                    content=pending_action['content'],
-                    pending_action=pending_action,
-                    pending_state="awaiting_modification",
-                    original_query=original_query
-                )
-            elif intent == "NEGATIVE":
-                return ChatResponse(
-                    type="INFO_QUERY",
-                    content={
-                        "answer": "Understood. Let me provide some guidance instead.\n\nUsual steps to fix common issues:\n1. Check your internet connection\n2. Restart the application\n3. Try alternative methods\n4. Update to the latest version\n5. Check firewall/antivirus settings"
-                    },
-                    pending_action=None,
-                    pending_state=None,
-                    original_query=None
-                )
-            else:
-                return ChatResponse(
-                    type="CLARIFICATION_NEEDED",
-                    content={"message": "I didn't understand. Please respond with 'yes' to proceed or 'no' to cancel."},
-                    pending_action=pending_action,
-                    pending_state="awaiting_confirmation",
-                    original_query=original_query
-                )
-        
-        # New query - process through orchestrator
-        original_query = query
-        response = orch.process_query(query)
+            return ChatResponse(
+                type="TICKET_EXPORTED",
+                content={
+                    "message": f"Ticket exported to {filename}. Your request has been recorded.",
+                    "filename": filename
+                },
+                pending_action=None,
+                pending_state=None,
+                original_query=None
+            )
+        else:
+            # Modify ticket using LLM
+            pending_action['content'] = await description_enhancer.amodify_action_json(
+                pending_action['content'], query
+            )
+            return ChatResponse(
+                type="TICKET_UPDATED",
+                content=pending_action['content'],
+                pending_action=pending_action,
+                pending_state="awaiting_modification",
+                original_query=original_query
+            )
+    
+    if pending_state == "awaiting_confirmation" and pending_action:
+        # Check confirmation
+        action_type = pending_action['content'].get('action', 'perform this action')
+        context = f"{action_type.replace('_', ' ')}"
+        intent = await confirmation_classifier.aclassify_response(query, context)
         
-        if response['type'] == 'ACTION_REQUEST':
-            action_type = response['content'].get('action', 'unknown')
+        if intent == "AFFIRMATIVE":
+            # Generate ticket with enhanced description
+            # Description and date fields are independent LLM calls, so run them together
+            enhanced_desc, _ = await asyncio.gather(
+                description_enhancer.aenhance_description(original_query, action_type),
+                description_enhancer.anormalize_date_fields(pending_action['content'])
+            )
+            pending_action['content']['description'] = enhanced_desc
             
-            # If action type is unknown or error, treat as INFO_QUERY
-            if action_type in ['unknown', 'error']:
-                return ChatResponse(
-                    type="INFO_QUERY",
-                    content={"answer": "I can help you with IT tickets, HR meetings, or leave requests. Could you please clarify what you need?"},
-                    pending_action=None,
-                    pending_state=None,
-                    original_query=None
+            # Normalize priority field
+            if 'priority' in pending_action['content']:
+                pending_action['content']['priority'] = description_enhancer.normalize_priority(
+                    pending_action['content']['priority']
                 )
             
-            # Create confirmation message
-            if action_type == 'create_it_ticket':
-                issue = response['content'].get('issue_type', 'an issue')
-                message = f"I understand you're facing a {issue} issue. Do you want me to create an IT ticket?"
-            elif action_type == 'schedule_hr_meeting':
-                meeting_type = response['content'].get('meeting_type', 'a meeting')
-                message = f"I understand you want to schedule {meeting_type}. Do you want me to proceed with scheduling an HR meeting?"
-            elif action_type == 'request_leave':
-                leave_type = response['content'].get('leave_type', 'leave')
-                message = f"I understand you want to request {leave_type}. Do you want me to submit a leave request?"
-            else:
-                message = "I understand you want to perform an action. Do you want me to proceed?"
-            
             return ChatResponse(
-                type="CONFIRMATION_NEEDED",
-                content={"message": message},
-                pending_action=response,
-                pending_state="awaiting_confirmation",
+                type="TICKET_GENERATED",
+                content=pending_action['content'],
+                pending_action=pending_action,
+                pending_state="awaiting_modification",
                 original_query=original_query
             )
+        elif intent == "NEGATIVE":
+            return ChatResponse(
+                type="INFO_QUERY",
+                content={
+                    "answer": "Understood. Let me provide some guidance instead.\n\nUsual steps to fix common issues:\n1. Check your internet connection\n2. Restart the application\n3. Try alternative methods\n4. Update to the latest version\n5. Check firewall/antivirus settings"
+                },
+                pending_action=None,
+                pending_state=None,
+                original_query=None
+            )
         else:
+            return ChatResponse(
+                type="CLARIFICATION_NEEDED",
+                content={"message": "I didn't understand. Please respond with 'yes' to proceed or 'no' to cancel."},
+                pending_action=pending_action,
+                pending_state="awaiting_confirmation",
+                original_query=original_query
+            )
+    
+    return None
+
+def orchestrator_response(response, original_query):
+    """Map an orchestrator response to the API response."""
+    if response['type'] == 'ACTION_REQUEST':
+        action_type = response['content'].get('action', 'unknown')
+        
+        # If action type is unknown or error, treat as INFO_QUERY
+        if action_type in ['unknown', 'error']:
             return ChatResponse(
                 type="INFO_QUERY",
-                content={"answer": response['content']},
+                content={"answer": "I can help you with IT tickets, HR meetings, or leave requests. Could you please clarify what you need?"},
                 pending_action=None,
                 pending_state=None,
                 original_query=None
             )
+        
+        # Create confirmation message
+        if action_type == 'create_it_ticket':
+            issue = response['content'].get('issue_type', 'an issue')
+            message = f"I understand you're facing a {issue} issue. Do you want me to create an IT ticket?"
+        elif action_type == 'schedule_hr_meeting':
+            meeting_type = response['content'].get('meeting_type', 'a meeting')
+            message = f"I understand you want to schedule {meeting_type}. Do you want me to proceed with scheduling an HR meeting?"
+        elif action_type == 'request_leave':
+            leave_type = response['content'].get('leave_type', 'leave')
+            message = f"I understand you want to request {leave_type}. Do you want me to submit a leave request?"
+        else:
+            message = "I understand you want to perform an action. Do you want me to proceed?"
+        
+        return ChatResponse(
+            type="CONFIRMATION_NEEDED",
+            content={"message": message},
+            pending_action=response,
+            pending_state="awaiting_confirmation",
+            original_query=original_query,
+            timings=response.get('timings')
+        )
+    else:
+        return ChatResponse(
+            type="INFO_QUERY",
+            content={"answer": response['content']},
+            pending_action=None,
+            pending_state=None,
+            original_query=None,
+            timings=response.get('timings'),
+            sources=response.get('sources')
+        )
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat(request: ChatRequest):
+    """Process chat message."""
+    await wait_until_ready()
+    
+    try:
+        query = request.query.strip()
+        orch, history_seq = get_session(request)
+        
+        # Handle pending states
+        pending = await handle_pending(request, query)
+        if pending is not None:
+            pending.history_seq = history_seq
+            return pending
+        
+        # New query - process through orchestrator
+        response = await orch.aprocess_query(query)
+        result = orchestrator_response(response, query)
+        result.history_seq = history_seq
+        return result
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def sse_event(event, data):
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Process chat message as a Server-Sent Events stream.
+    
+    Information answers arrive as "token" events while they are generated, followed by
+    a "citations" event; every stream ends with a "done" event carrying the same
+    payload /chat returns (or an "error" event).
+    """
+    await wait_until_ready()
+    query = request.query.strip()
+    orch, history_seq = get_session(request)
+    
+    async def events():
+        try:
+            pending = await handle_pending(request, query)
+            if pending is not None:
+                pending.history_seq = history_seq
+                yield sse_event("done", jsonable_encoder(pending))
+                return
+            
+            async for kind, payload in orch.astream_query(query):
+                if kind == "response":
+                    result = orchestrator_response(payload, query)
+                    result.history_seq = history_seq
+                    yield sse_event("done", jsonable_encoder(result))
+                else:
+                    yield sse_event(kind, {"text": payload})
+        except Exception as e:
+            yield sse_event("error", {"detail": str(e)})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/health")
 async def health():
-    """Health check endpoint."""
+    """Liveness check endpoint (the process is up and serving)."""
     return {"status": "ok"}
 
+@app.get("/ready")
+async def ready():
+    """Readiness check endpoint (models and index are loaded and warmed)."""
+    status_code = 200 if ready_event.is_set() else 503
+    return JSONResponse(status_code=status_code, content=startup_state)
+
+@app.post("/search")
+async def search(request: SearchRequest):
+    """Retrieve chunks for a query, optionally restricted by page range, section and block type."""
+    await wait_until_ready()
+    try:
+        hits = await retriever.aretrieve(request.query.strip(), request.top_k, request.filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"hits": hits, "sections": retriever.sections()}
+
+@app.get("/corpus")
+async def corpus():
+    """Registered documents and the ones currently loaded for search."""
+    await wait_until_ready()
+    retriever.registry.load()
+    return {"registered": retriever.registry.names(), "loaded": retriever.documents()}
+
+@app.post("/corpus/{name}/load")
+async def load_document(name: str):
+    """Load or reload one document's index shard (e.g. after the builder added or rebuilt it)."""
+    await wait_until_ready()
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, retriever.load_shard, name)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    except (OSError, RuntimeError) as e:
+        raise HTTPException(status_code=409, detail=f"Shard for '{name}' could not be loaded: {e}")
+    return {"loaded": retriever.documents()}
+
+@app.delete("/corpus/{name}")
+async def drop_document(name: str):
+    """Stop serving one document without restarting."""
+    await wait_until_ready()
+    try:
+        retriever.drop_shard(name)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    return {"loaded": retriever.documents()}
+
+@app.get("/stats/cache")
+async def cache_stats():
+    """Query embedding, answer and rerank score cache hit/miss counters, and encoder batch sizes."""
+    return {
+        "embedding_cache": retriever.cache_stats() if retriever is not None else None,
+        "answer_cache": answer_cache.stats() if answer_cache is not None else None,
+        "rerank_cache": retriever.rerank_stats() if retriever is not None else None,
+        "embedding_batches": retriever.batch_stats() if retriever is not None else None
+    }
+
+@app.get("/stats/sessions")
+async def session_stats():
+    """Live session count, estimated session memory and evictions by reason."""
+    return sessions.stats() if sessions is not None else {"active": 0}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="127.0.0.1", port=8000)
@@ -10,9 +10,13 @@ load_dotenv()
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
 from agent.orchestrator import AgentOrchestrator
-from retrieval.retrieval import Retriever
+from retrieval.corpus import CorpusRegistry
+from retrieval.corpus_retriever import CorpusRetriever
 from src.utils.description_enhancer import DescriptionEnhancer
 
+# Every registered document is searched
+CORPUS_REGISTRY = os.getenv('CORPUS_REGISTRY', 'data/corpus.json')
+
 # Test cases for evaluation
 INFO_QUERIES = [
     "What is HCLTech's revenue for FY25?",
@@ -30,15 +34,23 @@ ACTION_QUERIES = [
     "Schedule a performance review meeting"
 ]
 
+# Retrieval test queries with expected page ranges
+RETRIEVAL_CASES = [
+    ("HCLTech revenue FY25", [4, 5]),
+    ("company global presence", [1, 2, 3]),
+    ("employee count", [4, 5]),
+]
+
+# Queries an ONNX embedding backend is checked on against the PyTorch model
+EVAL_QUERIES = INFO_QUERIES + [query for query, _ in RETRIEVAL_CASES]
+
 def evaluate_intent_classification():
     """Evaluate intent classification accuracy."""
     print("\n=== Intent Classification Evaluation ===")
     
     API_KEY = os.getenv('MISTRAL_API_KEY')
-    INDEX_PATH = "data/faiss_cache/index.faiss"
-    CHUNKS_PATH = "data/chunks/Annual-Report-2024-25.json"
     
-    retriever = Retriever(INDEX_PATH, CHUNKS_PATH)
+    retriever = CorpusRetriever(CorpusRegistry(CORPUS_REGISTRY))
     orchestrator = AgentOrchestrator(API_KEY, retriever)
     
     correct = 0
@@ -68,22 +80,15 @@ def evaluate_retrieval_quality():
     """Evaluate retrieval relevance."""
     print("\n=== Retrieval Quality Evaluation ===")
     
-    INDEX_PATH = "data/faiss_cache/index.faiss"
-    CHUNKS_PATH = "data/chunks/Annual-Report-2024-25.json"
+    retriever = CorpusRetriever(CorpusRegistry(CORPUS_REGISTRY))
     
-    retriever = Retriever(INDEX_PATH, CHUNKS_PATH)
-    
-    # Test queries with expected page ranges
-    test_cases = [
-        ("HCLTech revenue FY25", [4, 5]),
-        ("company global presence", [1, 2, 3]),
-        ("employee count", [4, 5]),
-    ]
+    # Encode and search all test queries in one batch
+    batch_results = retriever.retrieve_batch([query for query, _ in RETRIEVAL_CASES], top_k=5)
     
     total_score = 0
-    for query, expected_pages in test_cases:
-        results = retriever.retrieve(query, top_k=5)
-        retrieved_pages = [r['page'] for r in results]
+    for (query, expected_pages), results in zip(RETRIEVAL_CASES, batch_results):
+        # Every page a chunk spans counts, not just its first
+        retrieved_pages = [page for r in results for page in r.get('pages') or [r['page']]]
         
         # Check if any expected page is in top results
         hit = any(page in retrieved_pages for page in expected_pages)
@@ -95,7 +100,7 @@ def evaluate_retrieval_quality():
         print(f"  Expected pages: {expected_pages}")
         print(f"  Hit: {'✓' if hit else '✗'}")
     
-    avg_score = (total_score / len(test_cases)) * 100
+    avg_score = (total_score / len(RETRIEVAL_CASES)) * 100
     print(f"\n✅ Retrieval Hit Rate: {avg_score:.2f}%")
     return avg_score
 
@@ -104,10 +109,8 @@ def evaluate_response_time():
     print("\n=== Response Time Evaluation ===")
     
     API_KEY = os.getenv('MISTRAL_API_KEY')
-    INDEX_PATH = "data/faiss_cache/index.faiss"
-    CHUNKS_PATH = "data/chunks/Annual-Report-2024-25.json"
     
-    retriever = Retriever(INDEX_PATH, CHUNKS_PATH)
+    retriever = CorpusRetriever(CorpusRegistry(CORPUS_REGISTRY))
     orchestrator = AgentOrchestrator(API_KEY, retriever)
     
     times = []
@@ -128,10 +131,8 @@ def evaluate_action_extraction():
     print("\n=== Action Extraction Evaluation ===")
     
     API_KEY = os.getenv('MISTRAL_API_KEY')
-    INDEX_PATH = "data/faiss_cache/index.faiss"
-    CHUNKS_PATH = "data/chunks/Annual-Report-2024-25.json"
     
-    retriever = Retriever(INDEX_PATH, CHUNKS_PATH)
+    retriever = CorpusRetriever(CorpusRegistry(CORPUS_REGISTRY))
     orchestrator = AgentOrchestrator(API_KEY, retriever)
     
     test_cases = [
@@ -207,6 +208,16 @@ def evaluate_data_normalization():
     print(f"\n✅ Normalization Accuracy: {accuracy:.2f}%")
     return accuracy
 
+def evaluate_embedding_parity():
+    """Compare the configured ONNX embedding backend with the PyTorch model."""
+    print("\n=== Embedding Backend Parity ===")
+    
+    from embeddings.embedding_parity import compare_backends, print_report
+    
+    report = compare_backends(EVAL_QUERIES, os.getenv('EMBEDDING_BACKEND'), CORPUS_REGISTRY)
+    print_report(report)
+    return report
+
 def generate_metrics_report():
     """Generate comprehensive metrics report."""
     print("\n" + "="*60)
@@ -245,6 +256,12 @@ def generate_metrics_report():
         print(f"Error in normalization evaluation: {e}")
         metrics['normalization_accuracy'] = 0
     
+    if os.getenv('EMBEDDING_BACKEND', 'torch') != 'torch':
+        try:
+            metrics['embedding_parity'] = evaluate_embedding_parity()
+        except Exception as e:
+            print(f"Error in embedding parity check: {e}")
+    
     # Summary
     print("\n" + "="*60)
     print("SUMMARY METRICS")
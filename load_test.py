@@ -0,0 +1,92 @@
+"""Load test for the /chat endpoint: throughput as the number of concurrent sessions grows."""
+import json
+import time
+import uuid
+import argparse
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Mix of retrieval-backed and action queries, cycled by every session
+QUERIES = [
+    "What is HCLTech's revenue for FY25?",
+    "Tell me about HCLTech's global presence",
+    "My VPN is not working",
+    "How many employees does HCLTech have?",
+    "I want to apply for leave"
+]
+
+def send_chat(base_url, chat_id, query, timeout):
+    """Send one /chat request and return (latency in seconds, ok)."""
+    payload = json.dumps({
+        "query": query,
+        "chat_id": chat_id,
+        "conversation_history": []
+    }).encode('utf-8')
+    request = urllib.request.Request(
+        f"{base_url}/chat", data=payload, headers={"Content-Type": "application/json"}
+    )
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            ok = response.status == 200
+    except (urllib.error.URLError, TimeoutError):
+        ok = False
+    return time.perf_counter() - start, ok
+
+def run_session(base_url, requests_per_session, timeout):
+    """One simulated user sending queries back to back in its own session."""
+    chat_id = f"load-{uuid.uuid4().hex[:8]}"
+    return [
+        send_chat(base_url, chat_id, QUERIES[i % len(QUERIES)], timeout)
+        for i in range(requests_per_session)
+    ]
+
+def run_level(base_url, sessions, requests_per_session, timeout):
+    """Run a number of concurrent sessions and summarize throughput and latency."""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as executor:
+        futures = [executor.submit(run_session, base_url, requests_per_session, timeout)
+                   for _ in range(sessions)]
+        results = [result for future in futures for result in future.result()]
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array([latency for latency, ok in results if ok])
+    return {
+        'sessions': sessions,
+        'requests': len(results),
+        'errors': sum(1 for _, ok in results if not ok),
+        'elapsed_s': round(elapsed, 2),
+        'throughput_rps': round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+        'p50_s': round(float(np.percentile(latencies, 50)), 3) if len(latencies) else None,
+        'p95_s': round(float(np.percentile(latencies, 95)), 3) if len(latencies) else None
+    }
+
+def print_report(report):
+    """Print a compact throughput table."""
+    print(f"\n{'sessions':>8} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 s':>8} {'p95 s':>8}")
+    for row in report:
+        print(f"{row['sessions']:>8} {row['requests']:>9} {row['errors']:>7} {row['throughput_rps']:>8.3f} "
+              f"{row['p50_s'] if row['p50_s'] is not None else '-':>8} "
+              f"{row['p95_s'] if row['p95_s'] is not None else '-':>8}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure /chat throughput against concurrent sessions")
+    parser.add_argument('--url', default="http://127.0.0.1:8000")
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--requests-per-session', type=int, default=5)
+    parser.add_argument('--timeout', type=float, default=120.0)
+    parser.add_argument('--output', default="load_test_report.json")
+    args = parser.parse_args()
+
+    report = [run_level(args.url, sessions, args.requests_per_session, args.timeout)
+              for sessions in args.sessions]
+    print_report(report)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'url': args.url, 'requests_per_session': args.requests_per_session,
+                   'results': report}, f, indent=2)
+    print(f"\nLoad test report saved to {args.output}")
@@ -2,44 +2,234 @@
 """
 RAG System Data Ingestion Pipeline Runner
 Executes the complete pipeline: PDF -> Text -> Blocks -> Chunks
+Documents are processed in parallel; large PDFs are also split into page ranges.
+With --stream, pages flow through generators straight into chunks (and optionally
+into embedding batches) without materializing intermediate JSON.
 """
 
 import os
 import sys
+import json
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
 sys.path.append('src')
 
-from ingestion.pdf_to_text import extract_text_from_pdf
-from ingestion.block_extraction import process_raw_text
-from ingestion.cdfg_chunker import process_blocks_to_chunks
+from ingestion.pdf_to_text import count_pages, extract_page_range, save_raw_text
+from ingestion.block_extraction import extract_blocks, save_blocks
+from ingestion.cdfg_chunker import CDFGChunker, save_chunks
+from ingestion.streaming import stream_chunks, stream_document, tee_json_array
+from retrieval.corpus import CorpusRegistry, document_name
 
-def run_pipeline():
+PDF_DIR = "data/pdf"
+RAW_TEXT_DIR = "data/raw_text"
+STRUCTURED_BLOCKS_DIR = "data/structured_blocks"
+CHUNKS_DIR = "data/chunks"
+STATE_PATH = "data/pipeline_state.json"
+
+def file_sha256(path):
+    """SHA-256 of a file, read in 1 MB blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_state():
+    """Load per-PDF fingerprints from the previous run"""
+    if os.path.exists(STATE_PATH):
+        with open(STATE_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+def save_state(state):
+    """Save per-PDF fingerprints"""
+    os.makedirs(os.path.dirname(STATE_PATH), exist_ok=True)
+    with open(STATE_PATH, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+
+def is_unchanged(pdf_path, previous):
+    """
+    Check a PDF against its previous fingerprint.
+
+    Size and mtime are compared first; the content hash is only computed when
+    they differ, so touched-but-identical files are still skipped.
+
+    Returns:
+        tuple: (unchanged, fingerprint)
+    """
+    stat = os.stat(pdf_path)
+    fingerprint = {"size": stat.st_size, "mtime": stat.st_mtime}
+
+    if previous and previous.get("size") == fingerprint["size"] and previous.get("mtime") == fingerprint["mtime"]:
+        fingerprint["sha256"] = previous.get("sha256")
+        return True, fingerprint
+
+    fingerprint["sha256"] = file_sha256(pdf_path)
+    return bool(previous) and previous.get("sha256") == fingerprint["sha256"], fingerprint
+
+def outputs_exist(pdf_path):
+    """Whether the final chunks file for a PDF is present"""
+    name = os.path.splitext(os.path.basename(pdf_path))[0]
+    return os.path.exists(os.path.join(CHUNKS_DIR, f"{name}.json"))
+
+def finish_document(pdf_path, text_data):
+    """Run block extraction and chunking for one extracted document and save all stages"""
+    filename = f"{os.path.splitext(os.path.basename(pdf_path))[0]}.json"
+    text_data = sorted(text_data, key=lambda page: page["page"])
+    save_raw_text(text_data, pdf_path, RAW_TEXT_DIR)
+
+    blocks = extract_blocks(text_data)
+    save_blocks(blocks, os.path.join(STRUCTURED_BLOCKS_DIR, filename))
+
+    chunks = CDFGChunker().chunk_blocks(blocks)
+    save_chunks(chunks, os.path.join(CHUNKS_DIR, filename))
+
+    return filename, len(blocks), len(chunks), sum(chunk["token_count"] for chunk in chunks)
+
+def run_streaming(pending, workers=None, keep_intermediate=False):
+    """Stream each PDF to chunks in its own worker; intermediates are optional JSON Lines"""
+    raw_text_dir = RAW_TEXT_DIR if keep_intermediate else None
+    blocks_dir = STRUCTURED_BLOCKS_DIR if keep_intermediate else None
+
+    print(f"Streaming {len(pending)} PDFs: pages -> blocks -> chunks...")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(stream_document, pdf_path, CHUNKS_DIR, raw_text_dir, blocks_dir)
+                   for pdf_path in pending]
+        for future in as_completed(futures):
+            filename, num_chunks, total_tokens = future.result()
+            print(f"Processed {filename}: {num_chunks} chunks, {total_tokens} total tokens")
+
+def run_streaming_with_embedding(pdf_path, registry, keep_intermediate=False, index_type='flat'):
+    """Stream one PDF into chunks and embedding batches of its own index shard, so encoding starts before extraction ends"""
+    from embeddings.build_faiss_index import load_embedding_model, build_index_from_stream
+
+    filename = f"{document_name(pdf_path)}.json"
+    entry = registry.register(document_name(pdf_path), chunks_path=os.path.join(CHUNKS_DIR, filename))
+    chunks_path = entry['chunks_path']
+    chunks = stream_chunks(
+        pdf_path,
+        RAW_TEXT_DIR if keep_intermediate else None,
+        STRUCTURED_BLOCKS_DIR if keep_intermediate else None
+    )
+
+    print(f"Streaming {os.path.basename(pdf_path)}: pages -> blocks -> chunks -> embeddings...")
+    model = load_embedding_model()
+    index, chunks = build_index_from_stream(
+        tee_json_array(chunks, chunks_path), model, entry['cache_dir'], chunks_path, index_type=index_type
+    )
+    print(f"Processed {filename}: {len(chunks)} chunks, {index.ntotal} vectors indexed")
+
+def run_pipeline(workers=None, pages_per_task=50, force=False, stream=False,
+                 keep_intermediate=False, embed=False, index_type='flat'):
     """Execute the complete data ingestion pipeline"""
-    
-    # Step 1: PDF to Text
-    print("Step 1: Extracting text from PDFs...")
-    pdf_dir = "data/pdf"
-    raw_text_dir = "data/raw_text"
-    
-    os.makedirs(raw_text_dir, exist_ok=True)
-    
-    for filename in os.listdir(pdf_dir):
+    for directory in (RAW_TEXT_DIR, STRUCTURED_BLOCKS_DIR, CHUNKS_DIR):
+        os.makedirs(directory, exist_ok=True)
+
+    # Step 0: Skip PDFs that have not changed since the last run
+    state = load_state()
+    pending = []
+    for filename in sorted(os.listdir(PDF_DIR)):
         if filename.endswith('.pdf'):
-            pdf_path = os.path.join(pdf_dir, filename)
-            print(f"Processing {filename}...")
-            extract_text_from_pdf(pdf_path, raw_text_dir)
-    
-    # Step 2: Block Extraction
-    print("\nStep 2: Extracting structured blocks...")
-    structured_blocks_dir = "data/structured_blocks"
-    process_raw_text(raw_text_dir, structured_blocks_dir)
-    
-    # Step 3: CDFG Chunking
-    print("\nStep 3: Creating CDFG chunks...")
-    chunks_dir = "data/chunks"
-    process_blocks_to_chunks(structured_blocks_dir, chunks_dir)
-    
+            pdf_path = os.path.join(PDF_DIR, filename)
+            unchanged, fingerprint = is_unchanged(pdf_path, state.get(filename))
+            state[filename] = fingerprint
+            if unchanged and outputs_exist(pdf_path) and not force:
+                print(f"Skipping {filename} (unchanged)")
+            else:
+                pending.append(pdf_path)
+
+    if not pending:
+        save_state(state)
+        print("\nNothing to do: all PDFs are up to date.")
+        return
+
+    # Every document gets its own index shard, registered in the corpus registry
+    registry = CorpusRegistry()
+
+    if embed:
+        # Documents are embedded one after another with a single loaded model
+        for pdf_path in pending:
+            run_streaming_with_embedding(pdf_path, registry, keep_intermediate, index_type)
+        save_state(state)
+        print("\nPipeline completed successfully!")
+        return
+
+    if stream:
+        run_streaming(pending, workers, keep_intermediate)
+        registry.discover(CHUNKS_DIR)
+        save_state(state)
+        print("\nPipeline completed successfully!")
+        print(f"Final chunks saved in: {CHUNKS_DIR}")
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Step 1: PDF to Text, split into page ranges so large PDFs use several workers
+        print(f"Step 1: Extracting text from {len(pending)} PDFs...")
+        extraction = {}
+        remaining = {}
+        pages = {}
+        for pdf_path in pending:
+            num_pages = count_pages(pdf_path)
+            remaining[pdf_path] = 0
+            pages[pdf_path] = []
+            for start in range(0, max(num_pages, 1), pages_per_task):
+                future = executor.submit(extract_page_range, pdf_path, start, start + pages_per_task)
+                extraction[future] = pdf_path
+                remaining[pdf_path] += 1
+
+        # Steps 2-3: Blocks and chunks, started as soon as a document's pages are all in
+        finishing = []
+        for future in as_completed(extraction):
+            pdf_path = extraction[future]
+            pages[pdf_path].extend(future.result())
+            remaining[pdf_path] -= 1
+            if remaining[pdf_path] == 0:
+                print(f"Extracted {os.path.basename(pdf_path)}: {len(pages[pdf_path])} pages")
+                finishing.append(executor.submit(finish_document, pdf_path, pages.pop(pdf_path)))
+
+        print("\nSteps 2-3: Extracting structured blocks and creating CDFG chunks...")
+        for future in as_completed(finishing):
+            filename, num_blocks, num_chunks, total_tokens = future.result()
+            print(f"Processed {filename}: {num_blocks} blocks, {num_chunks} chunks, {total_tokens} total tokens")
+
+    registry.discover(CHUNKS_DIR)
+    save_state(state)
     print("\nPipeline completed successfully!")
-    print(f"Final chunks saved in: {chunks_dir}")
+    print(f"Final chunks saved in: {CHUNKS_DIR}")
+
+def parse_args():
+    """Command-line options for the pipeline"""
+    parser = argparse.ArgumentParser(description="Run the PDF ingestion pipeline")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Worker processes (default: number of CPUs)")
+    parser.add_argument('--pages-per-task', type=int, default=50,
+                        help="Pages extracted per task for large PDFs")
+    parser.add_argument('--force', action='store_true',
+                        help="Reprocess PDFs even if they are unchanged")
+    parser.add_argument('--stream', action='store_true',
+                        help="Stream pages -> blocks -> chunks through generators")
+    parser.add_argument('--keep-intermediate', action='store_true',
+                        help="In streaming mode, also write raw text and blocks as JSON Lines")
+    parser.add_argument('--embed', action='store_true',
+                        help="Stream chunks straight into embedding batches and build each document's FAISS shard")
+    parser.add_argument('--index-type', default='flat',
+                        help="FAISS index type used with --embed")
+    parser.add_argument('--tokenizer', choices=['whitespace', 'tiktoken', 'e5'],
+                        help="Chunk token counting backend (default: CHUNK_TOKENIZER or whitespace)")
+    return parser.parse_args()
 
 if __name__ == "__main__":
-    run_pipeline()
\ No newline at end of file
+    args = parse_args()
+    if args.tokenizer:
+        # Exported so worker processes and the index manifest see the same setting
+        os.environ["CHUNK_TOKENIZER"] = args.tokenizer
+    run_pipeline(
+        workers=args.workers,
+        pages_per_task=args.pages_per_task,
+        force=args.force,
+        stream=args.stream,
+        keep_intermediate=args.keep_intermediate,
+        embed=args.embed,
+        index_type=args.index_type
+    )
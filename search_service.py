@@ -0,0 +1,47 @@
+"""
+Shared embedding/search service for running the API with several workers.
+Start it before the workers and set SEARCH_SERVICE=1 for the API:
+
+    python search_service.py
+    SEARCH_SERVICE=1 uvicorn backend_api:app --workers 4
+"""
+import os
+import sys
+import signal
+import argparse
+from dotenv import load_dotenv
+
+load_dotenv()
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+
+from retrieval.search_service import SearchService, retriever_from_env, service_address, service_authkey
+
+def parse_args():
+    """Command-line options for the service"""
+    parser = argparse.ArgumentParser(description="Serve the embedding model and FAISS shards to API workers")
+    parser.add_argument('--address', default=service_address(), help="Unix socket path or Windows pipe name")
+    parser.add_argument('--registry', default=os.getenv('CORPUS_REGISTRY', 'data/corpus.json'))
+    parser.add_argument('--cache-path', default='data/faiss_cache/query_embeddings.pkl',
+                        help="Query embedding cache snapshot")
+    parser.add_argument('--max-batch', type=int,
+                        help="Queries after which a batch is encoded without waiting (default: EMBED_BATCH_MAX_SIZE)")
+    parser.add_argument('--max-wait-ms', type=float, default=float(os.getenv('EMBED_BATCH_MAX_WAIT_MS', '5')),
+                        help="Longest a query waits for others to join its batch")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    print("Loading embedding model and FAISS shards...")
+    retriever = retriever_from_env(args.registry, args.cache_path, args.max_batch, args.max_wait_ms)
+    retriever.warmup()
+    service = SearchService(retriever, args.address, service_authkey(create=True))
+
+    # Exit through finally on SIGTERM too, so the query embedding cache is saved
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        retriever.save_cache()
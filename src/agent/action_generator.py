@@ -43,8 +43,39 @@ class ActionGenerator:
             temperature=0.0  # Deterministic output
         )
         
-        # Extract JSON from response
-        json_str = response.choices[0].message.content.strip()
+        return self._parse_action(response.choices[0].message.content)
+    
+    async def agenerate_action(self, query):
+        """
+        Generate structured JSON for an action request without blocking the event loop.
+        
+        Args:
+            query: User action request string
+            
+        Returns:
+            dict: Parsed JSON action object
+        """
+        prompt = ACTION_JSON_PROMPT.format(query=query)
+        
+        response = await self.client.chat.complete_async(
+            model=self.model_name,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.0  # Deterministic output
+        )
+        
+        return self._parse_action(response.choices[0].message.content)
+    
+    def _parse_action(self, content):
+        """
+        Extract and parse the action JSON from raw LLM output.
+        
+        Args:
+            content: Raw response text
+            
+        Returns:
+            dict: Parsed JSON action object, or an error structure
+        """
+        json_str = content.strip()
         
         # Clean up response - extract JSON only
         # Remove markdown code blocks if present
@@ -0,0 +1,120 @@
+"""Local nearest-centroid intent classifier over e5 query embeddings."""
+import os
+import re
+import glob
+import numpy as np
+
+from rag.prompts import INTENT_CLASSIFICATION_PROMPT
+
+INTENTS = ("INFO_QUERY", "ACTION_REQUEST")
+
+# Few-shot lines in the routing prompt: - "query" → LABEL (reason)
+FEW_SHOT_PATTERN = re.compile(r'^- "(.+)" → (INFO_QUERY|ACTION_REQUEST)\b', re.MULTILINE)
+
+# Intents labelled by the LLM router; locally classified queries are logged with a
+# "(local)" suffix and deliberately do not match, so the model never trains on itself
+LOGGED_PATTERN = re.compile(r'USER_QUERY \| Intent: (INFO_QUERY|ACTION_REQUEST) \| Query: (.+)$')
+
+
+def few_shot_examples(prompt=INTENT_CLASSIFICATION_PROMPT):
+    """Extract (query, intent) pairs from the few-shot section of the routing prompt."""
+    return [(query, intent) for query, intent in FEW_SHOT_PATTERN.findall(prompt)]
+
+
+def logged_examples(log_dir="logs", max_examples=2000):
+    """
+    Collect LLM-labelled (query, intent) pairs from system logs.
+
+    Args:
+        log_dir: Directory of SystemLogger files
+        max_examples: Keep only the most recent distinct queries
+
+    Returns:
+        list: (query, intent) pairs; the latest label wins for repeated queries
+    """
+    labels = {}
+    for path in sorted(glob.glob(os.path.join(log_dir, "system_*.log"))):
+        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+            for line in f:
+                match = LOGGED_PATTERN.search(line.rstrip("\n"))
+                if match:
+                    intent, query = match.groups()
+                    labels.pop(query.strip(), None)
+                    labels[query.strip()] = intent
+    return list(labels.items())[-max_examples:]
+
+
+class LocalIntentClassifier:
+    """Answers confidently classified queries locally; the caller falls back to the LLM otherwise."""
+
+    def __init__(self, retriever, examples=None, threshold=0.9, temperature=0.02):
+        """
+        Fit class centroids from labelled queries.
+
+        Args:
+            retriever: Retriever whose encoder (and query embedding cache) is reused
+            examples: (query, intent) pairs (default: prompt few-shots plus logged queries)
+            threshold: Minimum confidence for a local decision
+            temperature: Softmax temperature over centroid similarities (e5 cosines
+                sit in a narrow band, so small differences must count)
+        """
+        self.retriever = retriever
+        self.threshold = threshold
+        self.temperature = temperature
+
+        if examples is None:
+            examples = few_shot_examples() + logged_examples()
+        self.num_examples = len(examples)
+        self.centroids = self._fit(examples)
+
+    def _fit(self, examples):
+        """Mean normalized embedding per intent, or None without both classes."""
+        queries = [query for query, _ in examples]
+        labels = np.array([intent for _, intent in examples])
+        if not all((labels == intent).any() for intent in INTENTS):
+            return None
+
+        embeddings = self.retriever.encode_queries(queries)
+        centroids = np.vstack([embeddings[labels == intent].mean(axis=0) for intent in INTENTS])
+        return centroids / np.linalg.norm(centroids, axis=1, keepdims=True)
+
+    def predict_embedding(self, embedding):
+        """
+        Classify one query embedding.
+
+        Args:
+            embedding: Normalized query embedding
+
+        Returns:
+            tuple: (intent, confidence)
+        """
+        if self.centroids is None:
+            return None, 0.0
+
+        scores = self.centroids @ embedding / self.temperature
+        probs = np.exp(scores - scores.max())
+        probs /= probs.sum()
+        best = int(np.argmax(probs))
+        return INTENTS[best], float(probs[best])
+
+    def predict(self, query):
+        """
+        Classify a query, returning the intent only when it clears the confidence threshold.
+
+        Args:
+            query: User query string
+
+        Returns:
+            tuple: (intent or None, confidence)
+        """
+        return self.decide(self.retriever.encode_queries([query])[0])
+
+    async def apredict(self, query):
+        """Async variant of predict; encoding runs in the retriever's thread pool."""
+        embeddings = await self.retriever.aencode_queries([query])
+        return self.decide(embeddings[0])
+
+    def decide(self, embedding):
+        """Thresholded prediction for an already-computed query embedding."""
+        intent, confidence = self.predict_embedding(embedding)
+        return (intent if confidence >= self.threshold else None), confidence
@@ -7,8 +7,12 @@ from src.rag.prompts import INTENT_CLASSIFICATION_PROMPT
 class LangChainIntentRouter:
     """Intent router using LangChain framework."""
     
-    def __init__(self, api_key):
-        """Initialize with LangChain components."""
+    def __init__(self, api_key, local_classifier=None):
+        """Initialize with LangChain components and an optional local fast path."""
+        self.local_classifier = local_classifier
+        # "local" or "llm", for logging which tier decided the last query
+        self.last_source = None
+        
         self.llm = ChatMistralAI(
             model="mistral-small-latest",
             mistral_api_key=api_key,
@@ -18,9 +22,38 @@ class LangChainIntentRouter:
         self.prompt = PromptTemplate(template=INTENT_CLASSIFICATION_PROMPT, input_variables=["query"])
         self.chain = self.prompt | self.llm | StrOutputParser()
     
-    def classify_intent(self, query):
-        """Classify user intent using LangChain."""
+    def classify_intent(self, query, embedding=None):
+        """Classify user intent locally when confident, otherwise using LangChain."""
+        if self.local_classifier is not None:
+            if embedding is not None:
+                intent, _ = self.local_classifier.decide(embedding)
+            else:
+                intent, _ = self.local_classifier.predict(query)
+            if intent:
+                self.last_source = "local"
+                return intent
+        
         result = self.chain.invoke({"query": query})
+        self.last_source = "llm"
+        return self._parse_intent(result)
+    
+    async def aclassify_intent(self, query, embedding=None):
+        """Classify user intent without blocking the event loop."""
+        if self.local_classifier is not None:
+            if embedding is not None:
+                intent, _ = self.local_classifier.decide(embedding)
+            else:
+                intent, _ = await self.local_classifier.apredict(query)
+            if intent:
+                self.last_source = "local"
+                return intent
+        
+        result = await self.chain.ainvoke({"query": query})
+        self.last_source = "llm"
+        return self._parse_intent(result)
+    
+    def _parse_intent(self, result):
+        """Map raw LLM output to an intent label."""
         intent = result.strip()
         
         if "ACTION_REQUEST" in intent:
@@ -1,16 +1,25 @@
 import os
 import sys
+import copy
 import json
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from agent.langchain_router import LangChainIntentRouter
+from agent.intent_classifier import LocalIntentClassifier
 from agent.action_generator import ActionGenerator
 from rag.langchain_answer import LangChainAnswerGenerator
+from rag.context_packer import ContextPacker
 from utils.logger import SystemLogger
 from utils.conversation import ConversationHistory
 
+# Shared by all orchestrators for speculative work in the synchronous path
+SPECULATION_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="speculation")
+
 
 class AgentOrchestrator:
     """Orchestrates the complete agent workflow: intent classification -> routing -> response generation."""
@@ -21,20 +30,59 @@ class AgentOrchestrator:
         "inside information", "private", "non-public", "bypass", "override"
     ]
     
-    def __init__(self, api_key, retriever):
+    def __init__(self, api_key, retriever, intent_classifier=None,
+                 speculative=True, speculative_actions=False, answer_cache=None,
+                 context_packer=None, score_floor=None):
         """
         Initialize the orchestrator with all required components.
         
         Args:
             api_key: Mistral API key
             retriever: Retrieval system instance
+            intent_classifier: Local intent classifier to share between orchestrators
+                (default: one trained from the prompt few-shots and logged queries)
+            speculative: Run retrieval concurrently with intent classification
+            speculative_actions: Also start action JSON generation during classification
+                (saves a round trip for actions at the cost of an extra LLM call for questions)
+            answer_cache: Semantic answer cache to share between orchestrators (None disables it)
+            context_packer: Context packer to share between orchestrators
+                (default: one with the CONTEXT_TOKEN_BUDGET budget; a budget of 0 disables packing)
+            score_floor: Minimum similarity of the best retrieved chunk for the LLM to be
+                asked at all (None disables the check)
         """
-        self.intent_router = LangChainIntentRouter(api_key)
-        self.answer_generator = LangChainAnswerGenerator(api_key, retriever)
+        if intent_classifier is None:
+            intent_classifier = LocalIntentClassifier(
+                retriever, threshold=float(os.getenv('INTENT_CONFIDENCE_THRESHOLD', '0.9'))
+            )
+        self.intent_router = LangChainIntentRouter(api_key, local_classifier=intent_classifier)
+        self.retriever = retriever
+        self.speculative = speculative
+        self.speculative_actions = speculative_actions
+        if context_packer is None and int(os.getenv('CONTEXT_TOKEN_BUDGET', '1500')):
+            context_packer = ContextPacker(max_tokens=int(os.getenv('CONTEXT_TOKEN_BUDGET', '1500')))
+        self.answer_generator = LangChainAnswerGenerator(
+            api_key, retriever, answer_cache, context_packer, score_floor
+        )
         self.action_generator = ActionGenerator(api_key)
         self.logger = SystemLogger()
         self.conversation = ConversationHistory()
     
+    def for_session(self):
+        """
+        Create an orchestrator for one chat session that shares this one's components.
+        
+        LLM clients, the answer generator, action generator and logger are stateless
+        per query and are shared; the session gets its own conversation history and
+        intent router view (which records the tier that classified its last query).
+        
+        Returns:
+            AgentOrchestrator: Session orchestrator
+        """
+        session = copy.copy(self)
+        session.intent_router = copy.copy(self.intent_router)
+        session.conversation = ConversationHistory()
+        return session
+    
     def process_query(self, query):
         """
         Process user query through the complete agent pipeline.
@@ -43,78 +91,350 @@ class AgentOrchestrator:
             query: User input string
             
         Returns:
-            dict: Response containing type, content, and metadata
+            dict: Response containing type, content, per-stage timings and metadata
         """
         print(f"\n[ORCHESTRATOR] Processing query: {query}")
         self.logger.log_query(query)
+        start = time.perf_counter()
+        timings = {"mode": "speculative" if self.speculative else "sequential"}
         
         try:
             # Step 0: Safety override check
-            query_lower = query.lower()
-            if any(keyword in query_lower for keyword in self.SAFETY_KEYWORDS):
-                print("[ORCHESTRATOR] Safety override triggered - routing to INFO_QUERY")
-                safety_response = "This is a publicly released annual report. I cannot provide confidential or internal-only information. I can summarize publicly disclosed risks and challenges if you'd like."
-                self.logger.log_response("SAFETY_REFUSAL", safety_response)
-                self.conversation.add_exchange(query, safety_response, "INFO_QUERY")
-                return {
-                    "type": "INFO_QUERY",
-                    "content": safety_response,
-                    "query": query
-                }
-            
-            # Step 1: Classify intent
-            print("[ORCHESTRATOR] Step 1: Classifying intent...")
-            intent = self.intent_router.classify_intent(query)
-            print(f"[ORCHESTRATOR] Intent classified as: {intent}")
-            self.logger.log_query(query, intent)
+            response = self._safety_override(query)
+            if response is None and self.speculative:
+                response = self._process_speculative(query, timings)
+            elif response is None:
+                response = self._process_sequential(query, timings)
+            return self._with_timings(response, timings, start)
+        
+        except Exception as e:
+            self.logger.log_error(e)
+            raise
+    
+    def _process_sequential(self, query, timings):
+        """Classify, then retrieve and answer (or generate the action)."""
+        # Step 1: Classify intent
+        print("[ORCHESTRATOR] Step 1: Classifying intent...")
+        intent, timings["classify_ms"] = self._timed(self.intent_router.classify_intent, query)
+        self._log_intent(query, intent)
+        
+        # Get conversation context
+        context = self.conversation.get_context(last_n=3)
+        
+        # Step 2: Route based on intent
+        if intent == "ACTION_REQUEST":
+            print("[ORCHESTRATOR] Step 2: Routing to Action Generator...")
+            action_json, timings["action_ms"] = self._timed(self.action_generator.generate_action, query)
+            return self._action_response(query, action_json)
+        
+        self._log_info_route(intent)
+        chunks, timings["retrieve_ms"] = self._timed(self.retriever.retrieve, query, self.answer_generator.top_k)
+        answer, timings["generate_ms"] = self._timed(
+            self.answer_generator.answer_from_chunks, query, chunks, context
+        )
+        return self._info_response(query, answer, chunks)
+    
+    def _process_speculative(self, query, timings):
+        """
+        Start retrieval (and optionally action generation) while the intent is classified,
+        then keep the branch the intent selects.
+        
+        The critical path becomes encode + max(classify, search) + generate.
+        """
+        # One embedding feeds both the local intent classifier and the FAISS search
+        embedding, timings["encode_ms"] = self._timed(self.retriever.encode_queries, [query])
+        retrieval = SPECULATION_POOL.submit(
+            self._timed, self.retriever.search, embedding, self.answer_generator.top_k, [query]
+        )
+        action = None
+        if self.speculative_actions:
+            action = SPECULATION_POOL.submit(self._timed, self.action_generator.generate_action, query)
+        
+        print("[ORCHESTRATOR] Step 1: Classifying intent (retrieval running speculatively)...")
+        intent, timings["classify_ms"] = self._timed(self.intent_router.classify_intent, query, embedding[0])
+        self._log_intent(query, intent)
+        context = self.conversation.get_context(last_n=3)
+        
+        if intent == "ACTION_REQUEST":
+            # A search that already started just finishes unused; it is cheap
+            retrieval.cancel()
+            print("[ORCHESTRATOR] Step 2: Routing to Action Generator...")
+            if action is not None:
+                action_json, timings["action_ms"] = action.result()
+            else:
+                action_json, timings["action_ms"] = self._timed(self.action_generator.generate_action, query)
+            return self._action_response(query, action_json)
+        
+        if action is not None:
+            action.cancel()
+        self._log_info_route(intent)
+        results, timings["retrieve_ms"] = retrieval.result()
+        answer, timings["generate_ms"] = self._timed(
+            self.answer_generator.answer_from_chunks, query, results[0], context, embedding[0]
+        )
+        return self._info_response(query, answer, results[0])
+    
+    async def aprocess_query(self, query):
+        """
+        Process user query without blocking the event loop.
+        
+        Same pipeline as process_query, using the async LLM clients and the
+        retriever's thread pool, so concurrent sessions overlap their waits.
+        
+        Args:
+            query: User input string
             
-            # Get conversation context
-            context = self.conversation.get_context(last_n=3)
+        Returns:
+            dict: Response containing type, content, per-stage timings and metadata
+        """
+        print(f"\n[ORCHESTRATOR] Processing query: {query}")
+        self.logger.log_query(query)
+        start = time.perf_counter()
+        timings = {"mode": "speculative" if self.speculative else "sequential"}
+        
+        try:
+            response = self._safety_override(query)
+            if response is None and self.speculative:
+                response = await self._aprocess_speculative(query, timings)
+            elif response is None:
+                response = await self._aprocess_sequential(query, timings)
+            return self._with_timings(response, timings, start)
+        
+        except Exception as e:
+            self.logger.log_error(e)
+            raise
+    
+    async def _aprocess_sequential(self, query, timings):
+        """Async variant of _process_sequential."""
+        print("[ORCHESTRATOR] Step 1: Classifying intent...")
+        intent, timings["classify_ms"] = await self._atimed(self.intent_router.aclassify_intent(query))
+        self._log_intent(query, intent)
+        
+        context = self.conversation.get_context(last_n=3)
+        
+        if intent == "ACTION_REQUEST":
+            print("[ORCHESTRATOR] Step 2: Routing to Action Generator...")
+            action_json, timings["action_ms"] = await self._atimed(self.action_generator.agenerate_action(query))
+            return self._action_response(query, action_json)
+        
+        self._log_info_route(intent)
+        chunks, timings["retrieve_ms"] = await self._atimed(
+            self.retriever.aretrieve(query, self.answer_generator.top_k)
+        )
+        answer, timings["generate_ms"] = await self._atimed(
+            self.answer_generator.aanswer_from_chunks(query, chunks, context)
+        )
+        return self._info_response(query, answer, chunks)
+    
+    async def _aprocess_speculative(self, query, timings):
+        """Async variant of _process_speculative; unused branches are cancelled."""
+        intent, embedding, retrieval, action = await self._astart_speculative(query, timings)
+        context = self.conversation.get_context(last_n=3)
+        
+        if intent == "ACTION_REQUEST":
+            return await self._afinish_action(query, retrieval, action, timings)
+        
+        self._discard(action)
+        self._log_info_route(intent)
+        results, timings["retrieve_ms"] = await retrieval
+        answer, timings["generate_ms"] = await self._atimed(
+            self.answer_generator.aanswer_from_chunks(query, results[0], context, embedding[0])
+        )
+        return self._info_response(query, answer, results[0])
+    
+    async def astream_query(self, query):
+        """
+        Process user query like aprocess_query, streaming the answer as it is generated.
+        
+        Args:
+            query: User input string
             
-            # Step 2: Route based on intent
-            if intent == "INFO_QUERY":
-                print("[ORCHESTRATOR] Step 2: Routing to RAG Answer Generator...")
-                answer = self.answer_generator.generate_answer(query, context)
-                print("[ORCHESTRATOR] Answer generated successfully")
-                self.logger.log_response("INFO_QUERY", answer)
-                self.conversation.add_exchange(query, answer, "INFO_QUERY")
-                
-                return {
-                    "type": "INFO_QUERY",
-                    "content": answer,
-                    "query": query
-                }
+        Yields:
+            tuple: ("token", text) and ("citations", text) events for information queries,
+            then ("response", dict) with the same response aprocess_query returns
+        """
+        print(f"\n[ORCHESTRATOR] Processing query (streaming): {query}")
+        self.logger.log_query(query)
+        start = time.perf_counter()
+        timings = {"mode": "streaming-speculative" if self.speculative else "streaming-sequential"}
+        
+        try:
+            response = self._safety_override(query)
+            chunks, embedding = None, None
+            if response is None and self.speculative:
+                intent, embeddings, retrieval, action = await self._astart_speculative(query, timings)
+                if intent == "ACTION_REQUEST":
+                    response = await self._afinish_action(query, retrieval, action, timings)
+                else:
+                    self._discard(action)
+                    self._log_info_route(intent)
+                    results, timings["retrieve_ms"] = await retrieval
+                    chunks, embedding = results[0], embeddings[0]
+            elif response is None:
+                print("[ORCHESTRATOR] Step 1: Classifying intent...")
+                intent, timings["classify_ms"] = await self._atimed(self.intent_router.aclassify_intent(query))
+                self._log_intent(query, intent)
+                if intent == "ACTION_REQUEST":
+                    print("[ORCHESTRATOR] Step 2: Routing to Action Generator...")
+                    action_json, timings["action_ms"] = await self._atimed(self.action_generator.agenerate_action(query))
+                    response = self._action_response(query, action_json)
+                else:
+                    self._log_info_route(intent)
+                    chunks, timings["retrieve_ms"] = await self._atimed(
+                        self.retriever.aretrieve(query, self.answer_generator.top_k)
+                    )
             
-            elif intent == "ACTION_REQUEST":
-                print("[ORCHESTRATOR] Step 2: Routing to Action Generator...")
-                action_json = self.action_generator.generate_action(query)
-                print("[ORCHESTRATOR] Action JSON generated successfully")
-                self.logger.log_action(action_json.get('action', 'unknown'), "PENDING")
-                self.conversation.add_exchange(query, action_json, "ACTION_REQUEST")
-                
-                return {
-                    "type": "ACTION_REQUEST",
-                    "content": action_json,
-                    "query": query
-                }
+            if response is None:
+                context = self.conversation.get_context(last_n=3)
+                generate_start = time.perf_counter()
+                answer = ""
+                async for kind, text in self.answer_generator.astream_answer(query, chunks, context, embedding):
+                    if kind == "answer":
+                        answer = text
+                        continue
+                    if "first_token_ms" not in timings:
+                        # Latency the user actually feels
+                        timings["first_token_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                    yield kind, text
+                timings["generate_ms"] = round((time.perf_counter() - generate_start) * 1000, 1)
+                response = self._info_response(query, answer, chunks)
             
-            else:
-                # Fallback
-                print("[ORCHESTRATOR] Warning: Unknown intent, defaulting to INFO_QUERY")
-                answer = self.answer_generator.generate_answer(query, context)
-                self.logger.log_response("INFO_QUERY", answer)
-                self.conversation.add_exchange(query, answer, "INFO_QUERY")
-                
-                return {
-                    "type": "INFO_QUERY",
-                    "content": answer,
-                    "query": query
-                }
+            yield "response", self._with_timings(response, timings, start)
         
         except Exception as e:
             self.logger.log_error(e)
             raise
     
+    async def _astart_speculative(self, query, timings):
+        """
+        Embed the query once, start speculative retrieval (and action generation) and classify.
+        
+        Returns:
+            tuple: (intent, embedding, retrieval task, action task or None)
+        """
+        embedding, timings["encode_ms"] = await self._atimed(self.retriever.aencode_queries([query]))
+        retrieval = asyncio.create_task(
+            self._atimed(self.retriever.asearch(embedding, self.answer_generator.top_k, [query]))
+        )
+        action = None
+        if self.speculative_actions:
+            action = asyncio.create_task(self._atimed(self.action_generator.agenerate_action(query)))
+        
+        print("[ORCHESTRATOR] Step 1: Classifying intent (retrieval running speculatively)...")
+        try:
+            intent, timings["classify_ms"] = await self._atimed(
+                self.intent_router.aclassify_intent(query, embedding[0])
+            )
+        except BaseException:
+            self._discard(retrieval)
+            self._discard(action)
+            raise
+        self._log_intent(query, intent)
+        return intent, embedding, retrieval, action
+    
+    async def _afinish_action(self, query, retrieval, action, timings):
+        """Drop speculative retrieval and return the (possibly already running) action."""
+        self._discard(retrieval)
+        print("[ORCHESTRATOR] Step 2: Routing to Action Generator...")
+        if action is not None:
+            action_json, timings["action_ms"] = await action
+        else:
+            action_json, timings["action_ms"] = await self._atimed(self.action_generator.agenerate_action(query))
+        return self._action_response(query, action_json)
+    
+    @staticmethod
+    def _timed(fn, *args):
+        """Call fn and return (result, elapsed milliseconds)."""
+        start = time.perf_counter()
+        result = fn(*args)
+        return result, round((time.perf_counter() - start) * 1000, 1)
+    
+    @staticmethod
+    async def _atimed(awaitable):
+        """Await and return (result, elapsed milliseconds)."""
+        start = time.perf_counter()
+        result = await awaitable
+        return result, round((time.perf_counter() - start) * 1000, 1)
+    
+    @staticmethod
+    def _discard(task):
+        """Cancel a speculative task whose result is not needed."""
+        if task is not None and not task.cancel() and not task.cancelled():
+            # Already finished: retrieve any exception so it is not reported as unhandled
+            task.exception()
+    
+    def _with_timings(self, response, timings, start):
+        """Attach and log per-stage timings."""
+        timings["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        print(f"[ORCHESTRATOR] Timings: {timings}")
+        self.logger.log_timings(timings)
+        response["timings"] = timings
+        return response
+    
+    def _safety_override(self, query):
+        """Return a refusal response if the query asks for confidential information, else None."""
+        query_lower = query.lower()
+        if not any(keyword in query_lower for keyword in self.SAFETY_KEYWORDS):
+            return None
+        
+        print("[ORCHESTRATOR] Safety override triggered - routing to INFO_QUERY")
+        safety_response = "This is a publicly released annual report. I cannot provide confidential or internal-only information. I can summarize publicly disclosed risks and challenges if you'd like."
+        self.logger.log_response("SAFETY_REFUSAL", safety_response)
+        self.conversation.add_exchange(query, safety_response, "INFO_QUERY")
+        return {
+            "type": "INFO_QUERY",
+            "content": safety_response,
+            "query": query
+        }
+    
+    def _log_intent(self, query, intent):
+        """Record the classified intent."""
+        source = self.intent_router.last_source
+        print(f"[ORCHESTRATOR] Intent classified as: {intent} ({source})")
+        self.logger.log_query(query, intent, source=source)
+    
+    def _log_info_route(self, intent):
+        """Report routing to the RAG answer generator."""
+        if intent == "INFO_QUERY":
+            print("[ORCHESTRATOR] Step 2: Routing to RAG Answer Generator...")
+        else:
+            # Fallback
+            print("[ORCHESTRATOR] Warning: Unknown intent, defaulting to INFO_QUERY")
+    
+    def _info_response(self, query, answer, chunks=None):
+        """Log and record an answer, and wrap it as an INFO_QUERY response with its sources."""
+        print("[ORCHESTRATOR] Answer generated successfully")
+        self.logger.log_response("INFO_QUERY", answer)
+        self.conversation.add_exchange(query, answer, "INFO_QUERY")
+        
+        return {
+            "type": "INFO_QUERY",
+            "content": answer,
+            "query": query,
+            "sources": self.format_sources(chunks or [])
+        }
+    
+    @staticmethod
+    def format_sources(chunks):
+        """Retrieval hits without their text: chunk id, scores, pages and block ids."""
+        return [
+            {key: chunk.get(key) for key in ('id', 'score', 'similarity', 'rerank_score', 'pages', 'blocks')
+             if key in chunk}
+            for chunk in chunks
+        ]
+    
+    def _action_response(self, query, action_json):
+        """Log and record an action, and wrap it as an ACTION_REQUEST response."""
+        print("[ORCHESTRATOR] Action JSON generated successfully")
+        self.logger.log_action(action_json.get('action', 'unknown'), "PENDING")
+        self.conversation.add_exchange(query, action_json, "ACTION_REQUEST")
+        
+        return {
+            "type": "ACTION_REQUEST",
+            "content": action_json,
+            "query": query
+        }
+    
     def format_response(self, response):
         """
         Format the response for clean output.
@@ -0,0 +1,192 @@
+"""
+Bounded store of chat sessions for the API.
+Each session holds only per-chat state (its conversation and a lightweight
+orchestrator view sharing the LLM clients); sessions are evicted least recently
+used past a count or memory cap, and after an idle timeout.
+"""
+import time
+import threading
+from collections import OrderedDict, deque
+
+# Approximate fixed footprint of one session (orchestrator view, router view, bookkeeping)
+SESSION_OVERHEAD_BYTES = 4096
+
+# Client messages retained per session (older ones are dropped)
+HISTORY_LIMIT = 50
+
+
+def _approx_bytes(value):
+    """Rough in-memory size of a message or exchange, dominated by its text."""
+    if isinstance(value, dict):
+        return sum(len(str(key)) + _approx_bytes(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(_approx_bytes(item) for item in value)
+    return len(str(value))
+
+
+class Session:
+    """Per-chat state: a session orchestrator and the client's message history."""
+
+    def __init__(self, chat_id, orchestrator, history_limit=HISTORY_LIMIT):
+        self.chat_id = chat_id
+        self.orchestrator = orchestrator
+        # Append-only (seq, role, content, timestamp) tuples; seq numbers the chat's
+        # messages from 1 and keeps counting after old entries fall off the front
+        self.history = deque(maxlen=history_limit)
+        self.seq = 0
+        self.created_at = time.time()
+        self.last_seen = self.created_at
+        self.nbytes = SESSION_OVERHEAD_BYTES
+        self._lock = threading.Lock()
+
+    def merge_history(self, messages, cursor=None):
+        """
+        Append the client messages the session has not received yet.
+
+        Messages are matched by position, so each call costs O(new messages).
+
+        Args:
+            messages: Messages following seq cursor; without a cursor (clients
+                that resend everything), the full history from seq 1
+            cursor: Seq of the last message the client knows the server holds
+
+        Returns:
+            int: Seq of the last message held after merging (the client's next cursor)
+        """
+        cursor = max(int(cursor or 0), 0)
+        with self._lock:
+            if cursor > self.seq:
+                # Messages up to the cursor are gone (evicted session or restart); keep the numbering
+                self.seq = cursor
+            for msg in messages[self.seq - cursor:]:
+                self.seq += 1
+                self.history.append((self.seq, msg.get('role'), msg.get('content'), msg.get('timestamp')))
+            return self.seq
+
+    def messages(self, after=0):
+        """Retained messages with seq greater than after, as dictionaries."""
+        with self._lock:
+            entries = [entry for entry in self.history if entry[0] > after]
+        return [
+            {'seq': seq, 'role': role, 'content': content, 'timestamp': timestamp}
+            for seq, role, content, timestamp in entries
+        ]
+
+    def measure(self):
+        """Re-estimate the session's memory footprint in bytes."""
+        exchanges = getattr(self.orchestrator, 'conversation', None)
+        self.nbytes = (
+            SESSION_OVERHEAD_BYTES
+            + _approx_bytes(list(self.history))
+            + _approx_bytes(list(exchanges.history) if exchanges is not None else [])
+        )
+        return self.nbytes
+
+
+class SessionManager:
+    """Thread-safe LRU map of chat id -> Session with idle-TTL and memory-cap eviction."""
+
+    def __init__(self, factory, max_sessions=1000, idle_ttl=1800, max_bytes=None, history_limit=HISTORY_LIMIT):
+        """
+        Initialize the manager.
+
+        Args:
+            factory: Callable returning a new session orchestrator
+            max_sessions: Maximum live sessions before LRU eviction
+            idle_ttl: Seconds without a request after which a session is dropped (None = never)
+            max_bytes: Optional cap on the estimated memory of all sessions
+            history_limit: Client messages retained per session
+        """
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+        self.history_limit = history_limit
+
+        self._sessions = OrderedDict()  # chat id -> Session, least recently used first
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+        self.created = 0
+        self.evictions = {"lru": 0, "idle": 0, "memory": 0}
+
+    def get(self, chat_id):
+        """
+        Return the session for chat_id, creating it if needed, and enforce the limits.
+
+        The session is marked most recently used and is never evicted by its own call.
+        """
+        now = time.time()
+        with self._lock:
+            self._evict_idle(now)
+            session = self._sessions.get(chat_id)
+            if session is None:
+                session = Session(chat_id, self.factory(), self.history_limit)
+                self._sessions[chat_id] = session
+                self._total_bytes += session.nbytes
+                self.created += 1
+            else:
+                self._sessions.move_to_end(chat_id)
+                # Account for what the previous request added to the session
+                previous = session.nbytes
+                self._total_bytes += session.measure() - previous
+            session.last_seen = now
+            self._enforce_caps()
+            return session
+
+    def remove(self, chat_id):
+        """Drop one session; returns whether it existed."""
+        with self._lock:
+            session = self._sessions.pop(chat_id, None)
+            if session is not None:
+                self._total_bytes -= session.nbytes
+            return session is not None
+
+    def sweep(self):
+        """Evict idle sessions now (also done on every get())."""
+        with self._lock:
+            self._evict_idle(time.time())
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, chat_id):
+        return chat_id in self._sessions
+
+    def stats(self):
+        """Session counts, estimated memory and eviction counters."""
+        self.sweep()
+        with self._lock:
+            return {
+                "active": len(self._sessions),
+                "created": self.created,
+                "evictions": dict(self.evictions),
+                "approx_bytes": self._total_bytes,
+                "max_sessions": self.max_sessions,
+                "idle_ttl": self.idle_ttl,
+                "max_bytes": self.max_bytes
+            }
+
+    def _evict_idle(self, now):
+        """Drop sessions idle longer than idle_ttl; the oldest are at the front."""
+        if self.idle_ttl is None:
+            return
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_seen <= self.idle_ttl:
+                break
+            self._pop_oldest("idle")
+
+    def _enforce_caps(self):
+        """Drop least recently used sessions past the count or memory cap, keeping the newest."""
+        while len(self._sessions) > 1:
+            if len(self._sessions) > self.max_sessions:
+                self._pop_oldest("lru")
+            elif self.max_bytes is not None and self._total_bytes > self.max_bytes:
+                self._pop_oldest("memory")
+            else:
+                break
+
+    def _pop_oldest(self, reason):
+        _, session = self._sessions.popitem(last=False)
+        self._total_bytes -= session.nbytes
+        self.evictions[reason] += 1
@@ -0,0 +1,130 @@
+# Recall-vs-latency benchmark of approximate FAISS indexes against the flat index
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+import faiss
+import logging
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embeddings.build_faiss_index import (
+    build_faiss_index, resolve_index_params, apply_search_params, load_index_params, load_embedding_model
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Search-time sweeps per index type
+SWEEPS = {
+    'ivf_flat': ('nprobe', [1, 2, 4, 8, 16, 32]),
+    'hnsw': ('ef_search', [16, 32, 64, 128, 256]),
+    'ivf_pq': ('nprobe', [1, 2, 4, 8, 16, 32]),
+    'opq_ivf_pq': ('nprobe', [1, 2, 4, 8, 16, 32]),
+}
+
+def load_corpus_embeddings(cache_dir):
+    """Reconstruct chunk embeddings from the cached flat index (no re-embedding needed)"""
+    if load_index_params(cache_dir).get('index_type') != 'flat':
+        raise ValueError("Benchmark needs exact vectors; rebuild the cache with --index-type flat first")
+    index = faiss.read_index(os.path.join(cache_dir, 'index.faiss'))
+    if hasattr(index, 'id_map'):
+        # ID-mapped caches wrap the flat index; reconstruct by storage position
+        index = faiss.downcast_index(index.index)
+    return index.reconstruct_n(0, index.ntotal).astype(np.float32)
+
+def load_queries(corpus, queries_file=None, num_queries=200, seed=0):
+    """Encode queries from a file, or sample corpus vectors as pseudo-queries"""
+    if queries_file:
+        with open(queries_file, 'r', encoding='utf-8') as f:
+            queries = [line.strip() for line in f if line.strip()]
+        model = load_embedding_model()
+        return model.encode([f"query: {q}" for q in queries], convert_to_numpy=True,
+                            normalize_embeddings=True).astype(np.float32)
+
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(corpus), size=min(num_queries, len(corpus)), replace=False)
+    return corpus[rows]
+
+def timed_search(index, queries, top_k):
+    """Search one query at a time (the serving pattern) and return results and latencies in ms"""
+    latencies = []
+    results = np.empty((len(queries), top_k), dtype=np.int64)
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        _, indices = index.search(queries[i:i + 1], top_k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results[i] = indices[0]
+    return results, np.array(latencies)
+
+def recall_at_k(results, ground_truth):
+    """Fraction of exact top-k neighbours recovered by the approximate search"""
+    hits = sum(len(set(r[r >= 0]) & set(g)) for r, g in zip(results, ground_truth))
+    return hits / ground_truth.size
+
+def run_benchmark(corpus, queries, top_k=5, index_types=None):
+    """Benchmark each index type over its search-time sweep"""
+    report = []
+
+    flat = build_faiss_index(corpus, 'flat')
+    ground_truth, latencies = timed_search(flat, queries, top_k)
+    report.append({
+        'index_type': 'flat', 'params': {}, 'recall': 1.0, 'build_s': 0.0,
+        'mean_ms': float(latencies.mean()), 'p95_ms': float(np.percentile(latencies, 95))
+    })
+
+    for index_type in index_types or SWEEPS:
+        knob, values = SWEEPS[index_type]
+        params = resolve_index_params(index_type, len(corpus))
+        try:
+            start = time.perf_counter()
+            index = build_faiss_index(corpus, **params)
+            build_s = time.perf_counter() - start
+        except (ValueError, RuntimeError) as e:
+            logger.warning(f"Skipping {index_type}: {e}")
+            continue
+
+        for value in values:
+            apply_search_params(index, {knob: value})
+            results, latencies = timed_search(index, queries, top_k)
+            report.append({
+                'index_type': index_type,
+                'params': {**params, knob: value},
+                'recall': round(recall_at_k(results, ground_truth), 4),
+                'build_s': round(build_s, 3),
+                'mean_ms': float(latencies.mean()),
+                'p95_ms': float(np.percentile(latencies, 95))
+            })
+
+    return report
+
+def print_report(report, top_k):
+    """Print a compact recall/latency table"""
+    print(f"\n{'index':<12} {'setting':<16} {f'recall@{top_k}':>10} {'mean ms':>9} {'p95 ms':>9} {'build s':>9}")
+    for row in report:
+        knob = SWEEPS.get(row['index_type'], (None,))[0]
+        setting = f"{knob}={row['params'][knob]}" if knob else "-"
+        print(f"{row['index_type']:<12} {setting:<16} {row['recall']:>10.4f} "
+              f"{row['mean_ms']:>9.3f} {row['p95_ms']:>9.3f} {row['build_s']:>9.3f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall-vs-latency report for FAISS index types")
+    parser.add_argument('--cache-dir', default='data/faiss_cache')
+    parser.add_argument('--queries-file', help="Text file with one query per line (default: sampled chunk vectors)")
+    parser.add_argument('--num-queries', type=int, default=200)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--index-types', nargs='+', choices=list(SWEEPS))
+    parser.add_argument('--output', default='data/faiss_cache/index_benchmark.json')
+    args = parser.parse_args()
+
+    corpus = load_corpus_embeddings(args.cache_dir)
+    queries = load_queries(corpus, args.queries_file, args.num_queries)
+    report = run_benchmark(corpus, queries, args.top_k, args.index_types)
+    print_report(report, args.top_k)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'num_vectors': len(corpus), 'num_queries': len(queries),
+                   'top_k': args.top_k, 'results': report}, f, indent=2)
+    logger.info(f"Benchmark report saved to {args.output}")
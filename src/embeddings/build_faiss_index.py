@@ -1,14 +1,46 @@
+import argparse
+import functools
+import hashlib
 import json
+import math
 import os
 import pickle
+import sys
 import numpy as np
 import faiss
-from sentence_transformers import SentenceTransformer
 import logging
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingestion.cdfg_chunker import default_chunker_params
+from retrieval.chunk_store import ChunkStore, CHUNK_STORE_DIR
+from retrieval.bm25 import BM25Index, BM25_DIR
+from retrieval.corpus import CorpusRegistry, REGISTRY_PATH
+from embeddings.embedding_backend import load_encoder, resolve_backend, EMBEDDING_BACKENDS
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+MODEL_NAME = 'intfloat/e5-large-v2'
+INDEX_PARAMS_FILE = 'index_params.json'
+MANIFEST_FILE = 'manifest.json'
+MANIFEST_VERSION = 1
+
+# Supported index types and their default build/search parameters
+INDEX_TYPES = {
+    'flat': {},
+    'ivf_flat': {'nlist': None, 'nprobe': 8},
+    'hnsw': {'hnsw_m': 32, 'ef_construction': 200, 'ef_search': 64},
+    'ivf_pq': {'nlist': None, 'nprobe': 8, 'pq_m': 64, 'pq_bits': 8},
+    'opq_ivf_pq': {'nlist': None, 'nprobe': 8, 'pq_m': 64, 'pq_bits': 8},
+}
+
+# Parameters that only affect search; changing them never requires a rebuild
+SEARCH_PARAMS = ('nprobe', 'ef_search')
+
+# Index types whose vectors cannot be removed in place
+NON_REMOVABLE_TYPES = ('hnsw',)
+
 def load_chunks(chunks_path):
     """Load chunks from JSON file"""
     with open(chunks_path, 'r', encoding='utf-8') as f:
@@ -16,6 +48,30 @@ def load_chunks(chunks_path):
     logger.info(f"Loaded {len(chunks)} chunks")
     return chunks
 
+def chunk_hash(chunk):
+    """Content hash of a chunk's text"""
+    return hashlib.sha256(chunk['text'].encode('utf-8')).hexdigest()
+
+def hash_to_id(digest):
+    """Stable non-negative int64 FAISS id derived from a content hash"""
+    return int(digest[:15], 16)
+
+def chunk_faiss_id(chunk):
+    """FAISS id under which a chunk is stored in an ID-mapped index"""
+    return hash_to_id(chunk_hash(chunk))
+
+def load_embedding_model(backend=None):
+    """Load the embedding model once per process on the configured backend (EMBEDDING_BACKEND)"""
+    return _load_embedding_model(resolve_backend(backend))
+
+@functools.lru_cache(maxsize=1)
+def _load_embedding_model(backend):
+    return load_encoder(MODEL_NAME, backend)
+
+def embed_texts(texts, model):
+    """Encode one batch of prefixed texts into normalized float32 embeddings"""
+    return model.encode(texts, convert_to_numpy=True, normalize_embeddings=True).astype(np.float32)
+
 def generate_embeddings(chunks, model, batch_size=32):
     """Generate embeddings for chunks with batch processing"""
     texts = [f"passage: {chunk['text']}" for chunk in chunks]
@@ -25,49 +81,193 @@ def generate_embeddings(chunks, model, batch_size=32):
         batch = texts[i:i + batch_size]
         logger.info(f"Processing batch {i//batch_size + 1}/{(len(texts) + batch_size - 1)//batch_size}")
         
-        batch_embeddings = model.encode(batch, convert_to_numpy=True, normalize_embeddings=True)
-        embeddings.extend(batch_embeddings.astype(np.float32))
+        embeddings.extend(embed_texts(batch, model))
     
     return np.array(embeddings)
 
-def build_faiss_index(embeddings):
-    """Build FAISS index for embeddings"""
+def iter_embedding_batches(chunks, model, batch_size=32):
+    """Embed chunks from any iterable as soon as each batch is full; yields (batch, embeddings)"""
+    batch = []
+    batch_num = 0
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) == batch_size:
+            batch_num += 1
+            logger.info(f"Processing streamed batch {batch_num}")
+            yield batch, embed_texts([f"passage: {c['text']}" for c in batch], model)
+            batch = []
+    if batch:
+        logger.info(f"Processing streamed batch {batch_num + 1}")
+        yield batch, embed_texts([f"passage: {c['text']}" for c in batch], model)
+
+def resolve_index_params(index_type='flat', num_vectors=0, **overrides):
+    """Fill in default build/search parameters for an index type"""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}'. Choose from: {', '.join(INDEX_TYPES)}")
+    
+    params = {'index_type': index_type, **INDEX_TYPES[index_type]}
+    params.update({k: v for k, v in overrides.items() if k in params and v is not None})
+    
+    # Rule of thumb: ~4*sqrt(n) lists, with at least 39 training points per list
+    if 'nlist' in params and params['nlist'] is None:
+        params['nlist'] = max(1, min(int(4 * math.sqrt(num_vectors)), num_vectors // 39))
+    
+    return params
+
+def index_factory_string(params):
+    """FAISS index_factory description for resolved index params"""
+    index_type = params['index_type']
+    if index_type == 'flat':
+        return "Flat"
+    if index_type == 'ivf_flat':
+        return f"IVF{params['nlist']},Flat"
+    if index_type == 'hnsw':
+        return f"HNSW{params['hnsw_m']},Flat"
+    pq = f"PQ{params['pq_m']}x{params['pq_bits']}"
+    if index_type == 'ivf_pq':
+        return f"IVF{params['nlist']},{pq}"
+    return f"OPQ{params['pq_m']},IVF{params['nlist']},{pq}"
+
+def apply_search_params(index, params):
+    """Apply search-time knobs (nprobe, efSearch) to a built or loaded index"""
+    space = faiss.ParameterSpace()
+    if params.get('nprobe') is not None:
+        space.set_index_parameter(index, 'nprobe', int(params['nprobe']))
+    if params.get('ef_search') is not None:
+        space.set_index_parameter(index, 'efSearch', int(params['ef_search']))
+
+def build_faiss_index(embeddings, index_type='flat', ids=None, **params):
+    """Build FAISS index for embeddings, training it first if the index type requires it.
+    
+    When ids are given the index is ID-mapped so vectors can later be removed or added by id.
+    """
     dimension = embeddings.shape[1]
-    index = faiss.IndexFlatIP(dimension)
-    index.add(embeddings)
-    logger.info(f"Built FAISS index with {index.ntotal} vectors, dimension {dimension}")
+    params = resolve_index_params(index_type, len(embeddings), **params)
+    
+    if index_type == 'flat':
+        index = faiss.IndexFlatIP(dimension)
+    else:
+        if 'pq_m' in params and dimension % params['pq_m'] != 0:
+            raise ValueError(f"pq_m={params['pq_m']} must divide embedding dimension {dimension}")
+        index = faiss.index_factory(dimension, index_factory_string(params), faiss.METRIC_INNER_PRODUCT)
+        if 'ef_construction' in params:
+            index.hnsw.efConstruction = params['ef_construction']
+    
+    if not index.is_trained:
+        if 'pq_bits' in params and len(embeddings) < 39 * (1 << params['pq_bits']):
+            logger.warning(f"Training {index_type} on only {len(embeddings)} vectors; PQ codebooks may be poor")
+        logger.info(f"Training {index_type} index on {len(embeddings)} vectors...")
+        index.train(embeddings)
+    
+    if ids is None:
+        index.add(embeddings)
+    else:
+        # IVF indexes store ids natively; flat and HNSW need an id map
+        if index_type in ('flat', 'hnsw'):
+            index = faiss.IndexIDMap2(index)
+        index.add_with_ids(embeddings, np.asarray(ids, dtype=np.int64))
+    apply_search_params(index, params)
+    logger.info(f"Built {index_type} FAISS index with {index.ntotal} vectors, dimension {dimension}")
     return index
 
-def save_index_and_metadata(index, chunks, cache_dir):
-    """Save FAISS index and metadata to cache"""
+def save_index_params(params, cache_dir):
+    """Persist index type and search parameters alongside index.faiss"""
+    with open(os.path.join(cache_dir, INDEX_PARAMS_FILE), 'w', encoding='utf-8') as f:
+        json.dump(params, f, indent=2)
+
+def load_index_params(cache_dir):
+    """Load persisted index parameters (a flat index is assumed if none were saved)"""
+    params_path = os.path.join(cache_dir, INDEX_PARAMS_FILE)
+    if not os.path.exists(params_path):
+        return {'index_type': 'flat'}
+    with open(params_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def build_manifest(chunks, index_params, chunks_path, backend=None):
+    """Describe exactly what the cached index was built from"""
+    hashes = [chunk_hash(chunk) for chunk in chunks]
+    return {
+        'version': MANIFEST_VERSION,
+        'model_name': MODEL_NAME,
+        'embedding_backend': resolve_backend(backend),
+        'chunker': default_chunker_params(),
+        'index_params': index_params,
+        'chunks_path': chunks_path,
+        'id_mapped': True,
+        'chunk_hashes': hashes,
+        'chunk_ids': [chunk['id'] for chunk in chunks]
+    }
+
+def save_manifest(manifest, cache_dir):
+    """Write manifest.json alongside index.faiss"""
+    with open(os.path.join(cache_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+def load_manifest(cache_dir):
+    """Load manifest.json (None for caches built before manifests existed)"""
+    manifest_path = os.path.join(cache_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def index_version(index_path):
+    """Fingerprint of a saved index file; changes whenever the index is rebuilt"""
+    stat = os.stat(index_path)
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+def manifest_is_compatible(manifest, index_type, index_params, backend=None):
+    """Whether a cached index can be reused or updated incrementally"""
+    if not manifest or manifest.get('version') != MANIFEST_VERSION:
+        return False
+    if manifest.get('model_name') != MODEL_NAME or manifest.get('chunker') != default_chunker_params():
+        return False
+    # Vectors from different backends differ slightly; one index never mixes them
+    # (manifests written before backends existed were built with torch)
+    if manifest.get('embedding_backend', 'torch') != resolve_backend(backend):
+        return False
+    
+    cached_params = manifest.get('index_params', {})
+    if cached_params.get('index_type') != index_type:
+        return False
+    
+    # Explicitly requested build-time parameters must match what was built
+    return all(
+        cached_params.get(key) == value
+        for key, value in index_params.items()
+        if value is not None and key not in SEARCH_PARAMS
+    )
+
+def save_index_and_metadata(index, chunks, cache_dir, index_params=None):
+    """Save FAISS index and the memory-mapped chunk store to cache"""
     os.makedirs(cache_dir, exist_ok=True)
     
     # Save FAISS index
     index_path = os.path.join(cache_dir, 'index.faiss')
     faiss.write_index(index, index_path)
+    save_index_params(index_params or {'index_type': 'flat'}, cache_dir)
     
-    # Save metadata - adapt to actual chunk structure
-    metadata = []
-    for chunk in chunks:
-        metadata.append({
-            'chunk_id': chunk['id'],
-            'section': chunk.get('section', 'Unknown'),
-            'page_start': min(chunk['pages']) if chunk.get('pages') else 1,
-            'page_end': max(chunk['pages']) if chunk.get('pages') else 1,
-            'text': chunk['text']
-        })
+    # Save chunk text and pages once, as a columnar store shared by builder and retriever
+    ChunkStore.write(chunks, os.path.join(cache_dir, CHUNK_STORE_DIR),
+                     faiss_ids=[chunk_faiss_id(chunk) for chunk in chunks])
     
-    metadata_path = os.path.join(cache_dir, 'metadata.pkl')
-    with open(metadata_path, 'wb') as f:
-        pickle.dump(metadata, f)
+    # Sparse BM25 postings over the same rows, for hybrid retrieval
+    BM25Index.write(chunks, os.path.join(cache_dir, BM25_DIR))
     
-    logger.info(f"Saved index and metadata to {cache_dir}")
+    logger.info(f"Saved index and chunk store to {cache_dir}")
 
 def load_cached_index(cache_dir):
-    """Load FAISS index and metadata from cache"""
+    """Load FAISS index and chunk metadata from cache"""
     index_path = os.path.join(cache_dir, 'index.faiss')
+    store_dir = os.path.join(cache_dir, CHUNK_STORE_DIR)
     metadata_path = os.path.join(cache_dir, 'metadata.pkl')
     
+    if os.path.exists(index_path) and ChunkStore.exists(store_dir):
+        index = faiss.read_index(index_path)
+        logger.info(f"Loaded cached index with {index.ntotal} vectors")
+        return index, ChunkStore(store_dir)
+    
+    # Caches written before the chunk store existed
     if os.path.exists(index_path) and os.path.exists(metadata_path):
         index = faiss.read_index(index_path)
         with open(metadata_path, 'rb') as f:
@@ -77,38 +277,170 @@ def load_cached_index(cache_dir):
     
     return None, None
 
-def build_or_load_index():
-    """Main function to build or load FAISS index"""
-    chunks_path = 'data/chunks/Annual-Report-2024-25.json'
-    cache_dir = 'data/faiss_cache'
+def unique_chunks_by_id(chunks):
+    """Map FAISS id -> first chunk with that content (duplicate texts share one vector)"""
+    unique = {}
+    for chunk in chunks:
+        unique.setdefault(chunk_faiss_id(chunk), chunk)
+    return unique
+
+def update_index_incrementally(index, manifest, chunks, model):
+    """Remove vectors of deleted chunks and embed only new or changed ones"""
+    index_type = manifest['index_params']['index_type']
+    cached_ids = {hash_to_id(h) for h in manifest['chunk_hashes']}
+    current = unique_chunks_by_id(chunks)
     
-    # Try to load from cache first
-    index, metadata = load_cached_index(cache_dir)
+    removed = cached_ids - current.keys()
+    added = [faiss_id for faiss_id in current if faiss_id not in cached_ids]
     
-    if index is not None and metadata is not None:
-        logger.info("Using cached index")
-        return index, metadata
+    if removed and index_type in NON_REMOVABLE_TYPES:
+        logger.info(f"{index_type} index cannot remove vectors; falling back to full rebuild")
+        return None
+    
+    if removed:
+        index.remove_ids(np.array(sorted(removed), dtype=np.int64))
+    if added:
+        logger.info(f"Embedding {len(added)} new or changed chunks...")
+        embeddings = generate_embeddings([current[i] for i in added], model)
+        index.add_with_ids(embeddings, np.array(added, dtype=np.int64))
+    
+    logger.info(f"Incremental update: {len(added)} added, {len(removed)} removed, {index.ntotal} vectors total")
+    return index
+
+def build_index_from_stream(chunks, model, cache_dir, chunks_path, index_type='flat', batch_size=32,
+                            backend=None, **index_params):
+    """Build and cache an index from a chunk iterator, embedding while upstream stages still run
+    
+    backend names the embedding backend model runs on, for the manifest.
+    """
+    all_chunks = []
+    unique_ids = []
+    vectors = []
+    seen = set()
+    
+    for batch, embeddings in iter_embedding_batches(chunks, model, batch_size):
+        for chunk, embedding in zip(batch, embeddings):
+            all_chunks.append(chunk)
+            faiss_id = chunk_faiss_id(chunk)
+            if faiss_id not in seen:
+                seen.add(faiss_id)
+                unique_ids.append(faiss_id)
+                vectors.append(embedding)
+    
+    if not vectors:
+        raise ValueError("No chunks were produced; nothing to index")
     
-    # Load chunks
+    params = resolve_index_params(index_type, len(vectors), **index_params)
+    index = build_faiss_index(np.vstack(vectors), ids=unique_ids, **params)
+    save_index_and_metadata(index, all_chunks, cache_dir, params)
+    save_manifest(build_manifest(all_chunks, params, chunks_path, backend), cache_dir)
+    return index, all_chunks
+
+def build_or_load_index(chunks_path, cache_dir, index_type='flat', incremental=True, backend=None, **index_params):
+    """Main function to build, incrementally update or load one document's FAISS index shard"""
+    backend = resolve_backend(backend)
+    # Load chunks and compare against what the cached index was built from
     chunks = load_chunks(chunks_path)
+    index, metadata = load_cached_index(cache_dir)
+    manifest = load_manifest(cache_dir)
+    
+    if index is not None and manifest_is_compatible(manifest, index_type, index_params, backend):
+        params = {**manifest['index_params'],
+                  **{k: v for k, v in index_params.items() if k in SEARCH_PARAMS and v is not None}}
+        apply_search_params(index, params)
+        
+        if manifest['chunk_hashes'] == [chunk_hash(chunk) for chunk in chunks]:
+            logger.info("Using cached index")
+            if not BM25Index.exists(os.path.join(cache_dir, BM25_DIR)):
+                # Caches built before hybrid retrieval existed
+                BM25Index.write(chunks, os.path.join(cache_dir, BM25_DIR))
+            store_dir = os.path.join(cache_dir, CHUNK_STORE_DIR)
+            if not ChunkStore.is_current(store_dir):
+                # Stores written before block ids and section metadata were kept; no re-embedding needed
+                ChunkStore.write(chunks, store_dir, faiss_ids=[chunk_faiss_id(chunk) for chunk in chunks])
+                metadata = ChunkStore(store_dir)
+            if params != manifest['index_params']:
+                manifest['index_params'] = params
+                save_index_params(params, cache_dir)
+                save_manifest(manifest, cache_dir)
+            return index, metadata
+        
+        if incremental:
+            model = load_embedding_model(backend)
+            updated = update_index_incrementally(index, manifest, chunks, model)
+            if updated is not None:
+                save_index_and_metadata(updated, chunks, cache_dir, params)
+                save_manifest(build_manifest(chunks, params, chunks_path, backend), cache_dir)
+                return updated, chunks
+    elif index is not None:
+        logger.info("Cached index was built from different settings or has no manifest, rebuilding")
     
     # Load embedding model
-    logger.info("Loading embedding model: intfloat/e5-large-v2")
-    model = SentenceTransformer('intfloat/e5-large-v2')
+    model = load_embedding_model(backend)
     
-    # Generate embeddings
+    # Generate embeddings for each distinct chunk text
     logger.info("Generating embeddings...")
-    embeddings = generate_embeddings(chunks, model)
+    unique = unique_chunks_by_id(chunks)
+    embeddings = generate_embeddings(list(unique.values()), model)
     
-    # Build FAISS index
+    # Build ID-mapped FAISS index
     logger.info("Building FAISS index...")
-    index = build_faiss_index(embeddings)
+    params = resolve_index_params(index_type, len(embeddings), **index_params)
+    index = build_faiss_index(embeddings, ids=list(unique), **params)
     
     # Save to cache
-    save_index_and_metadata(index, chunks, cache_dir)
+    save_index_and_metadata(index, chunks, cache_dir, params)
+    save_manifest(build_manifest(chunks, params, chunks_path, backend), cache_dir)
     
     return index, chunks
 
+def build_corpus(registry=None, documents=None, **kwargs):
+    """
+    Build or load the index shard of every registered document.
+    
+    Chunks files in data/chunks that are not registered yet are registered first.
+    
+    Args:
+        registry: CorpusRegistry (default: data/corpus.json)
+        documents: Names of documents to build (default: all registered)
+        **kwargs: build_or_load_index() options
+    
+    Returns:
+        dict: Document name -> (index, chunks)
+    """
+    registry = registry or CorpusRegistry()
+    for name in registry.discover():
+        logger.info(f"Registered new document {name}")
+    
+    # The embedding model is loaded at most once, by the first shard that needs it
+    shards = {}
+    for name in (documents or registry.names()):
+        entry = registry.get(name)
+        logger.info(f"Document {name}: {entry['chunks_path']} -> {entry['cache_dir']}")
+        shards[name] = build_or_load_index(entry['chunks_path'], entry['cache_dir'], **kwargs)
+    return shards
+
+def parse_args():
+    """Command-line options for index type and parameters"""
+    parser = argparse.ArgumentParser(description="Build or load the FAISS index shards of the corpus")
+    parser.add_argument('--registry', default=REGISTRY_PATH, help="Corpus registry JSON")
+    parser.add_argument('--document', dest='documents', action='append',
+                        help="Build only this registered document (repeatable)")
+    parser.add_argument('--index-type', default='flat', choices=list(INDEX_TYPES))
+    parser.add_argument('--embedding-backend', dest='backend', choices=list(EMBEDDING_BACKENDS),
+                        help="Embedding inference backend (default: EMBEDDING_BACKEND, else torch)")
+    parser.add_argument('--nlist', type=int, help="IVF lists (default ~4*sqrt(n))")
+    parser.add_argument('--nprobe', type=int, help="IVF lists probed at search time")
+    parser.add_argument('--hnsw-m', type=int, help="HNSW graph degree")
+    parser.add_argument('--ef-construction', type=int, help="HNSW build-time beam width")
+    parser.add_argument('--ef-search', type=int, help="HNSW search-time beam width")
+    parser.add_argument('--pq-m', type=int, help="PQ sub-quantizers (must divide dimension)")
+    parser.add_argument('--pq-bits', type=int, help="Bits per PQ code")
+    parser.add_argument('--full-rebuild', dest='incremental', action='store_false',
+                        help="Re-embed every chunk instead of only new/changed ones")
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    index, metadata = build_or_load_index()
+    args = vars(parse_args())
+    shards = build_corpus(CorpusRegistry(args.pop('registry')), **args)
     logger.info("FAISS index ready for retrieval")
\ No newline at end of file
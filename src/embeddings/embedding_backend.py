@@ -0,0 +1,247 @@
+"""
+Pluggable inference backends for the e5 embedding model.
+"torch" runs the sentence-transformers model in PyTorch (fp32). "onnx" runs an
+ONNX export of the same weights in ONNX Runtime, and "onnx-int8" the export with
+dynamically quantized int8 MatMul weights. EMBEDDING_BACKEND selects the backend
+for both the index builder and the retriever. Exports are created on first use
+under data/onnx/ (which needs torch and transformers once) and reused afterwards.
+"""
+import os
+import shutil
+import logging
+import tempfile
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_BACKENDS = ('torch', 'onnx', 'onnx-int8')
+DEFAULT_BACKEND = 'torch'
+ONNX_DIR = 'data/onnx'
+ONNX_MODEL_FILE = 'model.onnx'
+ONNX_INT8_FILE = 'model_int8.onnx'
+# Written by tokenizer.save_pretrained; with the model it marks a complete export
+TOKENIZER_FILE = 'tokenizer_config.json'
+
+# Token window of e5-large-v2 (sentence-transformers max_seq_length)
+MAX_SEQ_LENGTH = 512
+
+
+def resolve_backend(backend=None):
+    """Backend name, from EMBEDDING_BACKEND when not given."""
+    backend = (backend or os.getenv('EMBEDDING_BACKEND') or DEFAULT_BACKEND).strip().lower()
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}'. Choose from: {', '.join(EMBEDDING_BACKENDS)}")
+    return backend
+
+
+def model_identity(model_name, backend=None):
+    """
+    Name identifying embeddings produced by a model and backend.
+
+    Used to key persisted query embeddings; torch keeps the plain model name so
+    caches written before backends existed stay valid.
+    """
+    backend = resolve_backend(backend)
+    return model_name if backend == DEFAULT_BACKEND else f"{model_name}@{backend}"
+
+
+def export_dir(model_name, onnx_dir=ONNX_DIR):
+    """Directory holding the ONNX export and tokenizer of a model."""
+    return os.path.join(onnx_dir, model_name.replace('/', '__'))
+
+
+def is_exported(target_dir):
+    """Whether a directory holds a complete export (model and tokenizer)."""
+    return all(os.path.exists(os.path.join(target_dir, name)) for name in (ONNX_MODEL_FILE, TOKENIZER_FILE))
+
+
+def export_onnx(model_name, onnx_dir=ONNX_DIR, quantize=False, opset=14):
+    """
+    Export the transformer to ONNX (and optionally int8), unless already exported.
+
+    Files are written under temporary names and moved into place only when complete,
+    so an interrupted export, or several workers exporting at once, never leaves a
+    truncated model behind for later starts to load.
+
+    Args:
+        model_name: Hugging Face model name
+        onnx_dir: Root directory of exports
+        quantize: Also write the dynamically quantized int8 model
+        opset: ONNX opset of the export
+
+    Returns:
+        str: Path of the requested model file
+    """
+    target_dir = export_dir(model_name, onnx_dir)
+    fp32_path = os.path.join(target_dir, ONNX_MODEL_FILE)
+    int8_path = os.path.join(target_dir, ONNX_INT8_FILE)
+
+    if not is_exported(target_dir):
+        _export_model(model_name, target_dir, opset)
+
+    if quantize and not os.path.exists(int8_path):
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        logger.info(f"Quantizing {fp32_path} to int8")
+        descriptor, partial_path = tempfile.mkstemp(prefix='.int8-', suffix='.onnx', dir=target_dir)
+        os.close(descriptor)
+        try:
+            # Only the MatMul weights are quantized; embeddings and LayerNorm stay fp32 for accuracy
+            quantize_dynamic(fp32_path, partial_path, op_types_to_quantize=['MatMul'], weight_type=QuantType.QInt8)
+            os.replace(partial_path, int8_path)
+        finally:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+
+    return int8_path if quantize else fp32_path
+
+
+def _export_model(model_name, target_dir, opset):
+    """Export model and tokenizer into a staging directory, then rename it to target_dir."""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    logger.info(f"Exporting {model_name} to ONNX in {target_dir}")
+    parent_dir = os.path.dirname(target_dir) or '.'
+    os.makedirs(parent_dir, exist_ok=True)
+    staging_dir = tempfile.mkdtemp(prefix='.export-', dir=parent_dir)
+    try:
+        staging_path = os.path.join(staging_dir, ONNX_MODEL_FILE)
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModel.from_pretrained(model_name).eval()
+
+        class TokenEmbeddings(torch.nn.Module):
+            """Exports only the last hidden state; pooling runs in numpy."""
+
+            def __init__(self, encoder):
+                super().__init__()
+                self.encoder = encoder
+
+            def forward(self, input_ids, attention_mask, token_type_ids=None):
+                return self.encoder(input_ids=input_ids, attention_mask=attention_mask,
+                                    token_type_ids=token_type_ids)[0]
+
+        sample = tokenizer(["query: export"], return_tensors='pt')
+        input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in sample]
+        dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names + ['last_hidden_state']}
+        with torch.no_grad():
+            torch.onnx.export(
+                TokenEmbeddings(model),
+                tuple(sample[name] for name in input_names),
+                staging_path,
+                input_names=input_names,
+                output_names=['last_hidden_state'],
+                dynamic_axes=dynamic_axes,
+                opset_version=opset,
+                do_constant_folding=True
+            )
+        tokenizer.save_pretrained(staging_dir)
+
+        if os.path.isdir(target_dir) and not is_exported(target_dir):
+            # Left over by an export interrupted before exports were staged
+            shutil.rmtree(target_dir, ignore_errors=True)
+        try:
+            os.replace(staging_dir, target_dir)
+        except OSError:
+            # Another worker finished the same export first; use theirs
+            if not is_exported(target_dir):
+                raise
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+
+class OnnxEncoder:
+    """ONNX Runtime e5 encoder with the SentenceTransformer.encode interface used in this repo."""
+
+    def __init__(self, model_path, tokenizer_dir, max_seq_length=MAX_SEQ_LENGTH, threads=None):
+        """
+        Load the ONNX model into a CPU inference session.
+
+        Args:
+            model_path: Exported .onnx file (fp32 or int8)
+            tokenizer_dir: Directory the tokenizer was saved to with the export
+            max_seq_length: Tokens per text before truncation
+            threads: Intra-op threads per call (None lets ONNX Runtime use all cores)
+        """
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self.input_names = {graph_input.name for graph_input in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(tokenizer_dir)
+        self.max_seq_length = max_seq_length
+        self.model_path = model_path
+
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True, normalize_embeddings=False,
+               show_progress_bar=False, **kwargs):
+        """
+        Mean-pooled embeddings of texts, like SentenceTransformer.encode.
+
+        Texts are run longest first in batches of similar length to keep padding small.
+
+        Returns:
+            np.ndarray: float32 matrix (a vector for a single string)
+        """
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        embeddings = np.zeros((len(texts), 0), dtype=np.float32)
+        order = sorted(range(len(texts)), key=lambda i: -len(texts[i]))
+
+        for start in range(0, len(order), batch_size):
+            rows = order[start:start + batch_size]
+            tokens = self.tokenizer(
+                [texts[i] for i in rows],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors='np'
+            )
+            feed = {name: tokens[name].astype(np.int64) for name in self.input_names if name in tokens}
+            hidden = self.session.run(None, feed)[0]
+
+            mask = tokens['attention_mask'][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            if not embeddings.shape[1]:
+                embeddings = np.zeros((len(texts), pooled.shape[1]), dtype=np.float32)
+            embeddings[rows] = pooled
+
+        if normalize_embeddings and len(texts):
+            embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return embeddings[0] if single else embeddings
+
+
+def load_encoder(model_name, backend=None, onnx_dir=ONNX_DIR):
+    """
+    Load the embedding model on the configured backend.
+
+    Args:
+        model_name: Hugging Face model name
+        backend: "torch", "onnx" or "onnx-int8" (default: EMBEDDING_BACKEND, else torch)
+        onnx_dir: Root directory of ONNX exports
+
+    Returns:
+        SentenceTransformer or OnnxEncoder: Object with a SentenceTransformer-style encode()
+    """
+    backend = resolve_backend(backend)
+    # Model downloads of the large e5 checkpoint can exceed the default timeout
+    os.environ.setdefault('HF_HUB_DOWNLOAD_TIMEOUT', '60')
+
+    if backend == 'torch':
+        from sentence_transformers import SentenceTransformer
+        logger.info(f"Loading embedding model: {model_name}")
+        return SentenceTransformer(model_name)
+
+    try:
+        import onnxruntime  # noqa: F401
+    except ImportError as e:
+        raise ImportError(f"EMBEDDING_BACKEND={backend} needs onnxruntime: pip install onnxruntime onnx") from e
+
+    model_path = export_onnx(model_name, onnx_dir, quantize=backend == 'onnx-int8')
+    threads = int(os.getenv('ONNX_THREADS')) if os.getenv('ONNX_THREADS') else None
+    logger.info(f"Loading embedding model: {model_name} ({backend}, {model_path})")
+    return OnnxEncoder(model_path, export_dir(model_name, onnx_dir), threads=threads)
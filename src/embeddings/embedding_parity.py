@@ -0,0 +1,143 @@
+# Parity and latency check of an ONNX embedding backend against the PyTorch model
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+import logging
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embeddings.build_faiss_index import MODEL_NAME, load_embedding_model
+from embeddings.embedding_backend import EMBEDDING_BACKENDS
+from retrieval.corpus import CorpusRegistry, REGISTRY_PATH
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def encode(model, texts, batch_size=32):
+    """Normalized float32 embeddings of prefixed texts"""
+    return model.encode(texts, batch_size=batch_size, convert_to_numpy=True,
+                        normalize_embeddings=True).astype(np.float32)
+
+def cosine_agreement(reference, candidate):
+    """Row-wise cosine similarity of two normalized embedding matrices"""
+    cosines = np.sum(reference * candidate, axis=1)
+    return {
+        'mean': round(float(cosines.mean()), 6),
+        'min': round(float(cosines.min()), 6),
+        'p05': round(float(np.percentile(cosines, 5)), 6)
+    }
+
+def retrieval_overlap(retriever, reference, candidate, top_k=5):
+    """Mean fraction of the reference top-k chunk ids the candidate embeddings also retrieve"""
+    reference_hits = retriever.search(reference, top_k)
+    candidate_hits = retriever.search(candidate, top_k)
+    overlaps = []
+    for expected, found in zip(reference_hits, candidate_hits):
+        expected_ids = {hit['id'] for hit in expected}
+        if expected_ids:
+            overlaps.append(len(expected_ids & {hit['id'] for hit in found}) / len(expected_ids))
+    return round(float(np.mean(overlaps)), 4) if overlaps else None
+
+def single_query_latency(model, texts, repeats=3):
+    """Mean and p95 milliseconds to encode one query at a time (the serving pattern)"""
+    encode(model, texts[:1])  # warmup
+    latencies = []
+    for _ in range(repeats):
+        for text in texts:
+            start = time.perf_counter()
+            encode(model, [text])
+            latencies.append((time.perf_counter() - start) * 1000)
+    return {'mean_ms': round(float(np.mean(latencies)), 2), 'p95_ms': round(float(np.percentile(latencies, 95)), 2)}
+
+def sample_passages(retriever, num_passages=64, seed=0):
+    """Chunk texts sampled across all loaded shards"""
+    texts = [chunk['text'] for shard in retriever.shards.values() for chunk in shard.chunks]
+    if not texts:
+        return []
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(texts), size=min(num_passages, len(texts)), replace=False)
+    return [texts[row] for row in rows]
+
+def compare_backends(queries, backend='onnx-int8', registry_path=REGISTRY_PATH, top_k=5, num_passages=64):
+    """
+    Compare a backend's embeddings and retrieval with the torch model on the served corpus.
+
+    Args:
+        queries: Evaluation query strings
+        backend: Candidate backend ("onnx" or "onnx-int8")
+        registry_path: Corpus registry whose shards are searched
+        top_k: Hits compared per query
+        num_passages: Chunks sampled to compare passage (index-side) embeddings
+
+    Returns:
+        dict: Cosine agreement for queries and passages, top-k overlap and single-query latency per backend
+    """
+    from retrieval.corpus_retriever import CorpusRetriever
+
+    reference_model = load_embedding_model('torch')
+    candidate_model = load_embedding_model(backend)
+    # Dense-only search isolates the embeddings from BM25 fusion and reranking
+    retriever = CorpusRetriever(CorpusRegistry(registry_path), cache_size=0, model=reference_model,
+                                embedding_backend='torch', search_mode='dense')
+
+    query_texts = [f"query: {query}" for query in queries]
+    reference = encode(reference_model, query_texts)
+    candidate = encode(candidate_model, query_texts)
+    passages = [f"passage: {text}" for text in sample_passages(retriever, num_passages)]
+
+    report = {
+        'model_name': MODEL_NAME,
+        'backend': backend,
+        'num_queries': len(queries),
+        'query_cosine': cosine_agreement(reference, candidate),
+        f'overlap@{top_k}': retrieval_overlap(retriever, reference, candidate, top_k),
+        'latency': {
+            'torch': single_query_latency(reference_model, query_texts),
+            backend: single_query_latency(candidate_model, query_texts)
+        }
+    }
+    if passages:
+        report['num_passages'] = len(passages)
+        report['passage_cosine'] = cosine_agreement(encode(reference_model, passages), encode(candidate_model, passages))
+    report['speedup'] = round(report['latency']['torch']['mean_ms'] / report['latency'][backend]['mean_ms'], 2)
+    return report
+
+def print_report(report):
+    """Print a compact parity summary"""
+    overlap_key = next(key for key in report if key.startswith('overlap@'))
+    print(f"\n{report['model_name']}: torch vs {report['backend']} on {report['num_queries']} queries")
+    print(f"  query cosine   mean {report['query_cosine']['mean']:.6f}  min {report['query_cosine']['min']:.6f}")
+    if 'passage_cosine' in report:
+        print(f"  passage cosine mean {report['passage_cosine']['mean']:.6f}  min {report['passage_cosine']['min']:.6f}")
+    print(f"  {overlap_key:<14} {report[overlap_key]}")
+    for backend, latency in report['latency'].items():
+        print(f"  {backend:<14} {latency['mean_ms']:.2f} ms mean, {latency['p95_ms']:.2f} ms p95 per query")
+    print(f"  speedup        {report['speedup']}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare an ONNX embedding backend with the PyTorch model")
+    parser.add_argument('--backend', default='onnx-int8', choices=[b for b in EMBEDDING_BACKENDS if b != 'torch'])
+    parser.add_argument('--registry', default=os.getenv('CORPUS_REGISTRY', REGISTRY_PATH))
+    parser.add_argument('--queries-file', help="Text file with one query per line (default: the evaluate_system.py queries)")
+    parser.add_argument('--num-passages', type=int, default=64)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--output', help="Optional JSON report path")
+    args = parser.parse_args()
+
+    if args.queries_file:
+        with open(args.queries_file, 'r', encoding='utf-8') as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+        from evaluate_system import EVAL_QUERIES
+        queries = EVAL_QUERIES
+
+    report = compare_backends(queries, args.backend, args.registry, args.top_k, args.num_passages)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Parity report saved to {args.output}")
@@ -2,13 +2,53 @@ import json
 import os
 import re
 
+# Report parts, recognised from running page headers/footers ("Corporate Overview\n12",
+# "148 Corporate Governance Report..."); checked in order, first match wins
+SECTION_PATTERNS = [
+    ("Management Discussion and Analysis", r"^\d*\s*management discussion and analysis( \(mda\))?$"),
+    ("Directors' Report", r"^\d*\s*directors[’']? report"),
+    ("Corporate Governance Report", r"^\d*\s*corporate governance report"),
+    ("Business Responsibility and Sustainability Report",
+     r"^(\d+ hcltech annual report \d{4}-\d{2})?business responsibility and sustainability report"),
+    ("Standalone Financial Statements",
+     r"^(\d+\s*)?standalone financial statements|^(\d+ hcltech annual report \d{4}-\d{2})?notes to standalone"),
+    ("Consolidated Financial Statements",
+     r"^(\d+\s*)?consolidated financial statements|^(\d+ hcltech annual report \d{4}-\d{2})?notes to consolidated"),
+    ("Corporate Overview", r"^corporate overview$"),
+]
+SECTION_REGEXES = [(name, re.compile(pattern, re.IGNORECASE)) for name, pattern in SECTION_PATTERNS]
+
+UNKNOWN_SECTION = "Unknown"
+
+# PDF ligature glyph names left in extracted text ("Repo/r_t.liga" for "Report")
+LIGATURE_PATTERN = re.compile(r'/([a-z])_([a-z])\.liga')
+
+def detect_section(page_text):
+    """Section named by a page's running header or footer, or None"""
+    text = LIGATURE_PATTERN.sub(r'\1\2', page_text)
+    lines = [line.strip() for line in text.strip().split('\n') if line.strip()]
+    # Headers sit in the first lines, footers just before the page number
+    candidates = lines[:2] + lines[-3:]
+    for name, regex in SECTION_REGEXES:
+        if any(regex.search(line) for line in candidates):
+            return name
+    return None
+
 def extract_blocks(text_data):
     """Extract structured blocks from text with metadata"""
-    blocks = []
+    return list(iter_blocks(text_data))
+
+def iter_blocks(pages):
+    """Yield structured blocks from an iterable of pages as they arrive"""
+    section = None
+    # Pages before the first recognised section (cover, contents) are held back and
+    # given that section once it is known
+    leading = []
     
-    for page_data in text_data:
+    for page_data in pages:
         page_num = page_data["page"]
         text = page_data["text"]
+        section = detect_section(text) or section
         
         # Split by paragraphs
         paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
@@ -21,18 +61,35 @@ def extract_blocks(text_data):
             elif re.search(r'\d+\.\d+|\d+%|Table|Figure', paragraph):
                 block_type = "data"
             
-            blocks.append({
+            block = {
                 "id": f"page_{page_num}_block_{i}",
                 "page": page_num,
                 "type": block_type,
+                "section": section,
                 "text": paragraph,
                 "metadata": {
                     "word_count": len(paragraph.split()),
                     "char_count": len(paragraph)
                 }
-            })
+            }
+            
+            if section is None:
+                leading.append(block)
+                continue
+            for held in leading:
+                held["section"] = section
+                yield held
+            leading = []
+            yield block
     
-    return blocks
+    for held in leading:
+        held["section"] = UNKNOWN_SECTION
+        yield held
+
+def save_blocks(blocks, output_path):
+    """Save structured blocks as JSON"""
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(blocks, f, indent=2, ensure_ascii=False)
 
 def process_raw_text(input_dir, output_dir):
     """Process raw text files into structured blocks"""
@@ -46,10 +103,7 @@ def process_raw_text(input_dir, output_dir):
                 text_data = json.load(f)
             
             blocks = extract_blocks(text_data)
-            
-            output_path = os.path.join(output_dir, filename)
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(blocks, f, indent=2, ensure_ascii=False)
+            save_blocks(blocks, os.path.join(output_dir, filename))
             
             print(f"Processed {filename}: {len(blocks)} blocks extracted")
 
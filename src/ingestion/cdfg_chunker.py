@@ -1,59 +1,138 @@
 import json
 import os
 import re
+from collections import Counter
+from functools import lru_cache
 
 class SimpleTokenizer:
+    name = "whitespace"
+    overhead_tokens = 0
+    
     def count_tokens(self, text):
         """Simple word-based token counting"""
         return len(text.split())
 
+class TiktokenTokenizer:
+    name = "tiktoken"
+    overhead_tokens = 0
+    
+    def __init__(self, encoding_name="cl100k_base"):
+        import tiktoken
+        self.encoding = tiktoken.get_encoding(encoding_name)
+    
+    def count_tokens(self, text):
+        """BPE token count (the tokenizer family used by most LLM APIs)"""
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+class EmbeddingModelTokenizer:
+    name = "e5"
+    
+    def __init__(self, model_name="intfloat/e5-large-v2", prefix="passage: "):
+        from transformers import AutoTokenizer
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        # The "passage: " prefix and [CLS]/[SEP] also occupy the encoder window
+        self.overhead_tokens = len(self.tokenizer.encode(prefix, add_special_tokens=True))
+    
+    def count_tokens(self, text):
+        """Exact token count under the embedding model's own tokenizer"""
+        return len(self.tokenizer.encode(text, add_special_tokens=False))
+
+TOKENIZERS = {
+    "whitespace": SimpleTokenizer,
+    "tiktoken": TiktokenTokenizer,
+    "e5": EmbeddingModelTokenizer,
+}
+
+DEFAULT_MAX_TOKENS = 512
+DEFAULT_OVERLAP_TOKENS = 50
+
+def default_tokenizer_name():
+    """Tokenizer backend selected by CHUNK_TOKENIZER (whitespace if unset)"""
+    return os.getenv("CHUNK_TOKENIZER", "whitespace")
+
+def default_chunker_params():
+    """Parameters of a default CDFGChunker, without loading its tokenizer"""
+    return {
+        "max_tokens": DEFAULT_MAX_TOKENS,
+        "overlap_tokens": DEFAULT_OVERLAP_TOKENS,
+        "tokenizer": default_tokenizer_name()
+    }
+
+def get_tokenizer(name=None):
+    """Create a tokenizer backend by name (default from CHUNK_TOKENIZER, else whitespace)"""
+    name = name or default_tokenizer_name()
+    if name not in TOKENIZERS:
+        raise ValueError(f"Unknown tokenizer '{name}'. Choose from: {', '.join(TOKENIZERS)}")
+    return TOKENIZERS[name]()
+
 class CDFGChunker:
-    def __init__(self, max_tokens=512, overlap_tokens=50):
+    def __init__(self, max_tokens=DEFAULT_MAX_TOKENS, overlap_tokens=DEFAULT_OVERLAP_TOKENS,
+                 tokenizer=None, cache_size=65536):
         self.max_tokens = max_tokens
         self.overlap_tokens = overlap_tokens
-        self.tokenizer = SimpleTokenizer()
+        if tokenizer is None or isinstance(tokenizer, str):
+            tokenizer = get_tokenizer(tokenizer)
+        self.tokenizer = tokenizer
+        # Budget left for chunk text once the model's prefix/special tokens are accounted for
+        self.budget = max_tokens - self.tokenizer.overhead_tokens
+        # Repeated texts (page headers, footers, boilerplate) are only tokenized once
+        self._count_tokens = lru_cache(maxsize=cache_size)(self.tokenizer.count_tokens)
+    
+    def params(self):
+        """Chunking parameters (recorded in the index manifest)"""
+        return {
+            "max_tokens": self.max_tokens,
+            "overlap_tokens": self.overlap_tokens,
+            "tokenizer": self.tokenizer.name
+        }
     
     def count_tokens(self, text):
         """Count tokens in text"""
-        return self.tokenizer.count_tokens(text)
+        return self._count_tokens(text)
     
     def chunk_blocks(self, blocks):
         """Chunk blocks using CDFG strategy"""
-        chunks = []
+        return list(self.iter_chunks(blocks))
+    
+    def iter_chunks(self, blocks):
+        """Yield CDFG chunks from any iterable of blocks, consuming it lazily"""
+        # Each block is tokenized once; its count travels with it into overlaps
         current_chunk = []
+        current_counts = []
         current_tokens = 0
         
         for block in blocks:
             block_tokens = self.count_tokens(block["text"])
             
             # If single block exceeds max tokens, split it
-            if block_tokens > self.max_tokens:
+            if block_tokens > self.budget:
                 if current_chunk:
-                    chunks.append(self._create_chunk(current_chunk))
+                    yield self._create_chunk(current_chunk)
                     current_chunk = []
+                    current_counts = []
                     current_tokens = 0
                 
                 # Split large block
-                chunks.extend(self._split_large_block(block))
+                yield from self._split_large_block(block)
                 continue
             
             # If adding block exceeds limit, finalize current chunk
-            if current_tokens + block_tokens > self.max_tokens and current_chunk:
-                chunks.append(self._create_chunk(current_chunk))
+            if current_tokens + block_tokens > self.budget and current_chunk:
+                yield self._create_chunk(current_chunk)
                 
                 # Start new chunk with overlap
-                overlap_blocks = self._get_overlap_blocks(current_chunk)
-                current_chunk = overlap_blocks
-                current_tokens = sum(self.count_tokens(b["text"]) for b in overlap_blocks)
+                keep = self._get_overlap_count(current_counts)
+                current_chunk = current_chunk[len(current_chunk) - keep:] if keep else []
+                current_counts = current_counts[len(current_counts) - keep:] if keep else []
+                current_tokens = sum(current_counts)
             
             current_chunk.append(block)
+            current_counts.append(block_tokens)
             current_tokens += block_tokens
         
         # Add final chunk
         if current_chunk:
-            chunks.append(self._create_chunk(current_chunk))
-        
-        return chunks
+            yield self._create_chunk(current_chunk)
     
     def _create_chunk(self, blocks):
         """Create chunk from blocks"""
@@ -66,57 +145,78 @@ class CDFGChunker:
             "token_count": self.count_tokens(text),
             "block_count": len(blocks),
             "pages": sorted(pages),
-            "blocks": [block["id"] for block in blocks]
+            "blocks": [block["id"] for block in blocks],
+            # Most blocks decide the section of a chunk straddling a boundary
+            "section": Counter(block.get("section", "Unknown") for block in blocks).most_common(1)[0][0],
+            "block_types": sorted(set(block.get("type", "paragraph") for block in blocks))
         }
     
+    def _split_pieces(self, text):
+        """Split text into sentences, and sentences that alone exceed the budget into word runs"""
+        for sentence in text.split('. '):
+            piece = sentence + ". "
+            if self.count_tokens(piece) <= self.budget:
+                yield piece
+                continue
+            
+            words = piece.split(' ')
+            step = max(1, len(words) * self.budget // (2 * self.count_tokens(piece)))
+            for i in range(0, len(words), step):
+                yield ' '.join(words[i:i + step]) + ' '
+    
     def _split_large_block(self, block):
         """Split block that exceeds max tokens"""
-        text = block["text"]
-        sentences = text.split('. ')
+        # Counts are summed per piece rather than re-counting the growing text,
+        # so splitting stays linear in block length
         chunks = []
         current_text = ""
+        current_tokens = 0
         
-        for sentence in sentences:
-            test_text = current_text + sentence + ". "
-            if self.count_tokens(test_text) > self.max_tokens and current_text:
-                chunks.append({
-                    "id": f"{block['id']}_split_{len(chunks)}",
-                    "text": current_text.strip(),
-                    "token_count": self.count_tokens(current_text),
-                    "block_count": 1,
-                    "pages": [block["page"]],
-                    "blocks": [block["id"]]
-                })
-                current_text = sentence + ". "
-            else:
-                current_text = test_text
+        for piece in self._split_pieces(block["text"]):
+            piece_tokens = self.count_tokens(piece)
+            if current_tokens + piece_tokens > self.budget and current_text:
+                chunks.append(self._create_split_chunk(block, current_text, len(chunks)))
+                current_text = ""
+                current_tokens = 0
+            current_text += piece
+            current_tokens += piece_tokens
         
         if current_text:
-            chunks.append({
-                "id": f"{block['id']}_split_{len(chunks)}",
-                "text": current_text.strip(),
-                "token_count": self.count_tokens(current_text),
-                "block_count": 1,
-                "pages": [block["page"]],
-                "blocks": [block["id"]]
-            })
+            chunks.append(self._create_split_chunk(block, current_text, len(chunks)))
         
         return chunks
     
-    def _get_overlap_blocks(self, blocks):
-        """Get blocks for overlap"""
+    def _create_split_chunk(self, block, text, split_num):
+        """Create chunk from part of a large block"""
+        return {
+            "id": f"{block['id']}_split_{split_num}",
+            "text": text.strip(),
+            "token_count": self.count_tokens(text),
+            "block_count": 1,
+            "pages": [block["page"]],
+            "blocks": [block["id"]],
+            "section": block.get("section", "Unknown"),
+            "block_types": [block.get("type", "paragraph")]
+        }
+    
+    def _get_overlap_count(self, counts):
+        """Number of trailing blocks that fit in the overlap window"""
         overlap_tokens = 0
-        overlap_blocks = []
+        keep = 0
         
-        for block in reversed(blocks):
-            block_tokens = self.count_tokens(block["text"])
+        for block_tokens in reversed(counts):
             if overlap_tokens + block_tokens <= self.overlap_tokens:
-                overlap_blocks.insert(0, block)
                 overlap_tokens += block_tokens
+                keep += 1
             else:
                 break
         
-        return overlap_blocks
+        return keep
+
+def save_chunks(chunks, output_path):
+    """Save CDFG chunks as JSON"""
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(chunks, f, indent=2, ensure_ascii=False)
 
 def process_blocks_to_chunks(input_dir, output_dir):
     """Process structured blocks into CDFG chunks"""
@@ -131,10 +231,7 @@ def process_blocks_to_chunks(input_dir, output_dir):
                 blocks = json.load(f)
             
             chunks = chunker.chunk_blocks(blocks)
-            
-            output_path = os.path.join(output_dir, filename)
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(chunks, f, indent=2, ensure_ascii=False)
+            save_chunks(chunks, os.path.join(output_dir, filename))
             
             total_tokens = sum(chunk["token_count"] for chunk in chunks)
             print(f"Processed {filename}: {len(chunks)} chunks, {total_tokens} total tokens")
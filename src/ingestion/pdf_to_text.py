@@ -2,27 +2,42 @@ import PyPDF2
 import os
 import json
 
-def extract_text_from_pdf(pdf_path, output_dir):
-    """Extract text from PDF with page markers"""
-    filename = os.path.splitext(os.path.basename(pdf_path))[0]
-    
-    text_data = []
+def count_pages(pdf_path):
+    """Number of pages in a PDF"""
+    with open(pdf_path, 'rb') as file:
+        return len(PyPDF2.PdfReader(file).pages)
+
+def iter_pages(pdf_path, start=0, end=None):
+    """Yield page text for pages [start, end) one page at a time"""
     with open(pdf_path, 'rb') as file:
         reader = PyPDF2.PdfReader(file)
+        end = len(reader.pages) if end is None else min(end, len(reader.pages))
         
-        for page_num, page in enumerate(reader.pages):
-            text = page.extract_text()
-            text_data.append({
+        for page_num in range(start, end):
+            text = reader.pages[page_num].extract_text()
+            yield {
                 "page": page_num + 1,
                 "text": text.strip()
-            })
-    
+            }
+
+def extract_page_range(pdf_path, start=0, end=None):
+    """Extract text for pages [start, end) so large PDFs can be split across workers"""
+    return list(iter_pages(pdf_path, start, end))
+
+def save_raw_text(text_data, pdf_path, output_dir):
+    """Save extracted page text as JSON named after the PDF"""
+    filename = os.path.splitext(os.path.basename(pdf_path))[0]
     output_path = os.path.join(output_dir, f"{filename}.json")
     with open(output_path, 'w', encoding='utf-8') as f:
         json.dump(text_data, f, indent=2, ensure_ascii=False)
     
     return output_path
 
+def extract_text_from_pdf(pdf_path, output_dir):
+    """Extract text from PDF with page markers"""
+    text_data = extract_page_range(pdf_path)
+    return save_raw_text(text_data, pdf_path, output_dir)
+
 if __name__ == "__main__":
     pdf_dir = "data/pdf"
     output_dir = "data/raw_text"
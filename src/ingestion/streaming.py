@@ -0,0 +1,55 @@
+"""
+Streaming ingestion: pages flow into blocks and chunks through generators.
+Intermediate stages are only written (as JSON Lines) when a directory is given.
+"""
+import json
+import os
+
+from ingestion.pdf_to_text import iter_pages
+from ingestion.block_extraction import iter_blocks
+from ingestion.cdfg_chunker import CDFGChunker
+
+def tee_jsonl(items, path):
+    """Yield items unchanged while writing each one as a JSON Lines record"""
+    with open(path, 'w', encoding='utf-8') as f:
+        for item in items:
+            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+            yield item
+
+def stream_chunks(pdf_path, raw_text_dir=None, blocks_dir=None, chunker=None):
+    """Lazily chain page extraction, block extraction and chunking for one PDF"""
+    name = os.path.splitext(os.path.basename(pdf_path))[0]
+
+    pages = iter_pages(pdf_path)
+    if raw_text_dir:
+        pages = tee_jsonl(pages, os.path.join(raw_text_dir, f"{name}.jsonl"))
+
+    blocks = iter_blocks(pages)
+    if blocks_dir:
+        blocks = tee_jsonl(blocks, os.path.join(blocks_dir, f"{name}.jsonl"))
+
+    return (chunker or CDFGChunker()).iter_chunks(blocks)
+
+def tee_json_array(items, path):
+    """Yield items unchanged while writing them as a JSON array, one record per line"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("[")
+        first = True
+        for item in items:
+            f.write("\n" if first else ",\n")
+            f.write(json.dumps(item, ensure_ascii=False))
+            first = False
+            yield item
+        f.write("\n]\n")
+
+def stream_document(pdf_path, chunks_dir, raw_text_dir=None, blocks_dir=None):
+    """Stream one PDF straight to its chunks file without materializing earlier stages"""
+    filename = f"{os.path.splitext(os.path.basename(pdf_path))[0]}.json"
+    chunks = stream_chunks(pdf_path, raw_text_dir, blocks_dir)
+
+    num_chunks = 0
+    total_tokens = 0
+    for chunk in tee_json_array(chunks, os.path.join(chunks_dir, filename)):
+        num_chunks += 1
+        total_tokens += chunk["token_count"]
+    return filename, num_chunks, total_tokens
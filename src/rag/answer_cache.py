@@ -0,0 +1,190 @@
+"""
+Semantic cache for INFO_QUERY answers.
+Paraphrased questions are matched by e5 query-embedding similarity in a small
+FAISS index; entries are tied to the index version they were answered from.
+"""
+import os
+import time
+import pickle
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """Bounded, thread-safe LRU cache of answers looked up by query-embedding similarity."""
+
+    def __init__(self, threshold=0.95, max_size=1024, ttl_seconds=None, min_chunk_overlap=0.6,
+                 persist_path=None):
+        """
+        Initialize the cache.
+
+        Args:
+            threshold: Minimum cosine similarity between queries for a hit
+            max_size: Maximum number of cached answers before LRU eviction
+            ttl_seconds: Optional lifetime of an answer in seconds (None = never expires)
+            min_chunk_overlap: Minimum fraction of the cached answer's chunk ids that must
+                also be retrieved for the new query (guards against similar wording
+                about different facts)
+            persist_path: Optional pickle file used by save()/load()
+        """
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.min_chunk_overlap = min_chunk_overlap
+        self.persist_path = persist_path
+
+        self.index_version = None
+        self._index = None
+        self._entries = OrderedDict()  # faiss id -> entry dict
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if persist_path:
+            self.load()
+
+    def _expired(self, created_at, now):
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def _sync_version(self, index_version):
+        """Drop everything answered from another index version (the index was rebuilt)."""
+        if index_version != self.index_version:
+            if self._entries:
+                self.evictions += len(self._entries)
+            self._entries.clear()
+            self._index = None
+            self.index_version = index_version
+
+    def _remove(self, entry_id):
+        del self._entries[entry_id]
+        self._index.remove_ids(np.array([entry_id], dtype=np.int64))
+        self.evictions += 1
+
+    def get(self, embedding, chunk_ids, index_version):
+        """
+        Look up an answer for a query embedding.
+
+        Args:
+            embedding: Normalized query embedding
+            chunk_ids: Chunk ids retrieved for the query
+            index_version: Version of the index the chunks came from
+
+        Returns:
+            str: Cached answer, or None on a miss
+        """
+        now = time.time()
+        with self._lock:
+            self._sync_version(index_version)
+            if self._index is None or self._index.ntotal == 0:
+                self.misses += 1
+                return None
+
+            scores, ids = self._index.search(np.asarray(embedding, dtype='float32').reshape(1, -1), 1)
+            entry_id = int(ids[0][0])
+            entry = self._entries.get(entry_id)
+            if entry is None or scores[0][0] < self.threshold:
+                self.misses += 1
+                return None
+            if self._expired(entry['created_at'], now):
+                self._remove(entry_id)
+                self.misses += 1
+                return None
+
+            cached_ids = set(entry['chunk_ids'])
+            if cached_ids and len(cached_ids & set(chunk_ids)) / len(cached_ids) < self.min_chunk_overlap:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            return entry['answer']
+
+    def put(self, embedding, query, answer, chunk_ids, index_version):
+        """Store an answer, evicting least recently used entries past max_size."""
+        with self._lock:
+            self._sync_version(index_version)
+            self._add({
+                'query': query,
+                'answer': answer,
+                'chunk_ids': list(chunk_ids),
+                'embedding': np.asarray(embedding, dtype='float32').reshape(-1),
+                'created_at': time.time()
+            })
+
+    def _add(self, entry):
+        import faiss
+        if self._index is None:
+            self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(len(entry['embedding'])))
+
+        entry_id = self._next_id
+        self._next_id += 1
+        self._index.add_with_ids(entry['embedding'].reshape(1, -1), np.array([entry_id], dtype=np.int64))
+        self._entries[entry_id] = entry
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        """Drop all cached answers."""
+        with self._lock:
+            self._entries.clear()
+            self._index = None
+
+    def stats(self):
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'threshold': self.threshold,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+    def save(self, path=None):
+        """Snapshot the cache to disk (atomic replace)."""
+        path = path or self.persist_path
+        if not path:
+            return
+
+        with self._lock:
+            snapshot = {
+                'index_version': self.index_version,
+                'entries': list(self._entries.values())
+            }
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(snapshot, f)
+        os.replace(tmp_path, path)
+
+    def load(self, path=None):
+        """
+        Load a snapshot written by save(), skipping expired entries.
+
+        Entries keep their index version, so a snapshot taken before a rebuild is
+        discarded on the first lookup against the new index.
+        """
+        path = path or self.persist_path
+        if not path or not os.path.exists(path):
+            return
+
+        try:
+            with open(path, 'rb') as f:
+                snapshot = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return
+
+        now = time.time()
+        with self._lock:
+            self._sync_version(snapshot.get('index_version'))
+            for entry in snapshot.get('entries', []):
+                if not self._expired(entry['created_at'], now):
+                    self._add(entry)
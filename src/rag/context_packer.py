@@ -0,0 +1,142 @@
+"""
+Token-budgeted prompt context assembly.
+Retrieved chunks are split back into their source blocks, so the overlap blocks
+neighbouring chunks share are sent once; chunks from the same stretch of the
+document are merged into one section, and the budget is filled in relevance order.
+"""
+import re
+
+from ingestion.cdfg_chunker import get_tokenizer
+
+# Block ids from block extraction ("page_12_block_3"), optionally split by the chunker
+# and prefixed with their document by corpus retrieval ("Annual-Report/page_12_block_3")
+BLOCK_ID_PATTERN = re.compile(r"^(?:(.+)/)?page_(\d+)_block_(\d+)(?:_split_(\d+))?$")
+
+# Separator the chunker joins block texts with
+BLOCK_SEPARATOR = "\n\n"
+
+
+def block_position(key):
+    """(document, page, block, split) of a block or split-chunk id, or None if it is not one"""
+    match = BLOCK_ID_PATTERN.match(key or "")
+    if not match:
+        return None
+    document, page, block, split = match.groups()
+    return document or "", int(page), int(block), int(split) if split is not None else -1
+
+
+def block_units(chunk):
+    """
+    Split a chunk into (key, text) units, one per source block.
+
+    Chunks whose text cannot be mapped back onto their blocks (pieces of a split
+    block, or chunks without block ids) stay a single unit keyed by chunk id.
+    """
+    blocks = chunk.get('blocks') or []
+    parts = chunk['text'].split(BLOCK_SEPARATOR)
+    if blocks and len(parts) == len(blocks) and '_split_' not in (chunk.get('id') or ''):
+        return list(zip(blocks, parts))
+    return [(chunk.get('id') or chunk['text'], chunk['text'])]
+
+
+def _adjacent(a, b):
+    """Whether two block positions are the same block or directly follow each other"""
+    if a is None or b is None or a[0] != b[0]:
+        return False
+    (_, page_a, block_a, _), (_, page_b, block_b, _) = sorted([a, b])
+    if page_a == page_b:
+        return block_b - block_a <= 1
+    return page_b - page_a == 1 and block_b == 0
+
+
+class ContextPacker:
+    """Deduplicates and merges retrieved chunks into a prompt context within a token budget."""
+
+    def __init__(self, max_tokens=1500, tokenizer=None):
+        """
+        Initialize the packer.
+
+        Args:
+            max_tokens: Token budget for the chunk text in the prompt context
+            tokenizer: Tokenizer backend name (default: CHUNK_TOKENIZER, as used for chunking)
+        """
+        self.max_tokens = max_tokens
+        self.tokenizer = get_tokenizer(tokenizer)
+
+    def pack(self, chunks):
+        """
+        Assemble context sections from retrieved chunks.
+
+        Args:
+            chunks: Chunk dictionaries in relevance order (best first)
+
+        Returns:
+            list: Section dictionaries with 'text', 'pages', 'page', 'ids' and 'tokens',
+            ordered by their most relevant chunk
+        """
+        sections = []
+        seen = set()
+        remaining = self.max_tokens
+
+        for chunk in chunks:
+            units = block_units(chunk)
+            positions = [block_position(key) for key, _ in units]
+
+            # New blocks of this chunk that still fit, in document order
+            selected = []
+            for (key, text), position in zip(units, positions):
+                if key in seen:
+                    continue
+                tokens = self.tokenizer.count_tokens(text)
+                if tokens > remaining:
+                    break
+                selected.append((key, text, position))
+                remaining -= tokens
+            if not selected:
+                continue
+            seen.update(key for key, _, _ in selected)
+
+            # Merge into every section this chunk overlaps or borders (it may bridge two)
+            touching = [
+                section for section in sections
+                if any(_adjacent(position, other) for position in positions for other in section['positions'])
+            ]
+            if touching:
+                section = touching[0]
+                for other in touching[1:]:
+                    section['units'].extend(other['units'])
+                    section['positions'].extend(other['positions'])
+                    section['chunks'].extend(other['chunks'])
+                    section['pages'].update(other['pages'])
+                    sections.remove(other)
+            else:
+                section = {'units': [], 'positions': [], 'chunks': [], 'pages': set()}
+                sections.append(section)
+
+            section['units'].extend(selected)
+            section['positions'].extend(position for _, _, position in selected)
+            section['chunks'].append(chunk.get('id'))
+            section['pages'].update(
+                position[1] for _, _, position in selected if position is not None
+            )
+            if any(position is None for _, _, position in selected):
+                section['pages'].update(page for page in chunk.get('pages', []) if page != 'Unknown')
+
+        return [self._format_section(section) for section in sections]
+
+    def _format_section(self, section):
+        """Join a section's blocks in document order."""
+        # Units without a block position keep their insertion order, after positioned ones
+        units = sorted(
+            enumerate(section['units']),
+            key=lambda item: (item[1][2] is None, item[1][2] or ("", 0, 0, 0), item[0])
+        )
+        text = BLOCK_SEPARATOR.join(unit_text for _, (_, unit_text, _) in units)
+        pages = sorted(section['pages'])
+        return {
+            'text': text,
+            'pages': pages,
+            'page': pages[0] if pages else 'Unknown',
+            'ids': section['chunks'],
+            'tokens': self.tokenizer.count_tokens(text)
+        }
@@ -3,12 +3,47 @@ from langchain_mistralai import ChatMistralAI
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
+# Start of the citation block the prompt asks for; streamed answers hold it back until the end
+CITATIONS_MARKER = "Citations:"
+
+# Answer for questions the document does not cover (also what the prompt tells the LLM to say)
+NOT_AVAILABLE_ANSWER = "The requested information is not available in the provided document."
+
+
+def split_citations(answer):
+    """
+    Split an answer into its body and trailing citation block.
+    
+    Returns:
+        tuple: (body, citations); body is a prefix of answer, citations is "" if absent
+    """
+    idx = answer.find(CITATIONS_MARKER)
+    if idx < 0:
+        return answer, ""
+    # Drop markdown bold around the marker ("**Citations:**") from the body
+    body = answer[:idx].rstrip().rstrip('*').rstrip()
+    return body, answer[len(body):].strip()
+
 class LangChainAnswerGenerator:
     """RAG answer generator using LangChain framework."""
     
-    def __init__(self, api_key, retriever):
-        """Initialize with LangChain components."""
+    def __init__(self, api_key, retriever, answer_cache=None, context_packer=None, score_floor=None):
+        """
+        Initialize with LangChain components.
+        
+        Args:
+            api_key: Mistral API key
+            retriever: Retriever used by generate_answer
+            answer_cache: Optional semantic answer cache
+            context_packer: Optional ContextPacker for the prompt context
+            score_floor: Minimum dense similarity of the best hit; below it the
+                "not available" answer is returned without calling the LLM (None disables)
+        """
         self.retriever = retriever
+        self.answer_cache = answer_cache
+        self.context_packer = context_packer
+        self.score_floor = score_floor
+        self.top_k = 5
         self.llm = ChatMistralAI(
             model="mistral-small-latest",
             mistral_api_key=api_key,
@@ -51,20 +86,160 @@ Citations:
     def generate_answer(self, query, conversation_context=""):
         """Generate answer using LangChain with conversation context."""
         # Retrieve relevant chunks
-        chunks = self.retriever.retrieve(query, top_k=5)
+        chunks = self.retriever.retrieve(query, top_k=self.top_k)
+        return self.answer_from_chunks(query, chunks, conversation_context)
+    
+    async def agenerate_answer(self, query, conversation_context=""):
+        """Generate answer without blocking the event loop (encoding runs in the retriever's pool)."""
+        chunks = await self.retriever.aretrieve(query, top_k=self.top_k)
+        return await self.aanswer_from_chunks(query, chunks, conversation_context)
+    
+    def answer_from_chunks(self, query, chunks, conversation_context="", embedding=None):
+        """Generate answer from already-retrieved chunks, serving paraphrases from the answer cache."""
+        if self.below_score_floor(chunks):
+            return NOT_AVAILABLE_ANSWER
         
-        # Format context
-        context_parts = []
-        for i, chunk in enumerate(chunks, 1):
-            context_parts.append(f"[Chunk {i} - Page {chunk['page']}]\n{chunk['text']}")
+        if self.answer_cache is not None and embedding is None and not conversation_context:
+            # Normally an embedding-cache hit: the query was just encoded for retrieval
+            embedding = self.retriever.encode_queries([query])[0]
         
-        context = "\n\n".join(context_parts)
+        cached = self._cached_answer(embedding, chunks, conversation_context)
+        if cached is not None:
+            return cached
         
-        # Generate answer
         answer = self.chain.invoke({
             "conversation_context": conversation_context,
-            "context": context,
+            "context": self._format_context(chunks),
+            "query": query
+        }).strip()
+        
+        self._cache_answer(embedding, query, answer, chunks, conversation_context)
+        return answer
+    
+    async def aanswer_from_chunks(self, query, chunks, conversation_context="", embedding=None):
+        """Async variant of answer_from_chunks."""
+        if self.below_score_floor(chunks):
+            return NOT_AVAILABLE_ANSWER
+        
+        if self.answer_cache is not None and embedding is None and not conversation_context:
+            embedding = (await self.retriever.aencode_queries([query]))[0]
+        
+        cached = self._cached_answer(embedding, chunks, conversation_context)
+        if cached is not None:
+            return cached
+        
+        answer = (await self.chain.ainvoke({
+            "conversation_context": conversation_context,
+            "context": self._format_context(chunks),
+            "query": query
+        })).strip()
+        
+        self._cache_answer(embedding, query, answer, chunks, conversation_context)
+        return answer
+    
+    async def astream_answer(self, query, chunks, conversation_context="", embedding=None):
+        """
+        Stream an answer from already-retrieved chunks as the LLM produces it.
+        
+        Yields:
+            tuple: ("token", text) pieces of the answer body, then one ("citations", text)
+            with the citation block, then ("answer", text) with the complete answer
+        """
+        if self.below_score_floor(chunks):
+            yield "token", NOT_AVAILABLE_ANSWER
+            yield "citations", ""
+            yield "answer", NOT_AVAILABLE_ANSWER
+            return
+        
+        if self.answer_cache is not None and embedding is None and not conversation_context:
+            embedding = (await self.retriever.aencode_queries([query]))[0]
+        
+        answer = self._cached_answer(embedding, chunks, conversation_context)
+        if answer is not None:
+            body, citations = split_citations(answer)
+            yield "token", body
+            yield "citations", citations or self._page_citations(chunks)
+            yield "answer", answer
+            return
+        
+        # Keep a marker-length tail unsent: it may be the start of "**Citations:"
+        hold = len(CITATIONS_MARKER) + 2
+        text = ""
+        sent = 0
+        marker_seen = False
+        async for piece in self.chain.astream({
+            "conversation_context": conversation_context,
+            "context": self._format_context(chunks),
             "query": query
+        }):
+            text += piece
+            if not marker_seen:
+                marker_seen = CITATIONS_MARKER in text
+                end = len(split_citations(text)[0]) if marker_seen else len(text.rstrip()) - hold
+                if end > sent:
+                    yield "token", text[sent:end]
+                    sent = end
+        
+        answer = text.strip()
+        body, citations = split_citations(text)
+        if len(body) > sent:
+            yield "token", body[sent:]
+        yield "citations", citations or self._page_citations(chunks)
+        yield "answer", answer
+        
+        self._cache_answer(embedding, query, answer, chunks, conversation_context)
+    
+    def below_score_floor(self, chunks):
+        """Whether no retrieved hit reaches the score floor, so the LLM call can be skipped."""
+        if self.score_floor is None:
+            return False
+        similarities = [chunk['similarity'] for chunk in chunks if chunk.get('similarity') is not None]
+        if not similarities:
+            # Nothing retrieved, or only BM25 matches without a dense score: let the LLM decide
+            return not chunks
+        if max(similarities) < self.score_floor:
+            print(f"[RAG] Best hit similarity {max(similarities):.3f} is below the score floor; skipping the LLM")
+            return True
+        return False
+    
+    def _page_citations(self, chunks):
+        """Citation block built from retrieved pages, for answers where the LLM omitted one."""
+        pages = sorted({
+            page for chunk in chunks for page in chunk.get('pages') or [chunk['page']] if page != 'Unknown'
         })
+        return f"{CITATIONS_MARKER}\nPage {', '.join(str(page) for page in pages)}" if pages else ""
+    
+    def _cached_answer(self, embedding, chunks, conversation_context):
+        """
+        Answer cached for a similar query over the same chunks, or None.
+        
+        Turns with conversation context are never served from the cache, mirroring
+        _cache_answer: a follow-up may depend on earlier turns the cached answer did not see.
+        """
+        if self.answer_cache is None or conversation_context:
+            return None
+        return self.answer_cache.get(
+            embedding, [chunk['id'] for chunk in chunks], self.retriever.index_version
+        )
+    
+    def _cache_answer(self, embedding, query, answer, chunks, conversation_context):
+        """Cache answers that do not depend on earlier turns of the conversation."""
+        if self.answer_cache is None or conversation_context:
+            return
+        self.answer_cache.put(
+            embedding, query, answer, [chunk['id'] for chunk in chunks], self.retriever.index_version
+        )
+    
+    def _format_context(self, chunks):
+        """Format retrieved chunks as the prompt context, deduplicated and budgeted when a packer is set."""
+        if self.context_packer is not None:
+            return "\n\n".join(
+                f"[Chunk {i} - Page {', '.join(str(page) for page in section['pages']) or 'Unknown'}]\n{section['text']}"
+                for i, section in enumerate(self.context_packer.pack(chunks), 1)
+            )
+        
+        context_parts = []
+        for i, chunk in enumerate(chunks, 1):
+            context_parts.append(f"[Chunk {i} - Page {chunk['page']}]\n{chunk['text']}")
         
-        return answer.strip()
+        return "\n\n".join(context_parts)
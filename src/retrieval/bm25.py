@@ -0,0 +1,129 @@
+"""
+Sparse BM25 inverted index over the chunk store rows.
+Postings are stored CSR-style with precomputed BM25 weights, so a query is a few
+array lookups and one scatter-add; files are memory-mapped and load instantly.
+"""
+import os
+import re
+import json
+from collections import Counter
+import numpy as np
+
+BM25_DIR = 'bm25'
+
+# Keeps figures and fiscal-year tokens intact: "13.8", "fy25", "hclsoftware"
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+
+
+def tokenize(text):
+    """Lowercased word and number tokens"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """Read-only BM25 index; rows are chunk store row numbers."""
+
+    FILES = ('vocab.json', 'meta.json', 'offsets.npy', 'rows.npy', 'weights.npy')
+
+    def __init__(self, index_dir):
+        """
+        Open an index written by BM25Index.write().
+
+        Args:
+            index_dir: Directory containing the postings files
+        """
+        with open(os.path.join(index_dir, 'vocab.json'), 'r', encoding='utf-8') as f:
+            self.vocab = json.load(f)
+        with open(os.path.join(index_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.offsets = np.load(os.path.join(index_dir, 'offsets.npy'), mmap_mode='r')
+        self.rows = np.load(os.path.join(index_dir, 'rows.npy'), mmap_mode='r')
+        self.weights = np.load(os.path.join(index_dir, 'weights.npy'), mmap_mode='r')
+        self.num_docs = self.meta['num_docs']
+
+    @staticmethod
+    def exists(index_dir):
+        """Whether a complete index is present in index_dir"""
+        return all(os.path.exists(os.path.join(index_dir, name)) for name in BM25Index.FILES)
+
+    @staticmethod
+    def write(chunks, index_dir, k1=1.5, b=0.75):
+        """
+        Build postings for chunks and write them to index_dir.
+
+        Repeated chunk texts are indexed once (at their first row), matching the
+        one-vector-per-distinct-text FAISS index.
+
+        Args:
+            chunks: Chunk dictionaries in chunk store row order
+            index_dir: Output directory
+            k1: BM25 term-frequency saturation
+            b: BM25 length normalization
+        """
+        os.makedirs(index_dir, exist_ok=True)
+
+        seen = set()
+        doc_terms = []
+        for row, chunk in enumerate(chunks):
+            if chunk['text'] in seen:
+                continue
+            seen.add(chunk['text'])
+            doc_terms.append((row, Counter(tokenize(chunk['text']))))
+
+        num_docs = len(doc_terms)
+        doc_len = np.array([sum(terms.values()) for _, terms in doc_terms], dtype=np.float32)
+        avgdl = float(doc_len.mean()) if num_docs else 0.0
+
+        postings = {}
+        for i, (row, terms) in enumerate(doc_terms):
+            norm = k1 * (1 - b + b * doc_len[i] / avgdl) if avgdl else k1
+            for term, tf in terms.items():
+                postings.setdefault(term, []).append((row, tf * (k1 + 1) / (tf + norm)))
+
+        vocab = {}
+        offsets = [0]
+        rows = []
+        weights = []
+        for term_id, term in enumerate(sorted(postings)):
+            vocab[term] = term_id
+            plist = postings[term]
+            idf = np.log(1 + (num_docs - len(plist) + 0.5) / (len(plist) + 0.5))
+            rows.extend(row for row, _ in plist)
+            weights.extend(idf * weight for _, weight in plist)
+            offsets.append(len(rows))
+
+        with open(os.path.join(index_dir, 'vocab.json'), 'w', encoding='utf-8') as f:
+            json.dump(vocab, f, ensure_ascii=False)
+        with open(os.path.join(index_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({'num_docs': num_docs, 'num_rows': len(chunks), 'avgdl': avgdl, 'k1': k1, 'b': b}, f)
+        np.save(os.path.join(index_dir, 'offsets.npy'), np.array(offsets, dtype=np.int64))
+        np.save(os.path.join(index_dir, 'rows.npy'), np.array(rows, dtype=np.int32))
+        np.save(os.path.join(index_dir, 'weights.npy'), np.array(weights, dtype=np.float32))
+
+    def search(self, query, top_k=5, allowed=None):
+        """
+        Score rows against a query.
+
+        Args:
+            query: Query text
+            top_k: Number of rows to return
+            allowed: Optional boolean mask of rows that may be returned
+
+        Returns:
+            tuple: (rows, scores) sorted by descending score; rows with no matching term are omitted
+        """
+        scores = np.zeros(self.meta['num_rows'], dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.vocab.get(term)
+            if term_id is not None:
+                start, end = int(self.offsets[term_id]), int(self.offsets[term_id + 1])
+                # Rows are unique within one posting list, so plain fancy-index addition is safe
+                scores[self.rows[start:end]] += self.weights[start:end]
+        if allowed is not None:
+            scores[~allowed] = 0
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > top_k:
+            matched = matched[np.argpartition(-scores[matched], top_k)[:top_k]]
+        order = matched[np.argsort(-scores[matched], kind='stable')]
+        return order, scores[order]
@@ -0,0 +1,176 @@
+"""
+Compact columnar chunk store read lazily through memory maps.
+One UTF-8 text blob plus fixed-width numpy columns; rows are decoded on access,
+so several API workers share the same page-cached files instead of private copies.
+"""
+import os
+import numpy as np
+
+CHUNK_STORE_DIR = 'chunk_store'
+
+# Bit per block type in the block_types column
+BLOCK_TYPES = ('heading', 'paragraph', 'data')
+
+
+class ChunkStore:
+    """Read-only, memory-mapped access to chunks by row id."""
+
+    FILES = ('offsets.npy', 'text.bin', 'chunk_ids.npy', 'faiss_ids.npy', 'page_offsets.npy', 'pages.npy')
+    # Source block ids, sections and block types; optional so stores written before
+    # they were added stay readable
+    OPTIONAL_FILES = ('block_offsets.npy', 'block_ids.npy', 'sections.npy', 'block_types.npy')
+
+    def __init__(self, store_dir):
+        """
+        Open a store written by ChunkStore.write().
+
+        Args:
+            store_dir: Directory containing the store columns
+        """
+        self.store_dir = store_dir
+        self.offsets = np.load(os.path.join(store_dir, 'offsets.npy'), mmap_mode='r')
+        self.chunk_ids = np.load(os.path.join(store_dir, 'chunk_ids.npy'), mmap_mode='r')
+        self.faiss_ids = np.load(os.path.join(store_dir, 'faiss_ids.npy'), mmap_mode='r')
+        self.page_offsets = np.load(os.path.join(store_dir, 'page_offsets.npy'), mmap_mode='r')
+        self.pages = np.load(os.path.join(store_dir, 'pages.npy'), mmap_mode='r')
+        self.block_offsets = self._load_optional('block_offsets.npy')
+        self.block_ids = self._load_optional('block_ids.npy')
+        self.sections = self._load_optional('sections.npy')
+        self.block_types = self._load_optional('block_types.npy')
+
+        text_path = os.path.join(store_dir, 'text.bin')
+        # np.memmap cannot map an empty file
+        self.text_blob = np.memmap(text_path, dtype=np.uint8, mode='r') if os.path.getsize(text_path) else b''
+
+        self._id_order = None
+        self._sorted_ids = None
+
+    @staticmethod
+    def exists(store_dir):
+        """Whether a complete store is present in store_dir"""
+        return all(os.path.exists(os.path.join(store_dir, name)) for name in ChunkStore.FILES)
+
+    @staticmethod
+    def is_current(store_dir):
+        """Whether the store in store_dir also has every optional column"""
+        return all(os.path.exists(os.path.join(store_dir, name)) for name in ChunkStore.OPTIONAL_FILES)
+
+    def _load_optional(self, name):
+        path = os.path.join(self.store_dir, name)
+        return np.load(path, mmap_mode='r') if os.path.exists(path) else None
+
+    @staticmethod
+    def write(chunks, store_dir, faiss_ids=None):
+        """
+        Write chunks as columns: text offsets + blob, chunk ids, FAISS ids, page and block
+        lists, sections and block type bitmasks.
+
+        Args:
+            chunks: List of chunk dictionaries
+            store_dir: Output directory
+            faiss_ids: Optional FAISS id per chunk (defaults to the row number)
+        """
+        os.makedirs(store_dir, exist_ok=True)
+
+        encoded = [chunk['text'].encode('utf-8') for chunk in chunks]
+        offsets = np.zeros(len(chunks) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(text) for text in encoded])
+
+        page_lists = [chunk.get('pages', []) for chunk in chunks]
+        page_offsets = np.zeros(len(chunks) + 1, dtype=np.int64)
+        page_offsets[1:] = np.cumsum([len(pages) for pages in page_lists])
+        pages = np.array([page for pages in page_lists for page in pages], dtype=np.int32)
+
+        block_lists = [chunk.get('blocks', []) for chunk in chunks]
+        block_offsets = np.zeros(len(chunks) + 1, dtype=np.int64)
+        block_offsets[1:] = np.cumsum([len(blocks) for blocks in block_lists])
+
+        block_types = np.zeros(len(chunks), dtype=np.uint8)
+        for row, chunk in enumerate(chunks):
+            for block_type in chunk.get('block_types', []):
+                if block_type in BLOCK_TYPES:
+                    block_types[row] |= 1 << BLOCK_TYPES.index(block_type)
+
+        if faiss_ids is None:
+            faiss_ids = np.arange(len(chunks), dtype=np.int64)
+
+        with open(os.path.join(store_dir, 'text.bin'), 'wb') as f:
+            for text in encoded:
+                f.write(text)
+        np.save(os.path.join(store_dir, 'offsets.npy'), offsets)
+        # Fixed-width byte strings, sized to the longest id
+        np.save(os.path.join(store_dir, 'chunk_ids.npy'),
+                np.array([chunk['id'].encode('utf-8') for chunk in chunks], dtype=np.bytes_))
+        np.save(os.path.join(store_dir, 'faiss_ids.npy'), np.asarray(faiss_ids, dtype=np.int64))
+        np.save(os.path.join(store_dir, 'page_offsets.npy'), page_offsets)
+        np.save(os.path.join(store_dir, 'pages.npy'), pages)
+        np.save(os.path.join(store_dir, 'block_offsets.npy'), block_offsets)
+        np.save(os.path.join(store_dir, 'block_ids.npy'),
+                np.array([block.encode('utf-8') for blocks in block_lists for block in blocks], dtype=np.bytes_))
+        np.save(os.path.join(store_dir, 'sections.npy'),
+                np.array([chunk.get('section', 'Unknown').encode('utf-8') for chunk in chunks], dtype=np.bytes_))
+        np.save(os.path.join(store_dir, 'block_types.npy'), block_types)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def text(self, row):
+        """Decode the text of one row"""
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return bytes(self.text_blob[start:end]).decode('utf-8')
+
+    def chunk_id(self, row):
+        """Chunk id of one row"""
+        return self.chunk_ids[row].decode('utf-8')
+
+    def page_list(self, row):
+        """Pages covered by one row"""
+        start, end = int(self.page_offsets[row]), int(self.page_offsets[row + 1])
+        return [int(page) for page in self.pages[start:end]]
+
+    def block_list(self, row):
+        """Source block ids of one row (empty for stores without block columns)"""
+        if self.block_offsets is None:
+            return []
+        start, end = int(self.block_offsets[row]), int(self.block_offsets[row + 1])
+        return [block.decode('utf-8') for block in self.block_ids[start:end]]
+
+    def section(self, row):
+        """Section of one row ('Unknown' for stores without section columns)"""
+        if self.sections is None:
+            return 'Unknown'
+        return self.sections[row].decode('utf-8')
+
+    def block_type_list(self, row):
+        """Block types present in one row"""
+        if self.block_types is None:
+            return []
+        mask = int(self.block_types[row])
+        return [block_type for bit, block_type in enumerate(BLOCK_TYPES) if mask & (1 << bit)]
+
+    def __getitem__(self, row):
+        """Chunk dictionary for one row, decoded on demand"""
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        return {
+            'id': self.chunk_id(row),
+            'text': self.text(row),
+            'pages': self.page_list(row),
+            'blocks': self.block_list(row),
+            'section': self.section(row),
+            'block_types': self.block_type_list(row)
+        }
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self[row]
+
+    def row_for_faiss_id(self, faiss_id):
+        """First row stored under a FAISS id, or -1 if the id is unknown"""
+        if self._id_order is None:
+            self._id_order = np.argsort(self.faiss_ids, kind='stable')
+            self._sorted_ids = self.faiss_ids[self._id_order]
+        pos = int(np.searchsorted(self._sorted_ids, faiss_id))
+        if pos < len(self._sorted_ids) and self._sorted_ids[pos] == faiss_id:
+            return int(self._id_order[pos])
+        return -1
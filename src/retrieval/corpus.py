@@ -0,0 +1,120 @@
+"""
+Corpus registry: the documents being served and where each one's index shard lives.
+Every document has its own chunks file and cache directory (FAISS index, chunk
+store, BM25 postings), so documents are built, loaded and dropped independently.
+"""
+import os
+import json
+import threading
+
+REGISTRY_PATH = 'data/corpus.json'
+CHUNKS_DIR = 'data/chunks'
+FAISS_CACHE_DIR = 'data/faiss_cache'
+
+
+def document_name(path):
+    """Document name of a PDF or chunks file: its file name without extension"""
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+class CorpusRegistry:
+    """JSON-backed map of document name -> chunks path and shard cache directory."""
+
+    def __init__(self, path=REGISTRY_PATH):
+        """
+        Load the registry.
+
+        Args:
+            path: Registry JSON file (created on the first register())
+        """
+        self.path = path
+        self._documents = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """(Re)read the registry file, picking up documents registered by other processes."""
+        documents = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for entry in json.load(f).get('documents', []):
+                    documents[entry['name']] = entry
+        with self._lock:
+            self._documents = documents
+
+    def save(self):
+        """Write the registry (atomic replace)."""
+        with self._lock:
+            snapshot = {'documents': list(self._documents.values())}
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def names(self):
+        """Registered document names, in registration order."""
+        with self._lock:
+            return list(self._documents)
+
+    def get(self, name):
+        """
+        Registry entry of one document.
+
+        Raises:
+            KeyError: If the document is not registered
+        """
+        with self._lock:
+            if name not in self._documents:
+                raise KeyError(f"Unknown document '{name}'")
+            return dict(self._documents[name])
+
+    def register(self, name, chunks_path=None, cache_dir=None):
+        """
+        Add or update a document and save the registry.
+
+        Args:
+            name: Document name
+            chunks_path: Chunks JSON (default: data/chunks/<name>.json)
+            cache_dir: Shard directory (default: data/faiss_cache/<name>)
+
+        Returns:
+            dict: The registry entry
+        """
+        with self._lock:
+            entry = dict(self._documents.get(name, {'name': name}))
+            entry['chunks_path'] = chunks_path or entry.get('chunks_path') or os.path.join(CHUNKS_DIR, f"{name}.json")
+            entry['cache_dir'] = cache_dir or entry.get('cache_dir') or os.path.join(FAISS_CACHE_DIR, name)
+            self._documents[name] = entry
+        self.save()
+        return dict(entry)
+
+    def unregister(self, name):
+        """Remove a document from the registry (its files are left in place)."""
+        with self._lock:
+            if self._documents.pop(name, None) is None:
+                raise KeyError(f"Unknown document '{name}'")
+        self.save()
+
+    def discover(self, chunks_dir=CHUNKS_DIR):
+        """
+        Register chunks files in chunks_dir that are not registered yet.
+
+        Returns:
+            list: Names of newly registered documents
+        """
+        if not os.path.isdir(chunks_dir):
+            return []
+        known = {entry['chunks_path'] for entry in map(self.get, self.names())}
+        added = []
+        for filename in sorted(os.listdir(chunks_dir)):
+            path = os.path.join(chunks_dir, filename)
+            if filename.endswith('.json') and path not in known and document_name(path) not in self.names():
+                self.register(document_name(path), chunks_path=path)
+                added.append(document_name(path))
+        return added
+
+    @staticmethod
+    def index_path(entry):
+        """FAISS index file of a registry entry"""
+        return os.path.join(entry['cache_dir'], 'index.faiss')
@@ -0,0 +1,225 @@
+"""
+Retrieval over a multi-document corpus: one index shard per registered document.
+Shards share the query encoder, embedding cache and reranker; a query is searched
+in every shard and the per-shard hits are merged into one top-k.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from retrieval.retrieval import Retriever
+from retrieval.corpus import CorpusRegistry
+from retrieval.filters import normalize_filters
+
+
+class CorpusRetriever(Retriever):
+    """Fans searches out over per-document Retriever shards that can be loaded and dropped live."""
+
+    def __init__(self, registry=None, documents=None, model_name="intfloat/e5-large-v2",
+                 cache_size=2048, cache_ttl=None, cache_path=None, encode_workers=2,
+                 reranker=None, rerank_candidates=50, shard_workers=4,
+                 batch_max_size=32, batch_max_wait_ms=None, embedding_backend=None, model=None,
+                 **shard_options):
+        """
+        Load the shards of registered documents.
+
+        Args:
+            registry: CorpusRegistry (default: data/corpus.json)
+            documents: Names of documents to load (default: every registered document)
+            model_name: Embedding model name, shared by all shards
+            cache_size: Maximum number of cached query embeddings (0 disables the cache)
+            cache_ttl: Optional lifetime of a cached query embedding in seconds
+            cache_path: Optional pickle file to persist the query embedding cache
+            encode_workers: Threads available to aretrieve() for encoding and search
+            reranker: Optional CrossEncoderReranker applied to the merged candidates
+            rerank_candidates: Candidates fetched per query for the reranker
+            shard_workers: Threads searching shards concurrently
+            batch_max_size: Queries after which a micro-batch is encoded without waiting
+            batch_max_wait_ms: How long concurrent query encodes wait to be batched
+                together (None encodes each call on its own)
+            embedding_backend: "torch", "onnx" or "onnx-int8" (default: EMBEDDING_BACKEND)
+            model: Already-loaded encoder to use instead of loading one on embedding_backend
+            **shard_options: Retriever options for every shard (nprobe, ef_search,
+                search_mode, fusion, dense_weight, rrf_k)
+        """
+        self.registry = registry or CorpusRegistry()
+        self.shard_options = shard_options
+        # Fusion runs once over the candidates merged from all shards, with the shards' settings
+        self.fusion = shard_options.get('fusion', 'rrf')
+        self.dense_weight = shard_options.get('dense_weight', 0.5)
+        self.rrf_k = shard_options.get('rrf_k', 60)
+        self.reranker = reranker
+        self.rerank_candidates = rerank_candidates
+        self._init_encoder(model_name, model, cache_size, cache_ttl, cache_path, encode_workers,
+                           batch_max_size, batch_max_wait_ms, embedding_backend)
+
+        # Replaced (never mutated) on load/drop, so searches iterate a stable snapshot
+        self.shards = {}
+        self._shard_lock = threading.Lock()
+        self._fanout = ThreadPoolExecutor(max_workers=shard_workers, thread_name_prefix="shard")
+
+        for name in (documents if documents is not None else self.registry.names()):
+            self.load_shard(name)
+
+    def load_shard(self, name):
+        """
+        Load (or reload) one document's shard without interrupting searches.
+
+        The registry file is re-read first, so documents registered by the
+        builder after startup can be loaded.
+
+        Args:
+            name: Registered document name
+
+        Returns:
+            Retriever: The loaded shard
+        """
+        self.registry.load()
+        entry = self.registry.get(name)
+        shard = Retriever(
+            CorpusRegistry.index_path(entry),
+            entry['chunks_path'],
+            cache_size=0,
+            encode_workers=1,
+            model=self.model,
+            embedding_backend=self.embedding_backend,
+            **self.shard_options
+        )
+        with self._shard_lock:
+            self.shards = {**self.shards, name: shard}
+        return shard
+
+    def drop_shard(self, name):
+        """
+        Stop serving one document; searches already running finish on the old snapshot.
+
+        Raises:
+            KeyError: If the shard is not loaded
+        """
+        with self._shard_lock:
+            if name not in self.shards:
+                raise KeyError(f"Document '{name}' is not loaded")
+            self.shards = {key: shard for key, shard in self.shards.items() if key != name}
+
+    @property
+    def index_version(self):
+        """Version of the loaded corpus; changes when any shard is rebuilt, loaded or dropped."""
+        return "|".join(f"{name}:{shard.index_version}" for name, shard in sorted(self.shards.items()))
+
+    def documents(self):
+        """Loaded documents with their chunk and vector counts."""
+        return [
+            {
+                'name': name,
+                'chunks': len(shard.chunks),
+                'vectors': shard.index.ntotal,
+                'index_version': shard.index_version
+            }
+            for name, shard in self.shards.items()
+        ]
+
+    def sections(self):
+        """Section names present in any loaded document."""
+        sections = {}
+        for shard in self.shards.values():
+            sections.update(dict.fromkeys(shard.sections()))
+        return list(sections)
+
+    def warmup(self):
+        """Run one dummy encode and a search in every shard."""
+        embedding = self.model.encode(["query: warmup"], convert_to_numpy=True, normalize_embeddings=True)
+        for shard in self.shards.values():
+            shard.index.search(np.ascontiguousarray(embedding, dtype='float32'), 1)
+        if self.reranker is not None:
+            self.reranker.warmup()
+
+    def search(self, query_matrix, top_k=5, queries=None, filters=None):
+        """
+        Search every loaded shard and fuse the hits of all shards as one candidate set.
+        
+        Each shard returns its dense and BM25 candidates; dense candidates are merged
+        by cosine similarity and BM25 candidates by score across shards, and fusion
+        then ranks the merged lists once, so the top-k does not fill up with every
+        document's best hit regardless of relevance.
+
+        Args:
+            query_matrix: float32 matrix of normalized query embeddings
+            top_k: Number of chunks to retrieve per query
+            queries: Query texts (enable hybrid fusion and reranking)
+            filters: Retriever filters, plus 'document' (name or list) to search only
+                those shards
+
+        Returns:
+            list: One list of hits per query row; each hit carries its 'document', and
+            its 'id' and 'blocks' are prefixed "<document>/" to stay unique
+        """
+        filters = dict(filters or {})
+        documents = filters.pop('document', None)
+        shards = self.shards
+        if documents:
+            names = (documents,) if isinstance(documents, str) else documents
+            if not isinstance(names, (list, tuple)) or not all(isinstance(name, str) for name in names):
+                raise ValueError(f"document must be a string or a list of strings, got {documents!r}")
+            names = set(names)
+            shards = {name: shard for name, shard in shards.items() if name in names}
+        if not shards:
+            return [[] for _ in range(len(query_matrix))]
+        canonical = normalize_filters(filters)
+        if canonical:
+            # Documents without the metadata a filter needs cannot match it
+            filterable = {name: shard for name, shard in shards.items() if not shard.metadata.unsupported(canonical)}
+            if not filterable:
+                unsupported = next(iter(shards.values())).metadata.unsupported(canonical)
+                raise ValueError(f"No searched document has {' or '.join(unsupported)} metadata to filter by; "
+                                 f"re-run the ingestion pipeline to add it")
+            shards = filterable
+
+        rerank = self.reranker is not None and queries is not None
+        candidates = max(self.rerank_candidates, top_k) if rerank else top_k
+
+        def shard_candidates(item):
+            name, shard = item
+            return name, shard.candidate_lists(query_matrix, candidates, queries, filters or None)
+
+        if len(shards) == 1:
+            per_shard = [shard_candidates(next(iter(shards.items())))]
+        else:
+            per_shard = list(self._fanout.map(shard_candidates, shards.items()))
+
+        results = []
+        for i in range(len(query_matrix)):
+            dense = self._merge((name, lists[i][0]) for name, lists in per_shard)
+            shard_sparse = [(name, lists[i][1]) for name, lists in per_shard if lists[i][1] is not None]
+            sparse = None
+            if shard_sparse:
+                fetch = self.fetch_size(candidates, hybrid=True)
+                dense = dense[:fetch]
+                sparse = self._merge(shard_sparse)[:fetch]
+            ranked = self._rank(dense, sparse, candidates)
+            similarities = dict(dense)
+            results.append([
+                self._tag(name, shards[name]._format_rows([(row, score)], {row: similarities.get((name, row))})[0])
+                for (name, row), score in ranked
+            ])
+
+        if rerank:
+            results = [self.reranker.rerank(query, hits, top_k) for query, hits in zip(queries, results)]
+        return results
+
+    @staticmethod
+    def _merge(shard_lists):
+        """Merge per-shard (row, score) lists into one ((document, row), score) list, best first."""
+        merged = [((name, row), score) for name, scored in shard_lists for row, score in scored]
+        merged.sort(key=lambda pair: -pair[1])
+        return merged
+
+    @staticmethod
+    def _tag(name, hit):
+        """Attribute a shard hit to its document."""
+        return dict(
+            hit,
+            document=name,
+            id=f"{name}/{hit['id']}",
+            blocks=[f"{name}/{block}" for block in hit.get('blocks', [])]
+        )
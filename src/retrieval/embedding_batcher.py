@@ -0,0 +1,126 @@
+"""
+Dynamic micro-batching of query encodes.
+Concurrent requests each encode one query; the batcher holds them for a few
+milliseconds (or until enough queries arrive), runs them through the encoder as
+one batch and resolves each request's future with its rows.
+"""
+import time
+import queue
+import threading
+from concurrent.futures import Future, InvalidStateError
+
+import numpy as np
+
+
+class EmbeddingBatcher:
+    """Collects texts from concurrent callers into encoder batches bounded by size and wait time."""
+
+    def __init__(self, encode_fn, max_batch_size=32, max_wait_ms=2):
+        """
+        Initialize the batcher (its worker thread starts on first use).
+
+        Args:
+            encode_fn: Callable mapping a list of texts to a float32 embedding matrix
+            max_batch_size: Texts after which a batch is run without waiting further
+            max_wait_ms: Longest the first text of a batch waits for others to join
+        """
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+
+        self._pending = queue.Queue()  # (texts, Future)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+
+    def submit(self, texts):
+        """
+        Queue texts for encoding.
+
+        Returns:
+            Future: Resolves to the float32 embedding matrix of texts, in order
+        """
+        future = Future()
+        if not texts:
+            future.set_result(np.zeros((0, 0), dtype='float32'))
+            return future
+        self._start()
+        self._pending.put((list(texts), future))
+        return future
+
+    def encode(self, texts):
+        """Encode texts as part of a shared batch, blocking until done."""
+        return self.submit(texts).result()
+
+    def stats(self):
+        """Batch counters: batches run, texts encoded, mean and largest batch size."""
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'avg_batch_size': round(self.items / self.batches, 2) if self.batches else 0.0,
+            'largest_batch': self.largest_batch,
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000
+        }
+
+    def _start(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                    self._thread.start()
+
+    def _collect(self):
+        """Block for the first live request, then gather more until the batch is full or the wait is over."""
+        requests = []
+        while not requests:
+            request = self._pending.get()
+            # Callers that cancelled while queued (e.g. a disconnected client) are dropped
+            if request[1].set_running_or_notify_cancel():
+                requests.append(request)
+        size = len(requests[0][0])
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self._pending.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request[1].set_running_or_notify_cancel():
+                requests.append(request)
+                size += len(request[0])
+        return requests
+
+    def _run(self):
+        while True:
+            requests = self._collect()
+            texts = [text for batch, _ in requests for text in batch]
+            try:
+                embeddings = self.encode_fn(texts)
+            except Exception as e:
+                for _, future in requests:
+                    self._resolve(future, exception=e)
+                continue
+
+            self.batches += 1
+            self.items += len(texts)
+            self.largest_batch = max(self.largest_batch, len(texts))
+            offset = 0
+            for batch, future in requests:
+                self._resolve(future, embeddings[offset:offset + len(batch)])
+                offset += len(batch)
+
+    @staticmethod
+    def _resolve(future, result=None, exception=None):
+        """Complete a caller's future; a future that is already done must not stop the worker thread."""
+        try:
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
+        except InvalidStateError:
+            pass
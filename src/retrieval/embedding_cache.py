@@ -0,0 +1,134 @@
+"""
+LRU cache for query embeddings with optional disk persistence.
+Sits in front of the embedding model so repeated questions skip the encoder.
+"""
+import os
+import re
+import time
+import pickle
+import threading
+from collections import OrderedDict
+
+
+def normalize_query(text):
+    """Normalize query text into a cache key (e5-large-v2 is uncased)."""
+    return re.sub(r'\s+', ' ', text.strip().lower())
+
+
+class EmbeddingCache:
+    """Bounded, thread-safe LRU cache mapping normalized query text to embeddings."""
+
+    def __init__(self, max_size=2048, ttl_seconds=None, persist_path=None, model_name=None):
+        """
+        Initialize the cache.
+
+        Args:
+            max_size: Maximum number of cached embeddings before LRU eviction
+            ttl_seconds: Optional lifetime of an entry in seconds (None = never expires)
+            persist_path: Optional pickle file used by save()/load()
+            model_name: Embedding model name; snapshots from other models are ignored
+        """
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.persist_path = persist_path
+        self.model_name = model_name
+
+        self._entries = OrderedDict()  # key -> (created_at, embedding)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if persist_path:
+            self.load()
+
+    def _expired(self, created_at, now):
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def get(self, text):
+        """Return the cached embedding for text, or None on a miss."""
+        key = normalize_query(text)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self._expired(entry[0], now):
+                if entry is not None:
+                    del self._entries[key]
+                    self.evictions += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, text, embedding):
+        """Store an embedding, evicting least recently used entries past max_size."""
+        key = normalize_query(text)
+
+        with self._lock:
+            self._entries[key] = (time.time(), embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop all cached embeddings."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+    def save(self, path=None):
+        """Snapshot the cache to disk (atomic replace)."""
+        path = path or self.persist_path
+        if not path:
+            return
+
+        with self._lock:
+            snapshot = {
+                'model_name': self.model_name,
+                'entries': list(self._entries.items())
+            }
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(snapshot, f)
+        os.replace(tmp_path, path)
+
+    def load(self, path=None):
+        """Load a snapshot written by save(), skipping expired or foreign-model entries."""
+        path = path or self.persist_path
+        if not path or not os.path.exists(path):
+            return
+
+        try:
+            with open(path, 'rb') as f:
+                snapshot = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return
+
+        if snapshot.get('model_name') != self.model_name:
+            return
+
+        now = time.time()
+        with self._lock:
+            for key, (created_at, embedding) in snapshot.get('entries', []):
+                if not self._expired(created_at, now):
+                    self._entries[key] = (created_at, embedding)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
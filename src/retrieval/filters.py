@@ -0,0 +1,131 @@
+"""
+Chunk metadata filters for pre-filtered search.
+Page spans, sections and block types are held as flat arrays per chunk row, so a
+filter resolves to its matching rows with a few vectorized comparisons.
+"""
+import numpy as np
+
+from retrieval.chunk_store import BLOCK_TYPES
+
+FILTER_KEYS = ('page_range', 'section', 'block_type')
+
+
+def normalize_filters(filters):
+    """
+    Validate a filter dict and convert it to a hashable canonical form.
+
+    Args:
+        filters: Dict with any of 'page_range' ([first, last], inclusive),
+            'section' (name or list of names) and 'block_type' (type or list of types)
+
+    Returns:
+        tuple: Sorted (key, value) pairs, or None if nothing is filtered
+    """
+    if not filters:
+        return None
+
+    unknown = set(filters) - set(FILTER_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown filter(s) {', '.join(sorted(unknown))}. Choose from: {', '.join(FILTER_KEYS)}")
+
+    normalized = []
+    page_range = filters.get('page_range')
+    if page_range is not None:
+        if (not isinstance(page_range, (list, tuple)) or len(page_range) != 2
+                or not all(isinstance(page, int) and not isinstance(page, bool) for page in page_range)):
+            raise ValueError(f"page_range must be a list of two page numbers [first, last], got {page_range!r}")
+        start, end = page_range
+        normalized.append(('page_range', (start, end)))
+
+    for key in ('block_type', 'section'):
+        value = filters.get(key)
+        if not value:
+            continue
+        values = (value,) if isinstance(value, str) else value
+        if not isinstance(values, (list, tuple)) or not all(isinstance(item, str) for item in values):
+            raise ValueError(f"{key} must be a string or a list of strings, got {value!r}")
+        values = tuple(values)
+        if key == 'block_type':
+            invalid = [block_type for block_type in values if block_type not in BLOCK_TYPES]
+            if invalid:
+                raise ValueError(f"Unknown block type(s) {', '.join(invalid)}. Choose from: {', '.join(BLOCK_TYPES)}")
+        normalized.append((key, tuple(sorted(values))))
+
+    return tuple(normalized) or None
+
+
+def _row_metadata(chunks, row):
+    """(pages, section, block types) of one row of a ChunkStore or chunk list"""
+    if hasattr(chunks, 'page_list'):
+        # Column accessors avoid decoding chunk text
+        return chunks.page_list(row), chunks.section(row), chunks.block_type_list(row)
+    chunk = chunks[row]
+    return chunk.get('pages', []), chunk.get('section', 'Unknown'), chunk.get('block_types', [])
+
+
+class ChunkMetadata:
+    """Filterable metadata of every chunk row."""
+
+    def __init__(self, chunks):
+        """
+        Collect page spans, sections and block types.
+
+        Args:
+            chunks: ChunkStore or list of chunk dictionaries
+        """
+        num_rows = len(chunks)
+        self.first_page = np.full(num_rows, -1, dtype=np.int32)
+        self.last_page = np.full(num_rows, -1, dtype=np.int32)
+        self.section_ids = np.zeros(num_rows, dtype=np.int32)
+        self.block_types = np.zeros(num_rows, dtype=np.uint8)
+        self.section_names = []
+
+        section_codes = {}
+        for row in range(num_rows):
+            pages, section, block_types = _row_metadata(chunks, row)
+            if pages:
+                self.first_page[row] = min(pages)
+                self.last_page[row] = max(pages)
+            if section not in section_codes:
+                section_codes[section] = len(self.section_names)
+                self.section_names.append(section)
+            self.section_ids[row] = section_codes[section]
+            for block_type in block_types:
+                if block_type in BLOCK_TYPES:
+                    self.block_types[row] |= 1 << BLOCK_TYPES.index(block_type)
+
+        # Sections are matched case-insensitively
+        self._section_codes = {name.lower(): code for name, code in section_codes.items()}
+        # Filter keys the chunks carry no metadata for (chunked before sections were extracted)
+        self.missing = tuple(key for key, present in (
+            ('section', any(name != 'Unknown' for name in self.section_names)),
+            ('block_type', bool(self.block_types.any()))
+        ) if not present)
+
+    def unsupported(self, filters):
+        """Keys of canonical filters that no chunk has metadata for."""
+        return [key for key, _ in filters or () if key in self.missing]
+
+    def matching_rows(self, filters):
+        """
+        Rows satisfying every filter.
+
+        Args:
+            filters: Canonical filters from normalize_filters()
+
+        Returns:
+            np.ndarray: Boolean mask over chunk rows
+        """
+        mask = np.ones(len(self.section_ids), dtype=bool)
+        for key, value in filters:
+            if key == 'page_range':
+                # Chunks overlapping the range match, including ones that span into it
+                start, end = value
+                mask &= (self.first_page >= 0) & (self.first_page <= end) & (self.last_page >= start)
+            elif key == 'section':
+                codes = [self._section_codes[name.lower()] for name in value if name.lower() in self._section_codes]
+                mask &= np.isin(self.section_ids, codes)
+            elif key == 'block_type':
+                bits = sum(1 << BLOCK_TYPES.index(block_type) for block_type in value)
+                mask &= (self.block_types & bits) != 0
+        return mask
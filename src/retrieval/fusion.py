@@ -0,0 +1,44 @@
+"""Rank fusion for combining dense and sparse retrieval results."""
+
+
+def reciprocal_rank_fusion(rankings, k=60, weights=None):
+    """
+    Fuse ranked lists with reciprocal-rank fusion.
+
+    Args:
+        rankings: Lists of item ids, best first
+        k: RRF damping constant (60 is the usual choice)
+        weights: Optional weight per ranking
+
+    Returns:
+        list: (item, score) pairs sorted by descending fused score
+    """
+    weights = weights or [1.0] * len(rankings)
+    scores = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, item in enumerate(ranking):
+            scores[item] = scores.get(item, 0.0) + weight / (k + rank + 1)
+    return sorted(scores.items(), key=lambda pair: -pair[1])
+
+
+def weighted_fusion(scored_lists, weights):
+    """
+    Fuse (item, score) lists by a weighted sum of min-max normalized scores.
+
+    Args:
+        scored_lists: Lists of (item, score) pairs, one per retriever
+        weights: Weight per list
+
+    Returns:
+        list: (item, score) pairs sorted by descending fused score
+    """
+    scores = {}
+    for scored, weight in zip(scored_lists, weights):
+        if not scored:
+            continue
+        values = [score for _, score in scored]
+        low, high = min(values), max(values)
+        for item, score in scored:
+            norm = (score - low) / (high - low) if high > low else 1.0
+            scores[item] = scores.get(item, 0.0) + weight * norm
+    return sorted(scores.items(), key=lambda pair: -pair[1])
@@ -0,0 +1,121 @@
+"""
+CPU cross-encoder reranking of retrieved candidates.
+Candidates are scored in batches, best-first, until a latency budget is spent;
+scores are cached per (query, chunk id) so repeated questions skip the model.
+"""
+import time
+import threading
+from collections import OrderedDict
+
+from retrieval.embedding_cache import normalize_query
+
+DEFAULT_RERANK_MODEL = 'cross-encoder/ms-marco-MiniLM-L-6-v2'
+
+
+class CrossEncoderReranker:
+    """Re-scores (query, chunk) pairs with a small cross-encoder."""
+
+    def __init__(self, model_name=DEFAULT_RERANK_MODEL, batch_size=16, budget_ms=150,
+                 cache_size=4096, max_length=512):
+        """
+        Load the cross-encoder.
+
+        Args:
+            model_name: sentence-transformers CrossEncoder model
+            batch_size: Pairs scored per forward pass
+            budget_ms: Time budget for model inference per query; remaining
+                candidates keep their retrieval order after the scored ones
+            cache_size: Maximum number of cached (query, chunk id) scores
+            max_length: Maximum tokens per (query, chunk) pair
+        """
+        from sentence_transformers import CrossEncoder
+
+        self.model = CrossEncoder(model_name, max_length=max_length, device='cpu')
+        self.batch_size = batch_size
+        self.budget_ms = budget_ms
+        self.cache_size = cache_size
+
+        self._scores = OrderedDict()  # (query, chunk id) -> score
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.truncated = 0
+
+    def warmup(self):
+        """Run one dummy batch so the first real query skips one-time setup costs."""
+        self.model.predict([("warmup", "warmup")], batch_size=1, show_progress_bar=False)
+
+    def _cached(self, key):
+        with self._lock:
+            score = self._scores.get(key)
+            if score is None:
+                self.misses += 1
+                return None
+            self._scores.move_to_end(key)
+            self.hits += 1
+            return score
+
+    def _store(self, keys, scores):
+        with self._lock:
+            for key, score in zip(keys, scores):
+                self._scores[key] = score
+                self._scores.move_to_end(key)
+            while len(self._scores) > self.cache_size:
+                self._scores.popitem(last=False)
+
+    def rerank(self, query, candidates, top_k=5):
+        """
+        Reorder candidates by cross-encoder score.
+
+        Args:
+            query: User query string
+            candidates: Chunk dictionaries in retrieval order (best first)
+            top_k: Number of chunks to return
+
+        Returns:
+            list: Top-k chunk dictionaries, reranked, with a 'rerank_score'
+            (None for candidates the latency budget left unscored)
+        """
+        query_key = normalize_query(query)
+        scores = {}
+        pending = []
+        for i, chunk in enumerate(candidates):
+            key = (query_key, chunk.get('id') or chunk['text'])
+            score = self._cached(key)
+            if score is None:
+                pending.append((i, key))
+            else:
+                scores[i] = score
+
+        # Score uncached candidates best-first, stopping once the budget is spent
+        start = time.perf_counter()
+        for batch_start in range(0, len(pending), self.batch_size):
+            if (time.perf_counter() - start) * 1000 >= self.budget_ms:
+                self.truncated += 1
+                break
+            batch = pending[batch_start:batch_start + self.batch_size]
+            batch_scores = self.model.predict(
+                [(query, candidates[i]['text']) for i, _ in batch],
+                batch_size=self.batch_size,
+                show_progress_bar=False
+            )
+            batch_scores = [float(score) for score in batch_scores]
+            self._store([key for _, key in batch], batch_scores)
+            scores.update((i, score) for (i, _), score in zip(batch, batch_scores))
+
+        scored = sorted(scores, key=lambda i: -scores[i])
+        unscored = [i for i in range(len(candidates)) if i not in scores]
+        return [dict(candidates[i], rerank_score=scores.get(i)) for i in (scored + unscored)[:top_k]]
+
+    def stats(self):
+        """Return score cache counters and how often the latency budget cut reranking short."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._scores),
+                'max_size': self.cache_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'truncated': self.truncated
+            }
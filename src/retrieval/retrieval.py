@@ -2,66 +2,506 @@
 Simple retrieval module for the RAG system.
 This assumes FAISS index and embeddings are already built.
 """
+import os
 import json
-import numpy as np
+import asyncio
+import logging
+import threading
 import faiss
-from sentence_transformers import SentenceTransformer
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from embeddings.build_faiss_index import (
+    load_index_params, apply_search_params, load_manifest, chunk_faiss_id, index_version
+)
+from embeddings.embedding_backend import load_encoder, resolve_backend, model_identity
+from retrieval.chunk_store import ChunkStore, CHUNK_STORE_DIR
+from retrieval.embedding_cache import EmbeddingCache
+from retrieval.embedding_batcher import EmbeddingBatcher
+from retrieval.bm25 import BM25Index, BM25_DIR
+from retrieval.fusion import reciprocal_rank_fusion, weighted_fusion
+from retrieval.filters import ChunkMetadata, normalize_filters
+
+logger = logging.getLogger(__name__)
+
+# Distinct filters whose FAISS ID selectors are kept
+FILTER_CACHE_SIZE = 64
 
 
 class Retriever:
     """Retrieves relevant document chunks using FAISS vector search."""
     
-    def __init__(self, index_path, chunks_path, model_name="intfloat/e5-large-v2"):
+    def __init__(self, index_path, chunks_path, model_name="intfloat/e5-large-v2",
+                 cache_size=2048, cache_ttl=None, cache_path=None,
+                 nprobe=None, ef_search=None, encode_workers=2,
+                 search_mode="hybrid", fusion="rrf", dense_weight=0.5, rrf_k=60,
+                 reranker=None, rerank_candidates=50, model=None,
+                 batch_max_size=32, batch_max_wait_ms=None, embedding_backend=None):
         """
         Initialize retriever with FAISS index and document chunks.
         
         Args:
             index_path: Path to FAISS index file
-            chunks_path: Path to JSON file containing document chunks
+            chunks_path: Path to JSON file containing document chunks (used when the
+                index has no chunk store next to it)
             model_name: Embedding model name
+            cache_size: Maximum number of cached query embeddings (0 disables the cache)
+            cache_ttl: Optional lifetime of a cached query embedding in seconds
+            cache_path: Optional pickle file to persist the query embedding cache
+            nprobe: IVF lists probed per query (overrides the persisted value)
+            ef_search: HNSW search beam width (overrides the persisted value)
+            encode_workers: Threads available to aretrieve() for encoding and search
+            search_mode: "hybrid" fuses dense and BM25 results when BM25 postings exist,
+                "dense" uses FAISS only
+            fusion: "rrf" (reciprocal-rank fusion) or "weighted" (normalized score sum)
+            dense_weight: Weight of dense scores in weighted fusion (BM25 gets the rest)
+            rrf_k: Damping constant for reciprocal-rank fusion
+            reranker: Optional CrossEncoderReranker applied to the retrieved candidates
+            rerank_candidates: Candidates fetched per query for the reranker
+            model: Already-loaded SentenceTransformer to share (e.g. between corpus shards)
+            batch_max_size: Queries after which a micro-batch is encoded without waiting
+            batch_max_wait_ms: How long concurrent query encodes wait to be batched
+                together (None encodes each call on its own)
+            embedding_backend: "torch", "onnx" or "onnx-int8" (default: EMBEDDING_BACKEND)
         """
         # Load FAISS index
         self.index = faiss.read_index(index_path)
+        # Legacy L2 indexes report squared distances; hits expose cosine similarity either way
+        self._l2_metric = self.index.metric_type == faiss.METRIC_L2
+        # Ties derived caches (e.g. cached answers) to this build of the index
+        self.index_version = index_version(index_path)
+        # ID selectors per metadata filter, rebuilt when search parameters change
+        self._filter_cache = OrderedDict()
+        self._filter_lock = threading.Lock()
+        
+        # Apply persisted search-time parameters, with any explicit overrides
+        self.index_params = load_index_params(os.path.dirname(index_path))
+        self.set_search_params(nprobe=nprobe, ef_search=ef_search)
+        
+        # Indexes built with a manifest store content-hash ids instead of row positions
+        cache_dir = os.path.dirname(index_path)
+        manifest = load_manifest(cache_dir)
+        id_mapped = bool(manifest and manifest.get('id_mapped'))
+        store_dir = os.path.join(cache_dir, CHUNK_STORE_DIR)
+        
+        if id_mapped and ChunkStore.exists(store_dir):
+            # Memory-mapped chunk store written with the index; rows decode lazily
+            self.chunks = ChunkStore(store_dir)
+            self._row_for_id = self.chunks.row_for_faiss_id
+        else:
+            # Load document chunks
+            with open(chunks_path, 'r', encoding='utf-8') as f:
+                self.chunks = json.load(f)
+            self._row_for_id = None
+            if id_mapped:
+                id_to_row = {}
+                for row, chunk in enumerate(self.chunks):
+                    id_to_row.setdefault(chunk_faiss_id(chunk), row)
+                self._row_for_id = lambda faiss_id: id_to_row.get(faiss_id, -1)
+        
+        # FAISS id of every row, and the metadata pre-filtered searches select rows by
+        if isinstance(self.chunks, ChunkStore):
+            self._faiss_ids = np.asarray(self.chunks.faiss_ids)
+        elif id_mapped:
+            self._faiss_ids = np.array([chunk_faiss_id(chunk) for chunk in self.chunks], dtype=np.int64)
+        else:
+            self._faiss_ids = np.arange(len(self.chunks), dtype=np.int64)
+        self.metadata = ChunkMetadata(self.chunks)
+        if self.metadata.missing:
+            missing = ' or '.join(self.metadata.missing)
+            logger.warning(f"Chunks of {cache_dir} have no {missing} metadata, so {missing} filters are "
+                           f"rejected; re-run the ingestion pipeline to add it")
+        
+        # Sparse BM25 postings written next to the index, memory-mapped
+        bm25_dir = os.path.join(cache_dir, BM25_DIR)
+        self.bm25 = None
+        if search_mode == "hybrid" and BM25Index.exists(bm25_dir):
+            self.bm25 = BM25Index(bm25_dir)
+        self.fusion = fusion
+        self.dense_weight = dense_weight
+        self.rrf_k = rrf_k
+        self.reranker = reranker
+        self.rerank_candidates = rerank_candidates
+        
+        self._init_encoder(model_name, model, cache_size, cache_ttl, cache_path, encode_workers,
+                           batch_max_size, batch_max_wait_ms, embedding_backend)
+    
+    def _init_encoder(self, model_name, model, cache_size, cache_ttl, cache_path, encode_workers,
+                      batch_max_size=32, batch_max_wait_ms=None, embedding_backend=None):
+        """Set up the query encoder, its embedding cache, micro-batcher and the thread pool for async calls."""
+        self.embedding_backend = resolve_backend(embedding_backend)
+        if model is None:
+            model = load_encoder(model_name, self.embedding_backend)
+        self.model = model
+        
+        # Query embedding cache in front of the encoder
+        self.embedding_cache = None
+        if cache_size:
+            self.embedding_cache = EmbeddingCache(
+                max_size=cache_size,
+                ttl_seconds=cache_ttl,
+                persist_path=cache_path,
+                # Cached embeddings from another backend are not reused
+                model_name=model_identity(model_name, self.embedding_backend)
+            )
         
-        # Load document chunks
-        with open(chunks_path, 'r', encoding='utf-8') as f:
-            self.chunks = json.load(f)
+        # Cache misses of concurrent requests are encoded together
+        self.batcher = None
+        if batch_max_wait_ms is not None:
+            self.batcher = EmbeddingBatcher(self._encode_texts, batch_max_size, batch_max_wait_ms)
         
-        # Load embedding model with increased timeout
-        import os
-        os.environ['HF_HUB_DOWNLOAD_TIMEOUT'] = '60'
-        self.model = SentenceTransformer(model_name)
+        # Bounded pool for CPU-bound encode/search called from async code, so
+        # concurrent requests queue here instead of oversubscribing the CPU
+        self._executor = ThreadPoolExecutor(max_workers=encode_workers, thread_name_prefix="retriever")
     
-    def retrieve(self, query, top_k=5):
+    def set_search_params(self, nprobe=None, ef_search=None):
+        """
+        Adjust search-time knobs of an approximate index (ignored for flat indexes).
+        
+        Args:
+            nprobe: IVF lists probed per query
+            ef_search: HNSW search beam width
+        """
+        index_type = self.index_params.get('index_type', 'flat')
+        if nprobe is not None and 'ivf' in index_type:
+            self.index_params['nprobe'] = nprobe
+        if ef_search is not None and index_type == 'hnsw':
+            self.index_params['ef_search'] = ef_search
+        apply_search_params(self.index, self.index_params)
+        with self._filter_lock:
+            self._filter_cache.clear()
+    
+    def warmup(self):
+        """Run one dummy encode and search so the first real query skips one-time setup costs."""
+        embedding = self.model.encode(["query: warmup"], convert_to_numpy=True, normalize_embeddings=True)
+        self.index.search(np.ascontiguousarray(embedding, dtype='float32'), 1)
+        if self.reranker is not None:
+            self.reranker.warmup()
+    
+    def retrieve(self, query, top_k=5, filters=None):
         """
         Retrieve top-k most relevant chunks for the query.
         
         Args:
             query: User query string
             top_k: Number of chunks to retrieve
+            filters: Optional metadata filters (see search)
+            
+        Returns:
+            list: List of hit dictionaries (see search)
+        """
+        return self.retrieve_batch([query], top_k=top_k, filters=filters)[0]
+    
+    async def aretrieve(self, query, top_k=5, filters=None):
+        """
+        Retrieve without blocking the event loop; encoding runs in the retriever's thread pool.
+        
+        Args:
+            query: User query string
+            top_k: Number of chunks to retrieve
+            filters: Optional metadata filters (see search)
             
         Returns:
-            list: List of chunk dictionaries with 'text' and 'page' keys
+            list: List of hit dictionaries (see search)
         """
-        # Embed query with e5 format
-        query_text = f"query: {query}"
-        query_embedding = self.model.encode([query_text], normalize_embeddings=True)
+        if self.batcher is not None:
+            # Encoding waits on the shared micro-batch without holding a pool thread
+            query_matrix = await self.aencode_queries([query])
+            return (await self.asearch(query_matrix, top_k, [query], filters))[0]
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.retrieve, query, top_k, filters)
+    
+    def retrieve_batch(self, queries, top_k=5, batch_size=32, filters=None):
+        """
+        Retrieve top-k chunks for many queries with one batched encode and search.
         
-        # Search FAISS index
-        distances, indices = self.index.search(query_embedding.astype('float32'), top_k)
+        Args:
+            queries: List of user query strings
+            top_k: Number of chunks to retrieve per query
+            batch_size: Encoder batch size used by sentence-transformers
+            filters: Optional metadata filters applied to every query (see search)
+            
+        Returns:
+            list: One list of hit dictionaries per query, in input order
+        """
+        if not queries:
+            return []
+        
+        query_matrix = self.encode_queries(queries, batch_size=batch_size)
+        return self.search(query_matrix, top_k=top_k, queries=queries, filters=filters)
+    
+    def sections(self):
+        """Section names present in the corpus."""
+        return list(self.metadata.section_names)
+    
+    def search(self, query_matrix, top_k=5, queries=None, filters=None):
+        """
+        Search with already-encoded queries (e.g. an embedding shared with intent routing).
         
-        # Retrieve chunks and format them
+        Args:
+            query_matrix: float32 matrix of normalized query embeddings
+            top_k: Number of chunks to retrieve per query
+            queries: Query texts; when given, dense and BM25 results are fused (if
+                BM25 postings are loaded) and reranked (if a reranker is set)
+            filters: Optional dict restricting the search to chunks overlapping
+                'page_range' ([first, last]), in 'section' (name or list) or containing
+                'block_type' (heading/paragraph/data, or a list); FAISS and BM25 only
+                score the matching chunks
+            
+        Returns:
+            list: One list of hit dictionaries per query row: 'id', 'text', 'page' (first
+            page), 'pages', 'blocks', 'section', 'score' (ranking score: cosine similarity, or the
+            fused score in hybrid mode), 'similarity' (cosine similarity, None for
+            BM25-only hits) and, when reranked, 'rerank_score'
+        """
+        rerank = self.reranker is not None and queries is not None
+        # Reranking and fusion need a deeper candidate list than the final top-k
+        candidates = max(self.rerank_candidates, top_k) if rerank else top_k
+        
+        results = [
+            self._format_rows(self._rank(dense, sparse, candidates), dict(dense))
+            for dense, sparse in self.candidate_lists(query_matrix, candidates, queries, filters)
+        ]
+        
+        if rerank:
+            results = [self.reranker.rerank(query, chunks, top_k) for query, chunks in zip(queries, results)]
+        return results
+    
+    async def asearch(self, query_matrix, top_k=5, queries=None, filters=None):
+        """Async variant of search, run in the retriever's thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.search, query_matrix, top_k, queries, filters)
+    
+    def _filter(self, filters):
+        """
+        Row mask and FAISS search parameters selecting the chunks that match filters.
+        
+        Returns:
+            tuple: (boolean row mask, SearchParameters with an ID selector)
+        """
+        with self._filter_lock:
+            cached = self._filter_cache.get(filters)
+            if cached is not None:
+                self._filter_cache.move_to_end(filters)
+                return cached
+        
+        allowed = self.metadata.matching_rows(filters)
+        selector = faiss.IDSelectorBatch(np.unique(self._faiss_ids[allowed]))
+        index_type = self.index_params.get('index_type', 'flat')
+        # Parameter objects replace the index's own knobs, so carry them over
+        if 'ivf' in index_type:
+            params = faiss.SearchParametersIVF(sel=selector, nprobe=int(self.index_params.get('nprobe') or 1))
+        elif index_type == 'hnsw':
+            params = faiss.SearchParametersHNSW(sel=selector, efSearch=int(self.index_params.get('ef_search') or 16))
+        else:
+            params = faiss.SearchParameters(sel=selector)
+        # The selector is referenced by the parameters, so it is cached alongside them
+        params.selector_ref = selector
+        
+        with self._filter_lock:
+            self._filter_cache[filters] = (allowed, params)
+            while len(self._filter_cache) > FILTER_CACHE_SIZE:
+                self._filter_cache.popitem(last=False)
+        return allowed, params
+    
+    @staticmethod
+    def fetch_size(candidates, hybrid):
+        """Candidates fetched from each of FAISS and BM25; fusion needs a deeper list than it returns."""
+        return max(candidates * 4, 20) if hybrid else candidates
+    
+    def candidate_lists(self, query_matrix, candidates, queries=None, filters=None):
+        """
+        Dense and BM25 candidates of each query, before fusion.
+        
+        Args:
+            query_matrix: float32 matrix of normalized query embeddings
+            candidates: Number of chunks fusion will keep per query
+            queries: Query texts (enable BM25 when postings are loaded)
+            filters: Optional metadata filters (see search)
+        
+        Returns:
+            list: One (dense, sparse) pair per query row: dense (row, cosine similarity)
+            pairs and sparse (row, BM25 score) pairs, best first; sparse is None when
+            BM25 is not used
+        """
+        hybrid = self.bm25 is not None and queries is not None
+        fetch = self.fetch_size(candidates, hybrid)
+        
+        allowed, params = None, None
+        filters = normalize_filters(filters)
+        unsupported = self.metadata.unsupported(filters)
+        if unsupported:
+            raise ValueError(f"The indexed chunks have no {' or '.join(unsupported)} metadata to filter by; "
+                             f"re-run the ingestion pipeline to add it")
+        if filters:
+            allowed, params = self._filter(filters)
+            if not allowed.any():
+                return [([], [] if hybrid else None) for _ in range(len(query_matrix))]
+        
+        # Single FAISS search over the stacked query matrix
+        distances, indices = self.index.search(query_matrix, fetch, params=params)
+        
+        lists = []
+        for i in range(len(indices)):
+            dense_rows = self._dense_rows(indices[i])
+            if allowed is not None:
+                # Duplicate texts share one vector, whose first row may lie outside the filter
+                dense_rows = [row if row >= 0 and allowed[row] else -1 for row in dense_rows]
+            similarities = self._similarities(distances[i])
+            dense = [(row, score) for row, score in zip(dense_rows, similarities) if row >= 0]
+            sparse = None
+            if hybrid:
+                sparse_rows, sparse_scores = self.bm25.search(queries[i], fetch, allowed)
+                sparse = list(zip(sparse_rows.tolist(), sparse_scores.tolist()))
+            lists.append((dense, sparse))
+        return lists
+    
+    def _rank(self, dense, sparse, candidates):
+        """
+        Fuse dense (item, similarity) and BM25 (item, score) lists into the top (item, score) pairs.
+        
+        Without BM25 candidates (sparse is None) the dense order is kept.
+        """
+        if sparse is None:
+            return dense[:candidates]
+        
+        if self.fusion == "weighted":
+            fused = weighted_fusion([dense, sparse], [self.dense_weight, 1 - self.dense_weight])
+        else:
+            fused = reciprocal_rank_fusion([[item for item, _ in dense], [item for item, _ in sparse]], k=self.rrf_k)
+        
+        return fused[:candidates]
+    
+    def encode_queries(self, queries, batch_size=32):
+        """
+        Embed queries in e5 format, serving repeats from the embedding cache.
+        
+        Args:
+            queries: List of user query strings
+            batch_size: Encoder batch size used by sentence-transformers
+            
+        Returns:
+            np.ndarray: float32 matrix of normalized query embeddings
+        """
+        embeddings, missing = self._cached_embeddings(queries)
+        
+        # Encode all cache misses as one padded batch (shared with concurrent callers if batching)
+        if missing:
+            texts = [f"query: {query}" for query in missing]
+            if self.batcher is not None:
+                encoded = self.batcher.encode(texts)
+            else:
+                encoded = self._encode_texts(texts, batch_size)
+            self._fill_missing(embeddings, missing, encoded)
+        
+        return np.ascontiguousarray(np.vstack(embeddings), dtype='float32')
+    
+    async def aencode_queries(self, queries, batch_size=32):
+        """Async variant of encode_queries; waits on the micro-batcher or runs in the thread pool."""
+        if self.batcher is None:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self.encode_queries, queries, batch_size)
+        
+        embeddings, missing = self._cached_embeddings(queries)
+        if missing:
+            encoded = await asyncio.wrap_future(self.batcher.submit([f"query: {query}" for query in missing]))
+            self._fill_missing(embeddings, missing, encoded)
+        return np.ascontiguousarray(np.vstack(embeddings), dtype='float32')
+    
+    def _cached_embeddings(self, queries):
+        """Embeddings found in the cache (None elsewhere) and the missing queries -> positions."""
+        embeddings = [None] * len(queries)
+        missing = {}
+        for i, query in enumerate(queries):
+            cached = self.embedding_cache.get(query) if self.embedding_cache else None
+            if cached is not None:
+                embeddings[i] = cached
+            else:
+                missing.setdefault(query, []).append(i)
+        return embeddings, missing
+    
+    def _fill_missing(self, embeddings, missing, encoded):
+        """Place freshly encoded queries and add them to the cache."""
+        for query, embedding in zip(missing, encoded):
+            if self.embedding_cache:
+                self.embedding_cache.put(query, embedding)
+            for i in missing[query]:
+                embeddings[i] = embedding
+    
+    def _encode_texts(self, texts, batch_size=32):
+        """Run prefixed texts through the model as normalized float32 embeddings."""
+        return self.model.encode(
+            texts,
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        ).astype('float32')
+    
+    def cache_stats(self):
+        """Return query embedding cache counters (None if caching is disabled)."""
+        return self.embedding_cache.stats() if self.embedding_cache else None
+    
+    def batch_stats(self):
+        """Return query micro-batching counters (None if batching is disabled)."""
+        return self.batcher.stats() if self.batcher else None
+    
+    def rerank_stats(self):
+        """Return reranker score cache counters (None without a reranker)."""
+        return self.reranker.stats() if self.reranker else None
+    
+    def save_cache(self):
+        """Persist the query embedding cache if a cache path was configured."""
+        if self.embedding_cache:
+            self.embedding_cache.save()
+    
+    def _dense_rows(self, indices):
+        """
+        Map one row of FAISS result ids to chunk rows.
+        
+        Positions are kept (-1 for ids that cannot be resolved) so rows stay aligned
+        with the FAISS distances.
+        """
+        rows = []
+        for idx in indices:
+            idx = int(idx)
+            if idx >= 0 and self._row_for_id is not None:
+                # Ids of chunks no longer in the chunks file are skipped
+                idx = self._row_for_id(idx)
+            # FAISS pads missing results with -1
+            rows.append(idx if 0 <= idx < len(self.chunks) else -1)
+        return rows
+    
+    def _similarities(self, distances):
+        """Cosine similarities for one row of FAISS distances (query and chunk vectors are normalized)."""
+        if self._l2_metric:
+            return [1.0 - float(distance) / 2 for distance in distances]
+        return [float(distance) for distance in distances]
+    
+    def _format_rows(self, ranked, similarities):
+        """
+        Convert ranked (row, score) pairs into hit dictionaries.
+        
+        Args:
+            ranked: (chunk row, ranking score) pairs, best first
+            similarities: Dense cosine similarity by chunk row
+        """
         results = []
-        for idx in indices[0]:
-            if idx < len(self.chunks):
-                chunk = self.chunks[idx]
-                # Extract page numbers from the chunk
-                pages = chunk.get('pages', [])
-                page = pages[0] if pages else 'Unknown'
-                
-                results.append({
-                    'text': chunk.get('text', ''),
-                    'page': page
-                })
+        for row, score in ranked:
+            chunk = self.chunks[row]
+            # Extract page numbers from the chunk
+            pages = chunk.get('pages', [])
+            page = pages[0] if pages else 'Unknown'
+            
+            results.append({
+                'id': chunk.get('id'),
+                'text': chunk.get('text', ''),
+                'page': page,
+                'pages': pages,
+                'blocks': chunk.get('blocks', []),
+                'section': chunk.get('section', 'Unknown'),
+                'score': float(score),
+                'similarity': similarities.get(row)
+            })
         
         return results
@@ -0,0 +1,304 @@
+"""
+Shared embedding and search service for multi-worker serving.
+One process loads the e5 model and the corpus shards and serves every API worker
+over a local socket (a Unix socket, or a named pipe on Windows), so adding workers
+does not add model or index copies. The retriever's EmbeddingBatcher runs encode
+requests arriving from different workers within a few milliseconds as one batch.
+
+    python search_service.py
+    SEARCH_SERVICE=1 uvicorn backend_api:app --workers 4
+"""
+import os
+import sys
+import time
+import pickle
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+
+from retrieval.retrieval import Retriever
+
+DEFAULT_ADDRESS = r'\\.\pipe\rag_search_service' if sys.platform == 'win32' else 'data/search_service.sock'
+
+# Shared secret generated by the service when SEARCH_SERVICE_KEY is not set
+DEFAULT_KEY_FILE = 'data/search_service.key'
+
+# Calls a client may make besides encode/retrieve/search
+FORWARDED_CALLS = (
+    'sections', 'documents', 'load_shard', 'drop_shard', 'warmup',
+    'cache_stats', 'rerank_stats', 'batch_stats', 'index_version'
+)
+
+
+def service_address():
+    """Socket address from SEARCH_SERVICE_ADDRESS, or the platform default."""
+    return os.getenv('SEARCH_SERVICE_ADDRESS', DEFAULT_ADDRESS)
+
+
+def service_authkey(create=False):
+    """
+    Shared secret of the service and its clients.
+
+    Connections exchange pickles, so the service never runs without one. The key
+    comes from SEARCH_SERVICE_KEY, else from the key file (SEARCH_SERVICE_KEY_FILE,
+    default data/search_service.key), which only the owner can read.
+
+    Args:
+        create: Generate the key file if it does not exist (done by the service)
+
+    Raises:
+        RuntimeError: If no key is configured and the key file does not exist
+    """
+    key = os.getenv('SEARCH_SERVICE_KEY')
+    if key:
+        return key.encode()
+
+    key_file = os.getenv('SEARCH_SERVICE_KEY_FILE', DEFAULT_KEY_FILE)
+    if create and not os.path.exists(key_file):
+        try:
+            descriptor = os.open(key_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            pass  # Written concurrently by another service start
+        else:
+            with os.fdopen(descriptor, 'w') as f:
+                f.write(secrets.token_hex(32))
+    try:
+        with open(key_file, 'r', encoding='utf-8') as f:
+            key = f.read().strip()
+    except FileNotFoundError:
+        key = None
+    if not key:
+        raise RuntimeError(f"No search service key: set SEARCH_SERVICE_KEY or start the service to create {key_file}")
+    return key.encode()
+
+
+def retriever_from_env(registry_path, cache_path, batch_max_size=None, batch_max_wait_ms=None):
+    """
+    Build the corpus retriever configured by environment variables.
+
+    Used by the API in single-process mode and by the search service, so both
+    serve the same configuration.
+
+    Args:
+        registry_path: Corpus registry JSON
+        cache_path: Pickle file persisting the query embedding cache
+        batch_max_size: Overrides EMBED_BATCH_MAX_SIZE
+        batch_max_wait_ms: Overrides EMBED_BATCH_MAX_WAIT_MS
+    """
+    from retrieval.corpus import CorpusRegistry
+    from retrieval.corpus_retriever import CorpusRetriever
+    from retrieval.reranker import CrossEncoderReranker
+
+    reranker = None
+    if os.getenv('RERANK', '0') == '1':
+        reranker = CrossEncoderReranker(budget_ms=float(os.getenv('RERANK_BUDGET_MS', '150')))
+
+    return CorpusRetriever(
+        CorpusRegistry(registry_path),
+        cache_size=int(os.getenv('QUERY_CACHE_SIZE', '2048')),
+        cache_ttl=float(os.getenv('QUERY_CACHE_TTL')) if os.getenv('QUERY_CACHE_TTL') else None,
+        cache_path=cache_path,
+        nprobe=int(os.getenv('FAISS_NPROBE')) if os.getenv('FAISS_NPROBE') else None,
+        ef_search=int(os.getenv('FAISS_EF_SEARCH')) if os.getenv('FAISS_EF_SEARCH') else None,
+        encode_workers=int(os.getenv('ENCODE_WORKERS', '2')),
+        search_mode=os.getenv('RETRIEVAL_MODE', 'hybrid'),
+        fusion=os.getenv('RETRIEVAL_FUSION', 'rrf'),
+        reranker=reranker,
+        rerank_candidates=int(os.getenv('RERANK_CANDIDATES', '50')),
+        batch_max_size=batch_max_size or int(os.getenv('EMBED_BATCH_MAX_SIZE', '32')),
+        batch_max_wait_ms=batch_max_wait_ms if batch_max_wait_ms is not None
+        else float(os.getenv('EMBED_BATCH_MAX_WAIT_MS', '2')),
+        embedding_backend=os.getenv('EMBEDDING_BACKEND')
+    )
+
+
+class SearchService:
+    """Serves one retriever to many client processes over a local socket."""
+
+    def __init__(self, retriever, address=DEFAULT_ADDRESS, authkey=None):
+        """
+        Initialize the service.
+
+        Args:
+            retriever: Retriever (or CorpusRetriever) to serve; give it a micro-batcher
+                so encodes from different workers share model calls
+            address: Unix socket path or Windows pipe name
+            authkey: Shared secret clients must present (required)
+
+        Raises:
+            ValueError: If no authkey is given
+        """
+        if not authkey:
+            raise ValueError("The search service needs an authkey; clients' calls are unpickled")
+        self.retriever = retriever
+        self.address = address
+        self.authkey = authkey
+
+    def handle(self, method, args):
+        """Run one client call."""
+        if method == 'encode':
+            return self.retriever.encode_queries(args[0])
+        if method == 'retrieve':
+            queries, top_k, filters = args
+            return self.retriever.search(self.retriever.encode_queries(queries), top_k, queries, filters)
+        if method == 'search':
+            return self.retriever.search(*args)
+        if method == 'load_shard':
+            # The loaded shard itself stays in the service
+            self.retriever.load_shard(*args)
+            return None
+        if method not in FORWARDED_CALLS:
+            raise ValueError(f"Unknown search service call '{method}'")
+        attribute = getattr(self.retriever, method)
+        return attribute(*args) if callable(attribute) else attribute
+
+    def _serve_connection(self, connection):
+        """Answer one client's calls until it disconnects."""
+        with connection:
+            while True:
+                try:
+                    method, args = connection.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    reply = ('ok', self.handle(method, args))
+                except Exception as e:
+                    reply = ('error', e)
+                try:
+                    connection.send(reply)
+                except (pickle.PicklingError, TypeError, AttributeError) as e:
+                    connection.send(('error', RuntimeError(f"Search service could not send the result of {method}: {e}")))
+
+    def serve_forever(self):
+        """Accept client connections, one thread each, until interrupted."""
+        unix_socket = not self.address.startswith('\\\\')
+        if unix_socket and os.path.exists(self.address):
+            # Stale socket from a previous run
+            os.remove(self.address)
+        # Create the socket owner-only, so other local users cannot even attempt the handshake
+        previous_umask = os.umask(0o177) if unix_socket else None
+        try:
+            listener = Listener(self.address, authkey=self.authkey)
+        finally:
+            if previous_umask is not None:
+                os.umask(previous_umask)
+        if unix_socket:
+            os.chmod(self.address, 0o600)
+        with listener:
+            print(f"Search service listening on {self.address}")
+            while True:
+                try:
+                    connection = listener.accept()
+                except (AuthenticationError, OSError):
+                    # A client with the wrong key, or one that hung up during the handshake
+                    continue
+                threading.Thread(target=self._serve_connection, args=(connection,), daemon=True).start()
+
+
+class RemoteRetriever(Retriever):
+    """Retriever interface backed by a SearchService in another process."""
+
+    def __init__(self, address=DEFAULT_ADDRESS, authkey=None, registry=None,
+                 encode_workers=4, connect_timeout=120):
+        """
+        Connect to the service, waiting for it to finish loading.
+
+        Args:
+            address: Service socket path or pipe name
+            authkey: Shared secret configured on the service (default: service_authkey(),
+                read once the service has created its key file)
+            registry: CorpusRegistry read by the API's /corpus endpoint
+            encode_workers: Threads available to the async methods
+            connect_timeout: Seconds to wait for the service to come up
+        """
+        self.address = address
+        self.authkey = authkey
+        self.registry = registry
+        self.reranker = None
+        self.embedding_cache = None
+        self.batcher = None
+        self._local = threading.local()  # One connection per thread
+        self._executor = ThreadPoolExecutor(max_workers=encode_workers, thread_name_prefix="retriever")
+
+        deadline = time.time() + connect_timeout
+        while True:
+            try:
+                if self.authkey is None:
+                    self.authkey = service_authkey()
+                self._connection()
+                break
+            except (FileNotFoundError, ConnectionRefusedError, RuntimeError):
+                if time.time() > deadline:
+                    raise ConnectionError(f"Search service at {address} did not come up within {connect_timeout}s")
+                time.sleep(1)
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = Client(self.address, authkey=self.authkey)
+            self._local.connection = connection
+        return connection
+
+    def _call(self, method, *args):
+        """Send one call to the service and return its result (re-raising its errors)."""
+        connection = self._connection()
+        try:
+            connection.send((method, args))
+            status, result = connection.recv()
+        except (EOFError, OSError):
+            # Service restarted; the next call reconnects
+            self._local.connection = None
+            raise
+        if status == 'error':
+            raise result
+        return result
+
+    def encode_queries(self, queries, batch_size=32):
+        """Embed queries in the service (batched with other workers' queries)."""
+        return self._call('encode', list(queries))
+
+    def retrieve_batch(self, queries, top_k=5, batch_size=32, filters=None):
+        """Retrieve top-k chunks for many queries with one service round trip."""
+        if not queries:
+            return []
+        return self._call('retrieve', list(queries), top_k, filters)
+
+    def search(self, query_matrix, top_k=5, queries=None, filters=None):
+        """Search with already-encoded queries in the service."""
+        return self._call('search', query_matrix, top_k, queries, filters)
+
+    @property
+    def index_version(self):
+        return self._call('index_version')
+
+    def sections(self):
+        return self._call('sections')
+
+    def documents(self):
+        return self._call('documents')
+
+    def load_shard(self, name):
+        """Load a document's shard in the service, for every API worker at once."""
+        self._call('load_shard', name)
+
+    def drop_shard(self, name):
+        self._call('drop_shard', name)
+
+    def warmup(self):
+        self._call('warmup')
+
+    def cache_stats(self):
+        return self._call('cache_stats')
+
+    def rerank_stats(self):
+        return self._call('rerank_stats')
+
+    def batch_stats(self):
+        """Micro-batching counters of the service's encoder."""
+        return self._call('batch_stats')
+
+    def save_cache(self):
+        """The service persists the query embedding cache itself on shutdown."""
+
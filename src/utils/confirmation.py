@@ -19,7 +19,25 @@ class ConfirmationClassifier:
         Returns:
             str: "AFFIRMATIVE", "NEGATIVE", or "UNCLEAR"
         """
-        prompt = f"""You are analyzing a user's response to a confirmation question.
+        response = self.client.chat.complete(
+            model="mistral-small-latest",
+            messages=[{"role": "user", "content": self._build_prompt(user_response, context)}],
+            temperature=0.0
+        )
+        return self._parse_result(response.choices[0].message.content)
+    
+    async def aclassify_response(self, user_response, context):
+        """Classify a confirmation response without blocking the event loop."""
+        response = await self.client.chat.complete_async(
+            model="mistral-small-latest",
+            messages=[{"role": "user", "content": self._build_prompt(user_response, context)}],
+            temperature=0.0
+        )
+        return self._parse_result(response.choices[0].message.content)
+    
+    def _build_prompt(self, user_response, context):
+        """Prompt asking the LLM to label a confirmation response."""
+        return f"""You are analyzing a user's response to a confirmation question.
 
 Context: The system asked if the user wants to {context}
 
@@ -40,14 +58,10 @@ Examples:
 "what?" → UNCLEAR
 
 Output ONLY one word (no explanation):"""
-
-        response = self.client.chat.complete(
-            model="mistral-small-latest",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.0
-        )
-        
-        result = response.choices[0].message.content.strip().upper()
+    
+    def _parse_result(self, content):
+        """Map raw LLM output to a confirmation label."""
+        result = content.strip().upper()
         
         if "AFFIRMATIVE" in result:
             return "AFFIRMATIVE"
@@ -2,22 +2,52 @@
 from mistralai import Mistral
 import json
 import os
+import asyncio
 from datetime import datetime, timedelta
 import re
 
 class DescriptionEnhancer:
     """Enhances and refines action descriptions."""
     
+    DATE_FIELDS = ['date', 'start_date', 'end_date']
+    
     def __init__(self, api_key):
         """Initialize with Mistral client."""
         self.client = Mistral(api_key=api_key)
     
+    def _complete(self, prompt, temperature):
+        """Run one chat completion and return the stripped reply."""
+        response = self.client.chat.complete(
+            model="mistral-small-2503",
+            messages=[{"role": "user", "content": prompt}],
+            temperature=temperature
+        )
+        return response.choices[0].message.content.strip()
+    
+    async def _acomplete(self, prompt, temperature):
+        """Run one chat completion without blocking the event loop."""
+        response = await self.client.chat.complete_async(
+            model="mistral-small-2503",
+            messages=[{"role": "user", "content": prompt}],
+            temperature=temperature
+        )
+        return response.choices[0].message.content.strip()
+    
     def normalize_date(self, date_string):
         """Convert natural language date to ISO format (YYYY-MM-DD)."""
         if not date_string or date_string.strip() == "":
             return ""
-        
-        prompt = f"""Convert the following date to ISO format (YYYY-MM-DD).
+        return self._parse_date(self._complete(self._date_prompt(date_string), 0.0), date_string)
+    
+    async def anormalize_date(self, date_string):
+        """Async variant of normalize_date."""
+        if not date_string or date_string.strip() == "":
+            return ""
+        return self._parse_date(await self._acomplete(self._date_prompt(date_string), 0.0), date_string)
+    
+    def _date_prompt(self, date_string):
+        """Prompt for converting a date to ISO format."""
+        return f"""Convert the following date to ISO format (YYYY-MM-DD).
 
 Date: "{date_string}"
 Current date: {datetime.now().strftime('%Y-%m-%d')}
@@ -31,14 +61,9 @@ Rules:
 - Any format → YYYY-MM-DD
 
 Output ONLY the date in YYYY-MM-DD format (no explanation):"""
-
-        response = self.client.chat.complete(
-            model="mistral-small-2503",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.0
-        )
-        
-        normalized = response.choices[0].message.content.strip()
+    
+    def _parse_date(self, normalized, date_string):
+        """Validate the LLM's ISO date, falling back to the original string."""
         # Validate format
         if re.match(r'^\d{4}-\d{2}-\d{2}$', normalized):
             return normalized
@@ -61,7 +86,15 @@ Output ONLY the date in YYYY-MM-DD format (no explanation):"""
     
     def enhance_description(self, user_query, action_type):
         """Generate professional, polished description from user query using Mistral Large."""
-        prompt = f"""You are a professional IT/HR ticket writer. Transform the user's informal query into a polished, professional ticket description.
+        return self._complete(self._enhance_prompt(user_query, action_type), 0.3)
+    
+    async def aenhance_description(self, user_query, action_type):
+        """Async variant of enhance_description."""
+        return await self._acomplete(self._enhance_prompt(user_query, action_type), 0.3)
+    
+    def _enhance_prompt(self, user_query, action_type):
+        """Prompt for rewriting a query as a ticket description."""
+        return f"""You are a professional IT/HR ticket writer. Transform the user's informal query into a polished, professional ticket description.
 
 User's query: "{user_query}"
 Action type: {action_type}
@@ -74,13 +107,6 @@ Create a professional description that:
 - 2-3 sentences maximum
 
 Output ONLY the professional description:"""
-
-        response = self.client.chat.complete(
-            model="mistral-small-2503",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.3
-        )
-        return response.choices[0].message.content.strip()
     
     def refine_description(self, user_input):
         """Transform user's custom description into professional format."""
@@ -106,7 +132,53 @@ Output ONLY the professional description:"""
     
     def modify_action_json(self, current_json, user_modification_request):
         """Modify action JSON based on user's change request."""
-        prompt = f"""You are modifying an action JSON based on user's request.
+        result = self._complete(self._modify_prompt(current_json, user_modification_request), 0.0)
+        modified_json = self._parse_modified_json(result)
+        if modified_json is None:
+            return current_json
+        
+        try:
+            # Normalize date fields
+            for field in self.DATE_FIELDS:
+                if field in modified_json and modified_json[field]:
+                    modified_json[field] = self.normalize_date(modified_json[field])
+            
+            # Normalize priority field
+            if 'priority' in modified_json:
+                modified_json['priority'] = self.normalize_priority(modified_json['priority'])
+        except Exception as e:
+            print(f"\n[DEBUG] Normalizing modified JSON failed: {e}")
+            return current_json
+        
+        return modified_json
+    
+    async def amodify_action_json(self, current_json, user_modification_request):
+        """Async variant of modify_action_json; date fields are normalized concurrently."""
+        result = await self._acomplete(self._modify_prompt(current_json, user_modification_request), 0.0)
+        modified_json = self._parse_modified_json(result)
+        if modified_json is None:
+            return current_json
+        
+        try:
+            await self.anormalize_date_fields(modified_json)
+            
+            if 'priority' in modified_json:
+                modified_json['priority'] = self.normalize_priority(modified_json['priority'])
+        except Exception as e:
+            print(f"\n[DEBUG] Normalizing modified JSON failed: {e}")
+            return current_json
+        
+        return modified_json
+    
+    async def anormalize_date_fields(self, action_json):
+        """Normalize all date fields of an action in place, one concurrent LLM call per field."""
+        fields = [field for field in self.DATE_FIELDS if action_json.get(field)]
+        dates = await asyncio.gather(*(self.anormalize_date(action_json[field]) for field in fields))
+        action_json.update(zip(fields, dates))
+    
+    def _modify_prompt(self, current_json, user_modification_request):
+        """Prompt for applying a change request to an action JSON."""
+        return f"""You are modifying an action JSON based on user's request.
 
 Current JSON:
 {json.dumps(current_json, indent=2)}
@@ -130,41 +202,38 @@ Examples:
 - "expand the description" → Make description longer and more detailed
 
 Output ONLY the complete modified JSON (no explanations, no text before or after):"""
-
-        response = self.client.chat.complete(
-            model="mistral-small-2503",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.0
-        )
-        
+    
+    def _parse_modified_json(self, result):
+        """Parse the modified JSON from the LLM reply, or None if it is not a JSON object."""
+        raw = result
         try:
-            result = response.choices[0].message.content.strip()
             # Remove markdown code blocks if present
             if result.startswith('```'):
                 result = result.split('```')[1]
                 if result.startswith('json'):
                     result = result[4:]
             modified_json = json.loads(result.strip())
-            
-            # Normalize date fields
-            date_fields = ['date', 'start_date', 'end_date']
-            for field in date_fields:
-                if field in modified_json and modified_json[field]:
-                    modified_json[field] = self.normalize_date(modified_json[field])
-            
-            # Normalize priority field
-            if 'priority' in modified_json:
-                modified_json['priority'] = self.normalize_priority(modified_json['priority'])
-            
+            if not isinstance(modified_json, dict):
+                raise ValueError(f"expected a JSON object, got {type(modified_json).__name__}")
             return modified_json
         except Exception as e:
             print(f"\n[DEBUG] JSON parsing failed: {e}")
-            print(f"[DEBUG] Raw response: {response.choices[0].message.content}")
-            return current_json
+            print(f"[DEBUG] Raw response: {raw}")
+            return None
     
     def check_satisfaction(self, user_response):
         """Check if user is satisfied with current ticket."""
-        prompt = f"""The user is looking at a ticket and was asked "Do you want to modify the ticket?"
+        result = self._complete(self._satisfaction_prompt(user_response), 0.0)
+        return self._parse_satisfaction(result, user_response)
+    
+    async def acheck_satisfaction(self, user_response):
+        """Async variant of check_satisfaction."""
+        result = await self._acomplete(self._satisfaction_prompt(user_response), 0.0)
+        return self._parse_satisfaction(result, user_response)
+    
+    def _satisfaction_prompt(self, user_response):
+        """Prompt for classifying whether the user is done with the ticket."""
+        return f"""The user is looking at a ticket and was asked "Do you want to modify the ticket?"
 
 User response: "{user_response}"
 
@@ -196,14 +265,10 @@ UNSATISFIED (user wants to CONTINUE MODIFYING):
 IMPORTANT: If the user says they're satisfied/happy/done in ANY way, classify as SATISFIED.
 
 Respond with ONLY one word: SATISFIED or UNSATISFIED"""
-
-        response = self.client.chat.complete(
-            model="mistral-small-2503",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.0
-        )
-        
-        result = response.choices[0].message.content.strip().upper()
+    
+    def _parse_satisfaction(self, result, user_response):
+        """Map the LLM label to a boolean."""
+        result = result.upper()
         print(f"\n[DEBUG] Satisfaction check - User: '{user_response}' -> AI: {result}")
         return "SATISFIED" in result
     
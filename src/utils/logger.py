@@ -7,17 +7,22 @@ class SystemLogger:
     """Handles logging of all user interactions and system responses."""
     
     def __init__(self, log_dir="logs"):
-        """Initialize logger with file and console handlers."""
+        """Initialize logger with file and console handlers (added once per process)."""
+        # Configure logger
+        self.logger = logging.getLogger("AgenticRAG")
+        self.logger.setLevel(logging.INFO)
+        
+        # The logger is process-wide; further instances reuse its handlers instead of
+        # opening another log file and duplicating every line
+        if self.logger.handlers:
+            return
+        
         os.makedirs(log_dir, exist_ok=True)
         
         # Create log file with timestamp
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         log_file = os.path.join(log_dir, f"system_{timestamp}.log")
         
-        # Configure logger
-        self.logger = logging.getLogger("AgenticRAG")
-        self.logger.setLevel(logging.INFO)
-        
         # File handler
         fh = logging.FileHandler(log_file, encoding='utf-8')
         fh.setLevel(logging.INFO)
@@ -34,14 +39,21 @@ class SystemLogger:
         self.logger.addHandler(fh)
         self.logger.addHandler(ch)
     
-    def log_query(self, query, intent=None):
-        """Log user query."""
+    def log_query(self, query, intent=None, source=None):
+        """Log user query; intents decided by the local classifier are marked "(local)"."""
+        if source == "local":
+            intent = f"{intent} (local)"
         self.logger.info(f"USER_QUERY | Intent: {intent} | Query: {query}")
     
     def log_response(self, response_type, content):
         """Log system response."""
         self.logger.info(f"SYSTEM_RESPONSE | Type: {response_type} | Content: {str(content)[:200]}")
     
+    def log_timings(self, timings):
+        """Log per-stage latency of one query."""
+        stages = " | ".join(f"{stage}: {value}" for stage, value in timings.items())
+        self.logger.info(f"TIMINGS | {stages}")
+    
     def log_error(self, error):
         """Log system error."""
         self.logger.error(f"ERROR | {str(error)}")
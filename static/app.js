@@ -117,25 +117,7 @@ function renderMessages() {
         
         const contentDiv = document.createElement('div');
         contentDiv.className = 'message-content';
-        
-        // Format content with markdown-like bold and line breaks
-        let formattedContent = msg.content;
-        // Convert **text** to <strong>text</strong>
-        formattedContent = formattedContent.replace(/\*\*(.*?)\*\*/g, '<strong>$1</strong>');
-        // Convert bullet points
-        formattedContent = formattedContent.replace(/^• /gm, '&bull; ');
-        formattedContent = formattedContent.replace(/^- /gm, '&bull; ');
-        // Convert line breaks
-        formattedContent = formattedContent.replace(/\n/g, '<br>');
-        
-        contentDiv.innerHTML = formattedContent;
-        
-        if (msg.timestamp) {
-            const timeDiv = document.createElement('div');
-            timeDiv.className = 'timestamp';
-            timeDiv.textContent = new Date(msg.timestamp).toLocaleTimeString();
-            contentDiv.appendChild(timeDiv);
-        }
+        fillMessageContent(contentDiv, msg);
         
         msgDiv.appendChild(contentDiv);
         container.appendChild(msgDiv);
@@ -144,6 +126,43 @@ function renderMessages() {
     container.scrollTop = container.scrollHeight;
 }
 
+function fillMessageContent(contentDiv, msg) {
+    // Format content with markdown-like bold and line breaks
+    let formattedContent = msg.content;
+    // Convert **text** to <strong>text</strong>
+    formattedContent = formattedContent.replace(/\*\*(.*?)\*\*/g, '<strong>$1</strong>');
+    // Convert bullet points
+    formattedContent = formattedContent.replace(/^• /gm, '&bull; ');
+    formattedContent = formattedContent.replace(/^- /gm, '&bull; ');
+    // Convert line breaks
+    formattedContent = formattedContent.replace(/\n/g, '<br>');
+    
+    contentDiv.innerHTML = formattedContent;
+    
+    if (msg.timestamp) {
+        const timeDiv = document.createElement('div');
+        timeDiv.className = 'timestamp';
+        timeDiv.textContent = new Date(msg.timestamp).toLocaleTimeString();
+        contentDiv.appendChild(timeDiv);
+    }
+}
+
+// Update only the last message bubble (used while an answer streams in)
+function updateLastMessage(content) {
+    const chat = chats[currentChatId];
+    if (!chat || chat.messages.length === 0) return;
+    
+    const msg = chat.messages[chat.messages.length - 1];
+    msg.content = content;
+    
+    const container = document.getElementById('chatMessages');
+    const contents = container.querySelectorAll('.message-content');
+    if (contents.length > 0) {
+        fillMessageContent(contents[contents.length - 1], msg);
+    }
+    container.scrollTop = container.scrollHeight;
+}
+
 function addMessage(role, content) {
     const chat = chats[currentChatId];
     if (!chat) return;
@@ -184,21 +203,29 @@ async function sendMessage() {
     setInputEnabled(false);
     
     try {
-        const response = await fetch(`${API_URL}/chat`, {
+        // Only messages the server has not acknowledged yet are sent
+        const chat = chats[currentChatId];
+        const cursor = chat.historySeq || 0;
+        const response = await fetch(`${API_URL}/chat/stream`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
                 query,
                 chat_id: currentChatId,
-                conversation_history: chats[currentChatId].messages,
+                conversation_history: chat.messages.slice(cursor),
+                history_cursor: cursor,
                 pending_action: pendingAction,
                 pending_state: pendingState,
                 original_query: originalQuery
             })
         });
         
-        const data = await response.json();
-        handleResponse(data);
+        if (!response.ok) {
+            const error = await response.json();
+            throw new Error(error.detail || response.statusText);
+        }
+        
+        await readEventStream(response, chat);
     } catch (error) {
         addMessage('assistant', 'Error: ' + error.message);
     } finally {
@@ -206,6 +233,72 @@ async function sendMessage() {
     }
 }
 
+// Read Server-Sent Events from /chat/stream, rendering answer tokens as they arrive
+async function readEventStream(response, chat) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let streamed = null;  // Text of the answer being streamed, once the first token arrives
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        
+        // Events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) >= 0) {
+            const raw = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            
+            let event = 'message';
+            let data = '';
+            raw.split('\n').forEach(line => {
+                if (line.startsWith('event: ')) event = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+            });
+            const payload = JSON.parse(data);
+            
+            switch (event) {
+                case 'token':
+                    if (streamed === null) {
+                        streamed = '';
+                        addMessage('assistant', '');
+                    }
+                    streamed += payload.text;
+                    updateLastMessage(streamed);
+                    break;
+                    
+                case 'citations':
+                    if (streamed !== null && payload.text) {
+                        streamed += '\n\n' + payload.text;
+                        updateLastMessage(streamed);
+                    }
+                    break;
+                    
+                case 'done':
+                    if (payload.history_seq != null) {
+                        chat.historySeq = payload.history_seq;
+                    }
+                    if (streamed !== null && payload.type === 'INFO_QUERY') {
+                        // Replace the streamed text with the final answer and persist it
+                        updateLastMessage(payload.content.answer);
+                        saveChatsToStorage();
+                        pendingAction = null;
+                        pendingState = null;
+                        originalQuery = null;
+                    } else {
+                        handleResponse(payload);
+                    }
+                    break;
+                    
+                case 'error':
+                    throw new Error(payload.detail);
+            }
+        }
+    }
+}
+
 // Handle API response
 function handleResponse(data) {
     switch (data.type) {
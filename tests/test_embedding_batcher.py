@@ -0,0 +1,63 @@
+"""Regression tests for EmbeddingBatcher when callers cancel their encodes."""
+import os
+import sys
+import time
+import asyncio
+import threading
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from retrieval.embedding_batcher import EmbeddingBatcher
+
+
+class BlockingEncoder:
+    """Stub encoder that holds its first batch until released."""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        self.started.set()
+        self.release.wait(5)
+        return np.ones((len(texts), 4), dtype='float32')
+
+
+def test_cancelled_awaiter_does_not_stop_the_batcher():
+    encoder = BlockingEncoder()
+    batcher = EmbeddingBatcher(encoder, max_batch_size=8, max_wait_ms=1)
+
+    async def cancel_during_encode():
+        task = asyncio.ensure_future(asyncio.wrap_future(batcher.submit(["query: first"])))
+        await asyncio.get_running_loop().run_in_executor(None, encoder.started.wait, 5)
+        task.cancel()
+        await asyncio.sleep(0.01)
+        encoder.release.set()
+
+    asyncio.run(cancel_during_encode())
+
+    # The worker thread survived resolving the cancelled future
+    result = batcher.submit(["query: second"]).result(timeout=5)
+    assert result.shape == (1, 4)
+    assert batcher.batches == 2
+
+
+def test_requests_cancelled_while_queued_are_skipped():
+    encoder = BlockingEncoder()
+    batcher = EmbeddingBatcher(encoder, max_batch_size=8, max_wait_ms=1)
+
+    busy = batcher.submit(["query: busy"])
+    assert encoder.started.wait(5)
+    cancelled = batcher.submit(["query: cancelled"])
+    assert cancelled.cancel()
+    kept = batcher.submit(["query: kept"])
+    time.sleep(0.01)
+    encoder.release.set()
+
+    assert busy.result(timeout=5).shape == (1, 4)
+    assert kept.result(timeout=5).shape == (1, 4)
+    assert all("query: cancelled" not in batch for batch in encoder.calls)